@@ -5,6 +5,12 @@
 import firebase_admin
 from firebase_admin import credentials, firestore, auth
 import os
+import json
+import base64
+import hmac
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv, find_dotenv
 import numpy as np
 
@@ -16,6 +22,18 @@ load_dotenv(_dotenv_path)
 # Fallback: two levels up from this file (firebase/firebase_service.py → main_project/)
 _PROJECT_ROOT = os.path.dirname(_dotenv_path) if _dotenv_path else os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+# Embedding storage format.
+#   v1 (legacy): 'embedding' = list of 512 Firestore doubles
+#   v2:          'embedding_bytes' = float16 or int8 (+ scale) packed bytes
+EMBEDDING_FORMAT_VERSION = 2
+EMBEDDING_STORAGE_DTYPE = os.getenv('EMBEDDING_STORAGE_DTYPE', 'float16')  # 'float16' or 'int8'
+
+# Attendance session encoding.
+#   '' (default): detected_students list of {'student_uid', 'confidence', 'name', 'roll_no'}
+#   'bitmap':     roster uid list + packed presence bitmap + uint8/float16 confidences
+ATTENDANCE_SESSION_ENCODING = os.getenv('ATTENDANCE_SESSION_ENCODING', '')
+ATTENDANCE_CONFIDENCE_DTYPE = os.getenv('ATTENDANCE_CONFIDENCE_DTYPE', 'uint8')  # 'uint8' or 'float16'
+
 def initialize_firebase():
     """
     Initialize Firebase Admin SDK with credentials.
@@ -90,8 +108,149 @@ def delete_user(uid):
         print(f"❌ Error deleting user: {e}")
         return False
 
+AUTH_IMPORT_CHUNK = 1000  # auth.import_users / auth.delete_users limit
+AUTH_LOOKUP_CHUNK = 100   # auth.get_users limit
+
+def delete_users(uids):
+    """
+    Delete many Firebase Authentication users with auth.delete_users
+    (1000 per call). Users that don't exist count as deleted.
+
+    Returns:
+        dict: {uid: error reason} for users that could not be deleted
+    """
+    uids = list(uids)
+    failed = {}
+    for start in range(0, len(uids), AUTH_IMPORT_CHUNK):
+        chunk = uids[start:start + AUTH_IMPORT_CHUNK]
+        result = auth.delete_users(chunk)
+        for error in result.errors:
+            failed[chunk[error.index]] = error.reason
+        print(f"✅ Deleted {result.success_count}/{len(chunk)} user(s)")
+    return failed
+
+def find_registered_emails(emails):
+    """
+    Which of these emails already belong to a Firebase Auth user
+    (auth.get_users, 100 identifiers per call).
+
+    Returns:
+        set: Registered emails (lowercased)
+    """
+    emails = list(dict.fromkeys(e.lower() for e in emails))
+    registered = set()
+    for start in range(0, len(emails), AUTH_LOOKUP_CHUNK):
+        chunk = [auth.EmailIdentifier(e) for e in emails[start:start + AUTH_LOOKUP_CHUNK]]
+        for user in auth.get_users(chunk).users:
+            registered.add((user.email or '').lower())
+    return registered
+
+def import_users(users, role='student'):
+    """
+    Create many Auth users with auth.import_users (1000 per call) instead of
+    one create_user + set_custom_user_claims round trip each.
+    Passwords are imported as HMAC-SHA256 hashes under a per-call key;
+    Firebase re-hashes them on first sign-in.
+
+    import_users does not check email uniqueness - filter with
+    find_registered_emails() first.
+
+    Args:
+        users (list): [{'uid', 'email', 'password', 'display_name'}]
+        role (str): Custom claim applied to every user
+
+    Returns:
+        dict: {index in users: error reason} for users that failed
+    """
+    key = os.urandom(32)
+    hash_alg = auth.UserImportHash.hmac_sha256(key=key)
+    failed = {}
+    for start in range(0, len(users), AUTH_IMPORT_CHUNK):
+        chunk = users[start:start + AUTH_IMPORT_CHUNK]
+        records = [
+            auth.ImportUserRecord(
+                uid=u['uid'],
+                email=u['email'],
+                display_name=u.get('display_name'),
+                password_hash=hmac.new(key, u['password'].encode('utf-8'), hashlib.sha256).digest(),
+                custom_claims={'role': role}
+            )
+            for u in chunk
+        ]
+        result = auth.import_users(records, hash_alg=hash_alg)
+        for error in result.errors:
+            failed[start + error.index] = error.reason
+        print(f"✅ Imported {result.success_count}/{len(chunk)} user(s) (role: {role})")
+    return failed
+
 # --------------------- FIRESTORE (DATABASE) ---------------------
 
+FIRESTORE_BATCH_LIMIT = 500  # operations per WriteBatch
+
+def commit_writes(db, writes):
+    """
+    Apply many writes through WriteBatch, committing every
+    FIRESTORE_BATCH_LIMIT operations.
+
+    Args:
+        db: Firestore client
+        writes (list): [(op, doc_ref, data)] with op 'set', 'update' or 'delete'
+
+    Returns:
+        int: Number of batches committed
+    """
+    commits = 0
+    for start in range(0, len(writes), FIRESTORE_BATCH_LIMIT):
+        batch = db.batch()
+        for op, ref, data in writes[start:start + FIRESTORE_BATCH_LIMIT]:
+            if op == 'set':
+                batch.set(ref, data)
+            elif op == 'update':
+                batch.update(ref, data)
+            else:
+                batch.delete(ref)
+        batch.commit()
+        commits += 1
+    return commits
+
+def promote_students(db, student_uids, to_sem):
+    """
+    Move students to another semester with batched updates.
+
+    Returns:
+        int: Number of students updated
+    """
+    students = db.collection('students')
+    commit_writes(db, [('update', students.document(uid), {'sem': to_sem}) for uid in student_uids])
+    print(f"✅ {len(student_uids)} student(s) moved to sem {to_sem}")
+    return len(student_uids)
+
+def remove_students(db, students, archive=False):
+    """
+    Delete students' profiles and embeddings with batched deletes
+    (Auth accounts are removed separately with delete_users()).
+    With archive=True each profile is first copied to the 'alumni'
+    collection, in the same batch as its delete.
+
+    Args:
+        db: Firestore client
+        students (dict): {uid: profile dict}
+        archive (bool): Keep a copy of the profile in 'alumni'
+
+    Returns:
+        int: Number of students removed
+    """
+    writes = []
+    for uid, profile in students.items():
+        if archive:
+            writes.append(('set', db.collection('alumni').document(uid),
+                           {**profile, 'graduated_at': firestore.SERVER_TIMESTAMP}))
+        writes.append(('delete', db.collection('students').document(uid), None))
+        writes.append(('delete', db.collection('embeddings').document(uid), None))
+    commit_writes(db, writes)
+    print(f"✅ {len(students)} student(s) {'archived' if archive else 'deleted'}")
+    return len(students)
+
 def add_admin(db, uid, name, email):
     """
     Add admin profile to Firestore.
@@ -114,7 +273,7 @@ def add_admin(db, uid, name, email):
     print(f"✅ Admin added to Firestore: {name}")
     return uid
 
-def add_student(db, uid, roll_no, name, email, branch='', sem=None):
+def add_student(db, uid, roll_no, name, email, branch='', sem=None, batch=None):
     """
     Add student profile to Firestore.
     No photo needed - face embedding handles recognition.
@@ -127,25 +286,84 @@ def add_student(db, uid, roll_no, name, email, branch='', sem=None):
         email (str): Student's email
         branch (str): Department branch (e.g. 'CS', 'EC', 'EEE')
         sem (int): Semester number (1–7)
+        batch: Optional WriteBatch to add the write to instead of writing now
     
     Returns:
         str: Document ID
     """
     doc_ref = db.collection('students').document(uid)
-    doc_ref.set({
+    data = {
         'roll_no': roll_no,
         'name': name,
         'email': email,
         'branch': branch,
         'sem': sem,
         'enrolled_at': firestore.SERVER_TIMESTAMP
-    })
+    }
+    if batch is not None:
+        batch.set(doc_ref, data)
+        return uid
+    doc_ref.set(data)
     print(f"✅ Student added to Firestore: {name} (Roll No: {roll_no}, Branch: {branch}, Sem: {sem})")
     return uid
 
+def encode_embedding(embedding, dtype=None):
+    """
+    Pack an embedding into compact Firestore fields (format v2).
+
+    Args:
+        embedding (np.ndarray | list): Embedding vector
+        dtype (str): 'float16' or 'int8' (defaults to EMBEDDING_STORAGE_DTYPE)
+
+    Returns:
+        dict: Fields to merge into the embedding document
+    """
+    dtype = dtype or EMBEDDING_STORAGE_DTYPE
+    vector = np.asarray(embedding, dtype=np.float32).ravel()
+
+    if dtype == 'float16':
+        payload = vector.astype('<f2').tobytes()
+        scale = 1.0
+    elif dtype == 'int8':
+        # Symmetric per-vector quantization: value ≈ int8 * scale
+        max_abs = float(np.max(np.abs(vector))) if vector.size else 0.0
+        scale = max_abs / 127.0 if max_abs > 0 else 1.0
+        payload = np.clip(np.round(vector / scale), -127, 127).astype(np.int8).tobytes()
+    else:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+
+    return {
+        'embedding_version': EMBEDDING_FORMAT_VERSION,
+        'embedding_dtype': dtype,
+        'embedding_scale': scale,
+        'embedding_dim': int(vector.size),
+        'embedding_bytes': payload
+    }
+
+def decode_embedding(data):
+    """
+    Decode an embedding document written in either storage format.
+
+    Args:
+        data (dict): Embedding document fields
+
+    Returns:
+        np.ndarray: float32 embedding vector
+    """
+    if data.get('embedding_version', 1) < 2:
+        return np.asarray(data['embedding'], dtype=np.float32)
+
+    dtype = data.get('embedding_dtype', 'float16')
+    if dtype == 'float16':
+        return np.frombuffer(data['embedding_bytes'], dtype='<f2').astype(np.float32)
+    if dtype == 'int8':
+        quantized = np.frombuffer(data['embedding_bytes'], dtype=np.int8)
+        return quantized.astype(np.float32) * np.float32(data.get('embedding_scale', 1.0))
+    raise ValueError(f"Unsupported embedding dtype: {dtype}")
+
 def save_embedding(db, student_uid, embedding):
     """
-    Save face embedding for a student.
+    Save face embedding for a student (compact v2 format).
     
     Args:
         db: Firestore client
@@ -155,18 +373,19 @@ def save_embedding(db, student_uid, embedding):
     Returns:
         str: Document ID
     """
-    # Convert numpy array to list for Firestore storage
-    embedding_list = embedding.tolist() if isinstance(embedding, np.ndarray) else embedding
-    
     doc_ref = db.collection('embeddings').document(student_uid)
     doc_ref.set({
         'student_uid': student_uid,
-        'embedding': embedding_list,
+        **encode_embedding(embedding),
         'updated_at': firestore.SERVER_TIMESTAMP
     })
     print(f"✅ Embedding saved for student UID: {student_uid}")
     return student_uid
 
+# Fields decode_embedding() reads (skips updated_at etc. on bulk loads)
+EMBEDDING_FIELDS = ['student_uid', 'embedding', 'embedding_version', 'embedding_dtype',
+                    'embedding_scale', 'embedding_bytes']
+
 def get_all_embeddings(db):
     """
     Retrieve all student embeddings from Firestore.
@@ -178,19 +397,166 @@ def get_all_embeddings(db):
         dict: {student_uid: embedding_vector}
     """
     embeddings = {}
-    docs = db.collection('embeddings').stream()
-    
-    for doc in docs:
-        data = doc.to_dict()
-        embeddings[data['student_uid']] = np.array(data['embedding'])
+    for _, data in stream_collection_parallel(db, 'embeddings', field_paths=EMBEDDING_FIELDS):
+        embeddings[data['student_uid']] = decode_embedding(data)
     
     print(f"✅ Retrieved {len(embeddings)} embeddings from Firestore")
     return embeddings
 
-def log_attendance(db, date, detected_students, subject='', branch='', sem=None):
+def save_templates(db, student_uid, centroid, medoids, seen, batch=None):
+    """
+    Save a student's multi-template face gallery entry.
+    The centroid is stored in the regular embedding fields (so single-template
+    readers keep working); medoids go in a 'templates' array.
+
+    Args:
+        db: Firestore client
+        student_uid (str): Student's Firebase Auth UID
+        centroid (np.ndarray): Centroid of all samples seen so far
+        medoids (np.ndarray): Array of shape (T, D) of representative samples
+        seen (int): Number of samples folded into the centroid
+        batch: Optional WriteBatch to add the write to instead of writing now
+
+    Returns:
+        str: Document ID
+    """
+    doc_ref = db.collection('embeddings').document(student_uid)
+    data = _templates_doc(student_uid, centroid, medoids, seen)
+    if batch is not None:
+        batch.set(doc_ref, data)
+    else:
+        doc_ref.set(data)
+        print(f"✅ {len(medoids) + 1} template(s) saved for student UID: {student_uid} ({seen} samples)")
+    return student_uid
+
+def _templates_doc(student_uid, centroid, medoids, seen):
+    return {
+        'student_uid': student_uid,
+        **encode_embedding(centroid),
+        'templates': [encode_embedding(m) for m in medoids],
+        'templates_seen': int(seen),
+        'updated_at': firestore.SERVER_TIMESTAMP
+    }
+
+def save_templates_if_newer(db, templates, attempts=3):
+    """
+    Save template sets that have seen more samples than the stored ones.
+    templates_seen only grows as samples are folded in, so it orders versions
+    of a set: each write is conditioned on the document's update_time, and a
+    set that lost a race to a newer one is dropped instead of overwriting it.
+
+    Args:
+        db: Firestore client
+        templates (dict): {student_uid: TemplateSet}
+        attempts (int): Re-reads after a concurrent write before giving up
+
+    Returns:
+        list: uids whose sets were written
+    """
+    from google.api_core.exceptions import Conflict, FailedPrecondition
+
+    collection = db.collection('embeddings')
+    pending = dict(templates)
+    written = []
+    for _ in range(attempts):
+        if not pending:
+            break
+        refs = [collection.document(uid) for uid in pending]
+        snapshots = {snap.id: snap for snap in db.get_all(refs, field_paths=['templates_seen'])}
+        writes = []
+        for uid, t in pending.items():
+            snap = snapshots.get(uid)
+            if snap is not None and snap.exists and (snap.to_dict() or {}).get('templates_seen', 1) >= t.seen:
+                continue
+            writes.append((uid, t, snap))
+        pending = {}
+        for start in range(0, len(writes), FIRESTORE_BATCH_LIMIT):
+            group = writes[start:start + FIRESTORE_BATCH_LIMIT]
+            batch = db.batch()
+            for uid, t, snap in group:
+                ref = collection.document(uid)
+                data = _templates_doc(uid, t.centroid, t.medoids, t.seen)
+                if snap is not None and snap.exists:
+                    batch.update(ref, data, option=db.write_option(last_update_time=snap.update_time))
+                else:
+                    batch.create(ref, data)
+            try:
+                batch.commit()
+                written.extend(uid for uid, _, _ in group)
+            except (FailedPrecondition, Conflict):
+                # Another writer got in between: re-read and compare again
+                pending.update({uid: t for uid, t, _ in group})
+    if pending:
+        print(f"⚠️  {len(pending)} template set(s) not saved after {attempts} concurrent-write retries")
+    return written
+
+def decode_templates(data):
+    """
+    Decode an embedding document into its template set.
+
+    Args:
+        data (dict): Embedding document fields
+
+    Returns:
+        dict: {'centroid': np.ndarray, 'medoids': np.ndarray (T, D), 'seen': int}
+    """
+    centroid = decode_embedding(data)
+    medoids = [decode_embedding(t) for t in data.get('templates', [])]
+    return {
+        'centroid': centroid,
+        'medoids': np.vstack(medoids) if medoids else np.empty((0, centroid.size), dtype=np.float32),
+        'seen': int(data.get('templates_seen', 1))
+    }
+
+def get_all_templates(db):
+    """
+    Retrieve every student's template set from Firestore.
+
+    Args:
+        db: Firestore client
+
+    Returns:
+        dict: {student_uid: {'centroid', 'medoids', 'seen'}}
+    """
+    templates = {}
+    fields = EMBEDDING_FIELDS + ['templates', 'templates_seen']
+    for _, data in stream_collection_parallel(db, 'embeddings', field_paths=fields):
+        templates[data['student_uid']] = decode_templates(data)
+
+    print(f"✅ Retrieved templates for {len(templates)} students from Firestore")
+    return templates
+
+def get_templates_since(db, since):
+    """
+    Retrieve the template sets saved at or after a point in time (e.g.
+    templates enrolled or updated by another backend instance).
+
+    Args:
+        db: Firestore client
+        since (datetime): Timezone-aware lower bound on updated_at
+
+    Returns:
+        dict: {student_uid: {'centroid', 'medoids', 'seen'}}
+    """
+    fields = EMBEDDING_FIELDS + ['templates', 'templates_seen']
+    query = db.collection('embeddings').where('updated_at', '>=', since).select(fields)
+    templates = {}
+    for doc in query.stream():
+        data = doc.to_dict()
+        templates[data['student_uid']] = decode_templates(data)
+    return templates
+
+def log_attendance(db, date, detected_students, subject='', branch='', sem=None, profiles=None,
+                   roster=None, log_id=None, timestamp=None):
     """
     Save attendance record to Firestore.
 
+    Each detected student's name and roll_no are stored alongside the uid so
+    listing logs never needs per-student profile reads. With
+    ATTENDANCE_SESSION_ENCODING=bitmap and a roster, the session is stored
+    as a roster-bitmap instead of the detected_students list (see
+    scripts/session_encoding.py).
+
     Args:
         db: Firestore client
         date (str): Date in 'YYYY-MM-DD' format
@@ -198,98 +564,468 @@ def log_attendance(db, date, detected_students, subject='', branch='', sem=None)
         subject (str): Subject name for this attendance session
         branch (str): Branch filter used when marking attendance
         sem (int|None): Semester filter used when marking attendance
+        profiles (dict): {uid: profile} for the detected students; fetched
+                         in one batched read if omitted
+        roster (list): Ordered uids of every student expected in the session
+        log_id (str): Document ID to use (the write fails with AlreadyExists
+                      if it was already logged); a new ID if omitted
+        timestamp (datetime): When the session was marked (server time if omitted)
 
     Returns:
         str: Document ID
     """
-    doc_ref = db.collection('attendance_log').document()
-    doc_ref.set({
+    batch = db.batch()
+    log_id = _add_attendance_session(db, batch, date, detected_students, subject, branch, sem,
+                                     profiles, roster, log_id, timestamp)
+    batch.commit()
+    print(f"✅ Attendance logged for {date} ({subject}): {len(detected_students)} students present")
+    return log_id
+
+def _attendance_session_writes(detected_students, subject):
+    # log + class counter + one counter per present student
+    return 1 + (1 + len(detected_students) if subject else 0)
+
+def _add_attendance_session(db, batch, date, detected_students, subject='', branch='', sem=None,
+                            profiles=None, roster=None, log_id=None, timestamp=None):
+    """Add one session and its counter increments to `batch`; returns the log's document ID."""
+    present = {entry['student_uid']: entry['confidence'] for entry in detected_students}
+    session = {
         'date': date,
         'subject': subject,
         'branch': branch,
         'sem': sem,
-        'timestamp': firestore.SERVER_TIMESTAMP,
-        'detected_students': detected_students,
+        'timestamp': timestamp or firestore.SERVER_TIMESTAMP,
         'total_present': len(detected_students)
-    })
-    print(f"✅ Attendance logged for {date} ({subject}): {len(detected_students)} students present")
+    }
+    if profiles is None:
+        profiles = get_students_by_uids(db, list(present), field_paths=['name', 'roll_no'])
+    if ATTENDANCE_SESSION_ENCODING == 'bitmap' and roster is not None:
+        # Roster + bitmap + confidence array (+ present students' names) only;
+        # readers decode presence from the bitmap
+        from scripts.session_encoding import encode_session
+        session.update(encode_session(roster, present, confidence_dtype=ATTENDANCE_CONFIDENCE_DTYPE,
+                                      profiles=profiles))
+    else:
+        # uid -> confidence, so a student's presence is one key lookup (and one
+        # projected field) instead of a scan of detected_students
+        session['present'] = present
+        session['detected_students'] = [
+            {
+                **entry,
+                'name': (profiles.get(entry['student_uid']) or {}).get('name', ''),
+                'roll_no': (profiles.get(entry['student_uid']) or {}).get('roll_no', '')
+            }
+            for entry in detected_students
+        ]
+
+    # The log and its counter increments commit together in one batch. create()
+    # fails if the log already exists, so a retried session can't count twice.
+    collection = db.collection('attendance_log')
+    doc_ref = collection.document(log_id) if log_id else collection.document()
+    batch.create(doc_ref, session)
+    if subject:
+        class_ref = attendance_stats_ref(db, branch, sem)
+        batch.set(class_ref, {'branch': branch, 'sem': sem, 'sessions': {subject: firestore.Increment(1)}}, merge=True)
+        for uid in present:
+            batch.set(class_ref.collection('students').document(uid),
+                      {'present': {subject: firestore.Increment(1)}}, merge=True)
     return doc_ref.id
 
-def get_student_attendance(db, student_uid):
+def log_attendance_many(db, sessions):
     """
-    Get all attendance records for a specific student.
-    
+    Save many sessions with as few batch commits as possible (sessions are
+    packed up to FIRESTORE_BATCH_LIMIT writes per batch). Each session needs
+    a 'log_id', so retrying is idempotent: sessions that already exist are
+    skipped instead of counted again.
+
     Args:
         db: Firestore client
-        student_uid (str): Student's Firebase Auth UID
-    
+        sessions (list): log_attendance() keyword arguments, each with 'log_id'
+
     Returns:
-        list: List of attendance records
+        list: IDs of the sessions now stored (written or already present)
     """
-    records = []
-    # subject_stats: { subject: { present: int, total: int } }
+    from google.api_core.exceptions import Conflict
+
+    groups, group, ops = [], [], 0
+    for session in sessions:
+        writes = _attendance_session_writes(session['detected_students'], session.get('subject', ''))
+        if group and ops + writes > FIRESTORE_BATCH_LIMIT:
+            groups.append(group)
+            group, ops = [], 0
+        group.append(session)
+        ops += writes
+    if group:
+        groups.append(group)
+
+    stored = []
+    for group in groups:
+        batch = db.batch()
+        for session in group:
+            _add_attendance_session(db, batch, **session)
+        try:
+            batch.commit()
+        except Conflict:
+            # Part of the group was stored by an earlier attempt; the batch is
+            # atomic, so write the sessions one by one and skip the existing ones
+            for session in group:
+                single = db.batch()
+                _add_attendance_session(db, single, **session)
+                try:
+                    single.commit()
+                except Conflict:
+                    pass
+        stored.extend(session['log_id'] for session in group)
+    print(f"✅ {len(stored)} attendance session(s) logged in {len(groups)} batch(es)")
+    return stored
+
+def attendance_stats_ref(db, branch, sem):
+    """
+    Counter document for one class (branch+sem).
+      attendance_stats/{class}                 sessions: {subject: count}
+      attendance_stats/{class}/students/{uid}  present:  {subject: count}
+    """
+    return db.collection('attendance_stats').document(f"{branch or '-'}__{sem if sem is not None else '-'}")
+
+def get_attendance_stats(db, student_uid, branch, sem):
+    """
+    Per-subject attendance for a student from the materialized counters
+    (two document reads, independent of how many sessions were logged).
+
+    Returns:
+        dict: {subject: {'present': int, 'total': int, 'pct': float}}
+    """
+    class_ref = attendance_stats_ref(db, branch, sem)
+    student_ref = class_ref.collection('students').document(student_uid)
+    docs = {doc.reference.path: doc.to_dict() or {} for doc in db.get_all([class_ref, student_ref])}
+    sessions = docs.get(class_ref.path, {}).get('sessions', {})
+    present = docs.get(student_ref.path, {}).get('present', {})
+
     subject_stats = {}
+    for subject, total in sessions.items():
+        attended = present.get(subject, 0)
+        subject_stats[subject] = {
+            'present': attended,
+            'total': total,
+            'pct': round((attended / total) * 100, 1) if total > 0 else 0.0
+        }
+    return subject_stats
 
-    # First get the student's branch and sem for total-class counting
-    student_doc = db.collection('students').document(student_uid).get()
-    student_data = student_doc.to_dict() if student_doc.exists else {}
-    s_branch = student_data.get('branch', '')
-    s_sem = student_data.get('sem', None)
+def list_attendance_logs_page(db, date_from='', date_to='', subject='', branch='', sem=None,
+                              limit=50, page_token=None):
+    """
+    One page of attendance logs, newest first (date DESC, then document id DESC).
 
-    docs = db.collection('attendance_log').stream()
+    Equality filters combined with the date range/order need composite
+    indexes on attendance_log, e.g.
+        subject ASC, date DESC, __name__ DESC
+        branch ASC, sem ASC, date DESC, __name__ DESC
+        branch ASC, sem ASC, subject ASC, date DESC, __name__ DESC
+    (Firestore prints a console link to create any missing index).
 
-    for doc in docs:
+    Args:
+        db: Firestore client
+        date_from (str): Earliest date, 'YYYY-MM-DD' (inclusive)
+        date_to (str): Latest date, 'YYYY-MM-DD' (inclusive)
+        subject (str): Optional subject filter
+        branch (str): Optional branch filter
+        sem (int): Optional semester filter
+        limit (int): Page size
+        page_token (str): Cursor returned with the previous page
+
+    Returns:
+        tuple: (list of log dicts incl. 'id', next_page_token or None)
+    """
+    from google.cloud.firestore_v1.field_path import FieldPath
+
+    collection = db.collection('attendance_log')
+    query = collection
+    if subject:
+        query = query.where('subject', '==', subject)
+    if branch:
+        query = query.where('branch', '==', branch)
+    if sem is not None:
+        query = query.where('sem', '==', sem)
+    if date_from:
+        query = query.where('date', '>=', date_from)
+    if date_to:
+        query = query.where('date', '<=', date_to)
+    query = (query.order_by('date', direction=firestore.Query.DESCENDING)
+                  .order_by(FieldPath.document_id(), direction=firestore.Query.DESCENDING))
+    if page_token:
+        last_date, last_id = decode_page_token(page_token)
+        query = query.start_after({'date': last_date, FieldPath.document_id(): collection.document(last_id)})
+
+    logs = []
+    for doc in query.limit(limit).stream():
         data = doc.to_dict()
-        subject = data.get('subject', '')
-        if not subject:
-            continue
+        data['id'] = doc.id
+        logs.append(data)
+
+    next_token = None
+    if len(logs) == limit:
+        next_token = encode_page_token(logs[-1].get('date'), logs[-1]['id'])
+    return logs, next_token
+
+def presence_map(data):
+    """
+    {uid: confidence} for an attendance log document: the 'present' map,
+    the decoded bitmap of roster-encoded sessions, or the detected_students
+    list for logs written before the 'present' map existed.
+    """
+    from scripts.session_encoding import is_encoded, decode_session
+
+    if 'present' in data:
+        return data['present'] or {}
+    if is_encoded(data):
+        return decode_session(data)
+    return {entry['student_uid']: entry.get('confidence') for entry in data.get('detected_students', [])}
 
-        log_branch = data.get('branch', '')
-        log_sem = data.get('sem', None)
+def _class_attendance_query(db, branch, sem, date_from='', date_to=''):
+    # Needs the composite index attendance_log: branch ASC, sem ASC, date DESC, __name__ DESC
+    from google.cloud.firestore_v1.field_path import FieldPath
 
-        # Only count logs that have an explicit branch+sem stored AND match
-        # this student. Old logs without branch/sem fields are ignored so they
-        # don't inflate "total classes" for subjects the student never had.
-        if log_branch != s_branch or log_sem != s_sem:
+    query = db.collection('attendance_log').where('branch', '==', branch).where('sem', '==', sem)
+    if date_from:
+        query = query.where('date', '>=', date_from)
+    if date_to:
+        query = query.where('date', '<=', date_to)
+    return (query.order_by('date', direction=firestore.Query.DESCENDING)
+                 .order_by(FieldPath.document_id(), direction=firestore.Query.DESCENDING))
+
+def get_class_sessions(db, branch, sem, date_from='', date_to=''):
+    """
+    Every attendance session of one class in a date range, with only the
+    fields analytics needs (subject, presence map and roster-bitmap fields).
+
+    Returns:
+        list: Attendance log dicts incl. 'id', newest first
+    """
+    query = _class_attendance_query(db, branch, sem, date_from, date_to).select([
+        'date', 'subject', 'present', 'session_roster', 'session_presence',
+        'session_confidence', 'session_confidence_dtype'
+    ])
+    sessions = []
+    for doc in query.stream():
+        data = doc.to_dict()
+        data['id'] = doc.id
+        sessions.append(data)
+    return sessions
+
+def _student_confidence(data, student_uid):
+    """Confidence of one student in a log projected by get_student_attendance (None = absent)."""
+    from scripts.session_encoding import is_encoded, student_confidence
+
+    if is_encoded(data):
+        return student_confidence(data, student_uid)
+    return (data.get('present') or {}).get(student_uid)
+
+def get_student_attendance(db, student_uid, student=None, date_from='', date_to='',
+                           limit=None, page_token=None, with_stats=True):
+    """
+    Attendance records for a specific student, newest first.
+
+    Only the logs of the student's own branch+sem are read (filtered in
+    Firestore), and only the fields needed here are downloaded: the
+    student's own entry of the 'present' map rather than every detected
+    student. Roster-bitmap sessions have no such map; for those the roster,
+    bitmap and confidences are downloaded and decoded instead. Old logs
+    without branch/sem fields are never matched, so they don't inflate
+    "total classes" for subjects the student never had. Run
+    scripts/migrate_attendance_logs.py once so legacy logs gain the map.
+
+    Args:
+        db: Firestore client
+        student_uid (str): Student's Firebase Auth UID
+        student (dict): Student profile if already fetched (skips a read)
+        date_from (str): Earliest date, 'YYYY-MM-DD' (inclusive)
+        date_to (str): Latest date, 'YYYY-MM-DD' (inclusive)
+        limit (int): Page size for records (None = every record in range)
+        page_token (str): Cursor returned with the previous page
+        with_stats (bool): Also compute subject_stats from the logs (skip when
+                           the counters from get_attendance_stats() are used)
+
+    Returns:
+        tuple: (records, subject_stats {subject: {present, total, pct}} over the
+                whole date range or {} without stats, next_page_token or None)
+    """
+    from google.cloud.firestore_v1.field_path import FieldPath
+
+    if student is None:
+        student = get_student_by_uid(db, student_uid)
+    student_data = student or {}
+    query = _class_attendance_query(db, student_data.get('branch', ''), student_data.get('sem', None),
+                                    date_from, date_to)
+    present_fields = [FieldPath('present', student_uid).to_api_repr(), 'session_roster',
+                      'session_presence', 'session_confidence', 'session_confidence_dtype']
+
+    # Records page
+    page_query = query.select(['date', 'subject', 'timestamp'] + present_fields)
+    if page_token:
+        last_date, last_id = decode_page_token(page_token)
+        page_query = page_query.start_after({
+            'date': last_date,
+            FieldPath.document_id(): db.collection('attendance_log').document(last_id)
+        })
+    if limit:
+        page_query = page_query.limit(limit)
+
+    records = []
+    docs_read = 0
+    last_doc = None
+    for doc in page_query.stream():
+        data = doc.to_dict()
+        docs_read += 1
+        last_doc = (data.get('date'), doc.id)
+        if not data.get('subject'):
             continue
+        confidence = _student_confidence(data, student_uid)
+        records.append({
+            'date': data['date'],
+            'subject': data['subject'],
+            'status': 'present' if confidence is not None else 'absent',
+            'timestamp': data.get('timestamp'),
+            'confidence': confidence
+        })
+
+    next_token = encode_page_token(*last_doc) if limit and docs_read == limit else None
 
-        # Track total classes per subject
-        if subject not in subject_stats:
-            subject_stats[subject] = {'present': 0, 'total': 0}
-        subject_stats[subject]['total'] += 1
-
-        detected = data.get('detected_students', [])
-        was_present = False
-        for entry in detected:
-            if entry['student_uid'] == student_uid:
-                records.append({
-                    'date': data['date'],
-                    'subject': subject,
-                    'status': 'present',
-                    'timestamp': data.get('timestamp'),
-                    'confidence': entry['confidence']
-                })
-                subject_stats[subject]['present'] += 1
-                was_present = True
-                break
-
-        if not was_present:
-            records.append({
-                'date': data['date'],
-                'subject': subject,
-                'status': 'absent',
-                'timestamp': data.get('timestamp'),
-                'confidence': None
-            })
-
-    # Compute percentages
-    for subj, stats in subject_stats.items():
+    # subject_stats: { subject: { present: int, total: int, pct: float } }
+    if not with_stats:
+        stats_rows = []
+    elif limit:
+        stats_rows = [
+            (data.get('subject', ''), _student_confidence(data, student_uid) is not None)
+            for data in (doc.to_dict() for doc in query.select(['subject'] + present_fields).stream())
+        ]
+    else:
+        stats_rows = [(r['subject'], r['status'] == 'present') for r in records]
+
+    subject_stats = {}
+    for subject, was_present in stats_rows:
+        if not subject:
+            continue
+        stats = subject_stats.setdefault(subject, {'present': 0, 'total': 0})
+        stats['total'] += 1
+        stats['present'] += int(was_present)
+    for stats in subject_stats.values():
         total = stats['total']
-        present = stats['present']
-        stats['pct'] = round((present / total) * 100, 1) if total > 0 else 0.0
+        stats['pct'] = round((stats['present'] / total) * 100, 1) if total > 0 else 0.0
 
     print(f"✅ Retrieved {len(records)} attendance records for student {student_uid}")
-    return records, subject_stats
+    return records, subject_stats, next_token
+
+# --------------------- BULK READS ---------------------
+
+# Full-collection scans are split into this many partitions read concurrently
+FIRESTORE_READ_PARTITIONS = int(os.getenv('FIRESTORE_READ_PARTITIONS', '8'))
+
+# Characters of Firestore auto-IDs and Firebase Auth UIDs, in document-id order
+_DOC_ID_ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+def _id_range_bounds(partitions):
+    """Split points over the document-id space: ['', 'A', 'b', ...] lower bounds."""
+    step = len(_DOC_ID_ALPHABET) / partitions
+    bounds = [_DOC_ID_ALPHABET[int(i * step)] for i in range(1, partitions)]
+    return [''] + list(dict.fromkeys(bounds))
+
+def stream_collection_parallel(db, collection_name, field_paths=None, partitions=None, max_workers=None,
+                               page_size=1000, split='id_range'):
+    """
+    Read a whole collection as several partitions in parallel, yielding
+    documents as they arrive (order is not defined).
+
+    Each partition is paged with limit/start_after, and pages pass through a
+    bounded queue, so memory stays at a few pages however large the
+    collection is.
+
+    Args:
+        db: Firestore client
+        collection_name (str): Top-level collection
+        field_paths (list): Optional projection (only these fields are downloaded)
+        partitions (int): Number of partitions (default FIRESTORE_READ_PARTITIONS)
+        max_workers (int): Concurrent partition readers (default = partitions)
+        page_size (int): Documents per request within a partition
+        split (str): 'id_range' - split the document-id space evenly (suits
+                     random auto-IDs / Auth UIDs); 'partition' - ask Firestore
+                     for balanced split points (collection-group partition query)
+
+    Yields:
+        tuple: (document id, data dict)
+    """
+    import queue
+    from google.cloud.firestore_v1.field_path import FieldPath
+
+    partitions = max(1, partitions or FIRESTORE_READ_PARTITIONS)
+    collection = db.collection(collection_name)
+
+    def _project(query):
+        return query.select(field_paths) if field_paths is not None else query
+
+    if split == 'partition':
+        # Partition queries only exist for collection groups; documents of
+        # same-named subcollections are dropped below
+        group = db.collection_group(collection_name)
+        queries = [_project(p.query()) for p in group.get_partitions(partitions)]
+    elif split == 'id_range':
+        bounds = _id_range_bounds(partitions)
+        queries = []
+        for i, lower in enumerate(bounds):
+            query = collection.order_by(FieldPath.document_id())
+            if lower:
+                query = query.where(FieldPath.document_id(), '>=', collection.document(lower))
+            if i + 1 < len(bounds):
+                query = query.where(FieldPath.document_id(), '<', collection.document(bounds[i + 1]))
+            queries.append(_project(query))
+    else:
+        raise ValueError(f"Unknown split: {split}")
+
+    pages = queue.Queue(maxsize=2 * len(queries))
+    stop = threading.Event()
+    done = object()
+
+    def _put(item):
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _read(query):
+        try:
+            last = None
+            while not stop.is_set():
+                page_query = query.start_after(last) if last is not None else query
+                docs = list(page_query.limit(page_size).stream())
+                if docs and not _put([(doc.id, doc.to_dict()) for doc in docs
+                                      if doc.reference.parent.id == collection_name
+                                      and doc.reference.parent.parent is None]):
+                    return
+                if len(docs) < page_size:
+                    break
+                last = docs[-1]
+            _put(done)
+        except Exception as e:
+            _put(e)
+
+    pool = ThreadPoolExecutor(max_workers=min(max_workers or len(queries), len(queries)))
+    try:
+        for query in queries:
+            pool.submit(_read, query)
+        remaining = len(queries)
+        while remaining:
+            item = pages.get()
+            if item is done:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield from item
+    finally:
+        stop.set()
+        pool.shutdown(wait=False)
 
 # --------------------- UTILITY FUNCTIONS ---------------------
 
@@ -300,6 +1036,131 @@ def get_student_by_uid(db, student_uid):
         return doc.to_dict()
     return None
 
+def get_students_by_uids(db, student_uids, field_paths=None, chunk_size=100, max_workers=8):
+    """
+    Batch-fetch student profiles with db.get_all instead of one read per uid.
+    UIDs are split into chunks that are fetched concurrently.
+
+    Args:
+        db: Firestore client
+        student_uids (iterable): Student UIDs (duplicates are ignored)
+        field_paths (list): Optional field projection, e.g. ['name', 'roll_no']
+        chunk_size (int): Documents per get_all call
+        max_workers (int): Concurrent get_all calls
+
+    Returns:
+        dict: {student_uid: student profile dict} for UIDs that exist
+    """
+    uids = list(dict.fromkeys(student_uids))
+    if not uids:
+        return {}
+
+    collection = db.collection('students')
+    chunks = [uids[i:i + chunk_size] for i in range(0, len(uids), chunk_size)]
+
+    def _fetch(chunk):
+        refs = [collection.document(uid) for uid in chunk]
+        return [(doc.id, doc.to_dict()) for doc in db.get_all(refs, field_paths=field_paths) if doc.exists]
+
+    students = {}
+    if len(chunks) == 1:
+        students.update(_fetch(chunks[0]))
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+            for result in pool.map(_fetch, chunks):
+                students.update(result)
+    return students
+
+def get_all_students(db):
+    """
+    Retrieve all student profiles (partitions read in parallel).
+
+    Args:
+        db: Firestore client
+
+    Returns:
+        dict: {student_uid: student profile dict}
+    """
+    return dict(stream_collection_parallel(db, 'students'))
+
+# Fields shown in the admin student table - listings fetch only these
+STUDENT_LIST_FIELDS = ['name', 'roll_no', 'branch', 'sem', 'email']
+STUDENT_SORT_KEYS = ('name', 'roll_no', 'branch', 'sem')
+
+def encode_page_token(sort_value, uid):
+    """Opaque cursor for the last item of a page: (sort field value, uid)."""
+    raw = json.dumps([sort_value, uid]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_page_token(token):
+    """Inverse of encode_page_token(). Raises ValueError on a malformed token."""
+    try:
+        sort_value, uid = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except Exception:
+        raise ValueError("Invalid page token")
+    return sort_value, uid
+
+def list_students_page(db, branch='', sem=None, sort_by='name', limit=50, page_token=None):
+    """
+    One page of students, ordered by `sort_by` then document id.
+    Uses a field projection so only STUDENT_LIST_FIELDS are downloaded.
+
+    Filtering by branch/sem while ordering needs composite indexes, e.g.
+    students: branch ASC, sem ASC, name ASC, __name__ ASC
+    (Firestore prints a console link to create any missing index).
+
+    Args:
+        db: Firestore client
+        branch (str): Optional branch filter
+        sem (int): Optional semester filter
+        sort_by (str): One of STUDENT_SORT_KEYS
+        limit (int): Page size
+        page_token (str): Cursor returned with the previous page
+
+    Returns:
+        tuple: (list of student dicts incl. 'uid', next_page_token or None)
+    """
+    from google.cloud.firestore_v1.field_path import FieldPath
+
+    if sort_by not in STUDENT_SORT_KEYS:
+        raise ValueError(f"sort_by must be one of: {', '.join(STUDENT_SORT_KEYS)}")
+
+    collection = db.collection('students')
+    query = collection.select(STUDENT_LIST_FIELDS)
+    if branch:
+        query = query.where('branch', '==', branch)
+    if sem is not None:
+        query = query.where('sem', '==', sem)
+    query = query.order_by(sort_by).order_by(FieldPath.document_id())
+    if page_token:
+        sort_value, last_uid = decode_page_token(page_token)
+        query = query.start_after({sort_by: sort_value, FieldPath.document_id(): collection.document(last_uid)})
+
+    students = []
+    for doc in query.limit(limit).stream():
+        data = doc.to_dict()
+        data['uid'] = doc.id
+        students.append(data)
+
+    next_token = None
+    if len(students) == limit:
+        next_token = encode_page_token(students[-1].get(sort_by), students[-1]['uid'])
+    return students, next_token
+
+def count_students_by_class(db):
+    """
+    Student counts per branch and semester (projection of two fields only).
+
+    Returns:
+        dict: {branch: {sem: count}}
+    """
+    counts = {}
+    for doc in db.collection('students').select(['branch', 'sem']).stream():
+        data = doc.to_dict()
+        branch_counts = counts.setdefault(data.get('branch', '') or '', {})
+        branch_counts[data.get('sem')] = branch_counts.get(data.get('sem'), 0) + 1
+    return counts
+
 def get_student_by_roll_no(db, roll_no):
     """Get student profile by roll number."""
     docs = db.collection('students').where('roll_no', '==', roll_no).limit(1).stream()
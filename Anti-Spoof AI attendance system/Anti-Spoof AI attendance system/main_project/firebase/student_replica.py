@@ -0,0 +1,321 @@
+# In-process replica of the `students` collection.
+# Loaded once, then kept current with an on_snapshot listener (or by polling
+# when running against the local emulator or a backend without a change
+# feed), so profile reads, roll-number checks and roster listings never need
+# a network round trip. Every backend instance runs its own listener, so they
+# stay consistent without a shared cache server. A listener that stops (stream
+# error, expired credentials) is replaced with exponential backoff, and the
+# fresh snapshot it delivers replaces the replica contents, so students removed
+# while it was down are dropped too.
+
+import os
+import bisect
+import threading
+
+from firebase.firebase_service import (
+    encode_page_token,
+    decode_page_token,
+    STUDENT_LIST_FIELDS,
+    STUDENT_SORT_KEYS
+)
+
+
+def _sort_key(value, uid):
+    # Missing values sort last; uid breaks ties so cursors are stable
+    return (value is None, '' if value is None else value, uid)
+
+
+class StudentReplica:
+    """
+    Read-mostly copy of the students collection.
+
+    Args:
+        storage: Storage backend (storage/base.py)
+        mode (str): 'listener', 'poll', or None to pick automatically
+                    (poll when FIRESTORE_EMULATOR_HOST is set or the backend
+                    has no change feed)
+        poll_interval (float): Seconds between reloads in poll mode
+        health_interval (float): Seconds between listener health checks
+        retry_delay (float): First resubscribe delay in seconds (doubles per failure)
+        max_retry_delay (float): Resubscribe delay cap in seconds
+    """
+
+    def __init__(self, storage, mode=None, poll_interval=30.0, health_interval=10.0,
+                 retry_delay=1.0, max_retry_delay=60.0):
+        self.storage = storage
+        if mode is None:
+            mode = os.getenv('STUDENT_REPLICA_MODE') or (
+                'poll' if os.getenv('FIRESTORE_EMULATOR_HOST') or not storage.has_change_feed else 'listener')
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self.health_interval = health_interval
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.resubscribes = 0
+        self._lock = threading.RLock()
+        self._students = {}        # uid -> profile dict
+        self._roll_index = {}      # roll_no -> uid
+        self._missing = set()      # uids confirmed absent since the last change
+        self._subscribers = []
+        self._ready = threading.Event()
+        self._watch = None
+        self._resync = False       # next listener callback carries the whole collection
+        self._stop = threading.Event()
+
+    # ─── Lifecycle ────────────────────────────────────────────────────────────
+
+    def start(self, timeout=60.0):
+        """Load the collection and start keeping it current. Blocks until loaded."""
+        if self.mode == 'listener':
+            self._subscribe()
+            if not self._ready.wait(timeout):
+                raise TimeoutError("Timed out waiting for the students snapshot")
+            threading.Thread(target=self._watch_loop, name='student-replica-watch', daemon=True).start()
+        else:
+            self._replace_all(self.storage.get_all_students())
+            self._ready.set()
+            threading.Thread(target=self._poll_loop, daemon=True).start()
+        print(f"✅ Student replica ready ({self.mode}): {len(self)} students")
+        return self
+
+    def stop(self):
+        """Stop the listener / polling thread."""
+        self._stop.set()
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    def subscribe(self, callback):
+        """
+        Register callback(uid, profile_or_None) for every change applied to the
+        replica (None = student removed). Called from the listener thread.
+        """
+        self._subscribers.append(callback)
+
+    # ─── Change application ───────────────────────────────────────────────────
+
+    def _subscribe(self):
+        self._resync = True
+        self._watch = self.storage.watch_students(self._on_changes)
+
+    def _watch_loop(self):
+        delay = self.retry_delay
+        while not self._stop.wait(self.health_interval if self._watch is not None else delay):
+            watch = self._watch
+            if watch is not None and watch.is_active:
+                delay = self.retry_delay
+                continue
+            if watch is not None:
+                print("⚠️  Student replica listener stopped, resubscribing")
+                try:
+                    watch.unsubscribe()
+                except Exception:
+                    pass
+                self._watch = None
+            try:
+                self._subscribe()
+                self.resubscribes += 1
+            except Exception as e:
+                delay = min(delay * 2, self.max_retry_delay)
+                print(f"⚠️  Student replica resubscribe failed: {e} (retrying in {delay:.0f}s)")
+
+    def _on_changes(self, changes):
+        if self._resync:
+            # First snapshot of a (re)subscription: the whole collection
+            self._resync = False
+            self._replace_all({uid: data for uid, data in changes if data is not None})
+        else:
+            for uid, data in changes:
+                self._apply(uid, data)
+        self._ready.set()
+
+    def _poll_loop(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self._replace_all(self.storage.get_all_students())
+            except Exception as e:
+                print(f"⚠️  Student replica poll failed: {e}")
+
+    def _replace_all(self, students):
+        with self._lock:
+            current = dict(self._students)
+        for uid in current.keys() - students.keys():
+            self._apply(uid, None)
+        for uid, data in students.items():
+            if current.get(uid) != data:
+                self._apply(uid, data)
+
+    def _apply(self, uid, data):
+        with self._lock:
+            old = self._students.get(uid)
+            if old is not None and self._roll_index.get(old.get('roll_no')) == uid:
+                del self._roll_index[old.get('roll_no')]
+            if data is None:
+                self._students.pop(uid, None)
+            else:
+                self._students[uid] = data
+                if data.get('roll_no'):
+                    self._roll_index[data['roll_no']] = uid
+            self._missing.clear()
+        for callback in self._subscribers:
+            try:
+                callback(uid, data)
+            except Exception as e:
+                print(f"⚠️  Student replica subscriber failed for {uid}: {e}")
+
+    def upsert(self, uid, data):
+        """Apply a local write immediately (the listener confirms it later)."""
+        self._apply(uid, dict(data))
+
+    def remove(self, uid):
+        """Apply a local delete immediately."""
+        self._apply(uid, None)
+
+    # ─── Reads ────────────────────────────────────────────────────────────────
+
+    def get(self, uid):
+        """Student profile by UID, or None."""
+        return self.get_many([uid]).get(uid)
+
+    def get_many(self, uids):
+        """
+        Student profiles for many UIDs.
+        UIDs not in the replica are read through with one batched storage
+        call (covers writes from other instances not yet delivered).
+
+        Returns:
+            dict: {uid: profile dict}
+        """
+        uids = list(dict.fromkeys(uids))
+        with self._lock:
+            found = {uid: dict(self._students[uid]) for uid in uids if uid in self._students}
+            unknown = [uid for uid in uids if uid not in found and uid not in self._missing]
+        if unknown:
+            fetched = self.storage.get_students_by_uids(unknown)
+            for uid, data in fetched.items():
+                self._apply(uid, data)
+                found[uid] = dict(data)
+            with self._lock:
+                self._missing.update(uid for uid in unknown if uid not in fetched)
+        return found
+
+    def roll_no_exists(self, roll_no):
+        """Check whether a roll number is already enrolled."""
+        with self._lock:
+            return roll_no in self._roll_index
+
+    def list(self, branch='', sem=None):
+        """
+        All students, optionally filtered by branch and/or sem.
+
+        Returns:
+            list: [(uid, profile dict), ...]
+        """
+        with self._lock:
+            return [
+                (uid, dict(data)) for uid, data in self._students.items()
+                if (not branch or data.get('branch') == branch) and (sem is None or data.get('sem') == sem)
+            ]
+
+    def page(self, branch='', sem=None, sort_by='name', limit=50, page_token=None):
+        """
+        One page of students with the same cursor semantics as
+        list_students_page(), served from memory.
+
+        Returns:
+            tuple: (list of student dicts with STUDENT_LIST_FIELDS + 'uid', next_page_token or None)
+        """
+        if sort_by not in STUDENT_SORT_KEYS:
+            raise ValueError(f"sort_by must be one of: {', '.join(STUDENT_SORT_KEYS)}")
+        rows = sorted(
+            (_sort_key(data.get(sort_by), uid), uid, data) for uid, data in self.list(branch, sem)
+        )
+        start = 0
+        if page_token:
+            start = bisect.bisect_right([row[0] for row in rows], _sort_key(*decode_page_token(page_token)))
+
+        students = []
+        for _, uid, data in rows[start:start + limit]:
+            item = {field: data.get(field) for field in STUDENT_LIST_FIELDS}
+            item['uid'] = uid
+            students.append(item)
+
+        next_token = None
+        if start + limit < len(rows):
+            next_token = encode_page_token(students[-1].get(sort_by), students[-1]['uid'])
+        return students, next_token
+
+    def count_by_class(self):
+        """Student counts per branch and semester: {branch: {sem: count}}."""
+        counts = {}
+        with self._lock:
+            for data in self._students.values():
+                branch_counts = counts.setdefault(data.get('branch', '') or '', {})
+                branch_counts[data.get('sem')] = branch_counts.get(data.get('sem'), 0) + 1
+        return counts
+
+    def snapshot(self):
+        """Copy of every profile: {uid: profile dict}."""
+        with self._lock:
+            return {uid: dict(data) for uid, data in self._students.items()}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._students)
+
+
+class DirectStudentStore:
+    """
+    Same interface as StudentReplica, but every read goes to storage.
+    Used when STUDENT_REPLICA_MODE=off (e.g. many short-lived workers where a
+    listener per process is not worth it).
+    """
+
+    mode = 'off'
+
+    def __init__(self, storage):
+        self.storage = storage
+        self._subscribers = []
+
+    def start(self, timeout=None):
+        return self
+
+    def stop(self):
+        pass
+
+    def subscribe(self, callback):
+        # Without a listener, subscribers only see this process's own writes
+        self._subscribers.append(callback)
+
+    def upsert(self, uid, data):
+        for callback in self._subscribers:
+            callback(uid, dict(data))
+
+    def remove(self, uid):
+        for callback in self._subscribers:
+            callback(uid, None)
+
+    def get(self, uid):
+        return self.get_many([uid]).get(uid)
+
+    def get_many(self, uids):
+        return self.storage.get_students_by_uids(uids)
+
+    def roll_no_exists(self, roll_no):
+        return self.storage.get_student_by_roll_no(roll_no) is not None
+
+    def list(self, branch='', sem=None):
+        return self.storage.list_students(branch, sem)
+
+    def page(self, branch='', sem=None, sort_by='name', limit=50, page_token=None):
+        return self.storage.list_students_page(branch=branch, sem=sem, sort_by=sort_by,
+                                               limit=limit, page_token=page_token)
+
+    def count_by_class(self):
+        return self.storage.count_students_by_class()
+
+    def snapshot(self):
+        return self.storage.get_all_students()
+
+    def __len__(self):
+        return sum(sum(sems.values()) for sems in self.count_by_class().values())
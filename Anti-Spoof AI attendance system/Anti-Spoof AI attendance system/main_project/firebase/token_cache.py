@@ -0,0 +1,184 @@
+# Cache of verified Firebase ID tokens.
+# verify_id_token checks an RSA signature (and may refetch Google's public
+# certificates) on every call, while the frontend sends the same token to
+# several endpoints in a row. Decoded tokens are kept, keyed by a SHA-256 of
+# the token, until the token's own `exp`; revoke(uid) drops a user's entries
+# and rejects any of their tokens issued before the revocation. Like Firebase's
+# tokensValidAfterTime, the cutoff is in whole seconds (the resolution of
+# `iat`), so a token issued in the same second as the revocation is valid.
+#
+# AUTH_TEST_MODE=1 swaps Firebase for LocalTokenIssuer: tokens signed with a
+# local RSA key (see scripts/issue_test_token.py), so the API can be driven
+# without a Firebase project.
+
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Firebase ID tokens live for one hour
+MAX_TOKEN_LIFETIME = 3600
+
+
+class TokenCache:
+    """
+    Bounded LRU cache of decoded ID tokens.
+
+    Args:
+        verifier: Function(id_token) -> decoded claims dict (with 'uid' and 'exp'),
+                  raising on an invalid token
+        max_entries (int): Tokens kept at most (least recently used are dropped)
+    """
+
+    def __init__(self, verifier, max_entries=10000):
+        self.verifier = verifier
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # token hash -> (decoded claims, exp)
+        self._by_uid = {}              # uid -> {token hash}
+        self._valid_after = {}         # uid -> tokens with iat before this epoch second are revoked
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(id_token):
+        return hashlib.sha256(id_token.encode('utf-8')).hexdigest()
+
+    def verify(self, id_token):
+        """
+        Decoded claims of `id_token`, verifying it only on a cache miss.
+        Raises PermissionError for a revoked token; verifier errors pass through.
+        """
+        key = self._key(id_token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(entry[0])
+            if entry is not None:
+                self._drop(key)
+            self.misses += 1
+
+        decoded = self.verifier(id_token)
+        uid = decoded['uid']
+        with self._lock:
+            if decoded.get('iat', now) < self._valid_after.get(uid, 0):
+                raise PermissionError("Token has been revoked")
+            exp = decoded.get('exp', now)
+            if exp > now:
+                self._entries[key] = (dict(decoded), exp)
+                self._by_uid.setdefault(uid, set()).add(key)
+                while len(self._entries) > self.max_entries:
+                    self._drop(next(iter(self._entries)))
+        return decoded
+
+    def _drop(self, key):
+        decoded, _ = self._entries.pop(key)
+        keys = self._by_uid.get(decoded['uid'])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_uid[decoded['uid']]
+
+    def revoke(self, uid):
+        """
+        Revocation hook: forget every cached token of `uid` and reject their
+        tokens issued before the current second (call after revoking refresh tokens, deleting
+        or disabling the user, or changing their role).
+        """
+        now = int(time.time())
+        with self._lock:
+            for key in list(self._by_uid.get(uid, ())):
+                self._drop(key)
+            self._valid_after[uid] = now
+            # Older revocations can't match an unexpired token any more
+            for other in [u for u, t in self._valid_after.items() if t < now - MAX_TOKEN_LIFETIME]:
+                del self._valid_after[other]
+
+    def forget(self, id_token):
+        """Drop one token from the cache (e.g. on sign-out)."""
+        with self._lock:
+            key = self._key(id_token)
+            if key in self._entries:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_uid.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class LocalTokenIssuer:
+    """
+    Issues and verifies Firebase-shaped ID tokens (RS256) with a local,
+    self-signed RSA key, for AUTH_TEST_MODE. Needs PyJWT + cryptography
+    (both installed with firebase-admin).
+
+    Args:
+        key_path (str): PEM file of the private key (created if missing)
+        project_id (str): Audience / issuer project of the tokens
+    """
+
+    def __init__(self, key_path, project_id='attendance-test'):
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+
+        if os.path.exists(key_path):
+            with open(key_path, 'rb') as f:
+                self._private_key = serialization.load_pem_private_key(f.read(), password=None)
+        else:
+            self._private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+            os.makedirs(os.path.dirname(os.path.abspath(key_path)), exist_ok=True)
+            with open(key_path, 'wb') as f:
+                f.write(self._private_key.private_bytes(
+                    serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                    serialization.NoEncryption()))
+            print(f"✅ Test signing key created: {key_path}")
+        self._public_key = self._private_key.public_key()
+        self.project_id = project_id
+        self.issuer = f'https://securetoken.google.com/{project_id}'
+
+    @classmethod
+    def from_env(cls):
+        """Issuer for AUTH_TEST_KEY_PATH (relative to main_project/) and AUTH_TEST_PROJECT_ID."""
+        key_path = os.getenv('AUTH_TEST_KEY_PATH', 'local_cache/test_auth_key.pem')
+        if not os.path.isabs(key_path):
+            key_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), key_path)
+        return cls(key_path, project_id=os.getenv('AUTH_TEST_PROJECT_ID', 'attendance-test'))
+
+    def issue(self, uid, role='student', ttl=MAX_TOKEN_LIFETIME, **claims):
+        """Signed ID token for `uid` with the given role claim."""
+        import jwt
+
+        now = int(time.time())
+        payload = {
+            'iss': self.issuer,
+            'aud': self.project_id,
+            'sub': uid,
+            'user_id': uid,
+            'auth_time': now,
+            'iat': now,
+            'exp': now + int(ttl),
+            'role': role,
+            **claims
+        }
+        return jwt.encode(payload, self._private_key, algorithm='RS256', headers={'kid': 'local-test'})
+
+    def verify(self, id_token):
+        """Same contract as firebase_auth.verify_id_token: decoded claims plus 'uid'."""
+        import jwt
+
+        try:
+            decoded = jwt.decode(id_token, self._public_key, algorithms=['RS256'],
+                                 audience=self.project_id, issuer=self.issuer)
+        except jwt.InvalidTokenError as e:
+            raise ValueError(f"Invalid test ID token: {e}")
+        decoded['uid'] = decoded['sub']
+        return decoded
@@ -0,0 +1,104 @@
+"""
+Rebuild the materialized attendance counters (attendance_stats/...) from the
+existing attendance_log documents. log_attendance() keeps the counters
+current from then on; run this once after upgrading, or whenever the
+counters need to be rebuilt. Each class (branch+sem) is an independent
+partition, so classes are aggregated in parallel.
+
+Run it while no attendance is being marked - sessions logged during the
+rebuild of their class may be counted twice or not at all.
+
+Usage:
+    python scripts/backfill_attendance_stats.py [--workers 8] [--dry-run]
+"""
+
+import os
+import sys
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))  # main_project/
+
+from firebase.firebase_service import (
+    initialize_firebase,
+    count_students_by_class,
+    attendance_stats_ref,
+    presence_map,
+    commit_writes
+)
+
+def aggregate_class(db, branch, sem):
+    """
+    Count sessions per subject and present sessions per student per subject
+    for one class.
+
+    Returns:
+        tuple: (sessions {subject: n}, present {uid: {subject: n}})
+    """
+    sessions = {}
+    present = {}
+    query = (db.collection('attendance_log')
+               .where('branch', '==', branch)
+               .where('sem', '==', sem)
+               .select(['subject', 'present', 'detected_students', 'session_roster', 'session_presence',
+                        'session_confidence', 'session_confidence_dtype']))
+    for doc in query.stream():
+        data = doc.to_dict()
+        subject = data.get('subject', '')
+        if not subject:
+            continue
+        sessions[subject] = sessions.get(subject, 0) + 1
+        for uid in presence_map(data):
+            counts = present.setdefault(uid, {})
+            counts[subject] = counts.get(subject, 0) + 1
+    return sessions, present
+
+def write_class_stats(db, branch, sem, sessions, present):
+    """Overwrite one class's counter documents (stale student docs are deleted)."""
+    class_ref = attendance_stats_ref(db, branch, sem)
+    students_col = class_ref.collection('students')
+    stale = [doc.reference for doc in students_col.select([]).stream() if doc.id not in present]
+
+    writes = [('set', class_ref, {'branch': branch, 'sem': sem, 'sessions': sessions})]
+    writes += [('set', students_col.document(uid), {'present': counts}) for uid, counts in present.items()]
+    writes += [('delete', ref, None) for ref in stale]
+    commit_writes(db, writes)
+
+def backfill_attendance_stats(db, workers=8, dry_run=False):
+    """
+    Rebuild the counters for every class that has enrolled students.
+
+    Args:
+        db: Firestore client
+        workers (int): Classes aggregated concurrently
+        dry_run (bool): Aggregate and report without writing
+
+    Returns:
+        int: Number of sessions counted
+    """
+    classes = [(branch, sem) for branch, sems in count_students_by_class(db).items() for sem in sems]
+    print(f"📊 Rebuilding attendance counters for {len(classes)} class(es) with {workers} worker(s)...")
+
+    def _rebuild(cls):
+        branch, sem = cls
+        sessions, present = aggregate_class(db, branch, sem)
+        if not dry_run:
+            write_class_stats(db, branch, sem, sessions, present)
+        total = sum(sessions.values())
+        print(f"  ✅ {branch or '—'} sem {sem}: {total} session(s), {len(present)} student(s)")
+        return total
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        total_sessions = sum(pool.map(_rebuild, classes))
+
+    action = "Counted" if dry_run else "Rebuilt counters from"
+    print(f"✅ {action} {total_sessions} session(s)")
+    return total_sessions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild materialized attendance counters from attendance logs')
+    parser.add_argument('--workers', type=int, default=8, help='Classes aggregated in parallel')
+    parser.add_argument('--dry-run', action='store_true', help='Aggregate without writing')
+    args = parser.parse_args()
+
+    print("🔥 Initializing Firebase...")
+    backfill_attendance_stats(initialize_firebase(), workers=args.workers, dry_run=args.dry_run)
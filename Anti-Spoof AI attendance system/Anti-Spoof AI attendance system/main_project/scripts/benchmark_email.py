@@ -0,0 +1,112 @@
+"""
+Mail throughput benchmark against a local SMTP stand-in (aiosmtpd).
+Compares one connection + login per email (the old send path) with the
+pooled MailDispatcher. The stand-in can add a delay to the handshake
+(EHLO) and to each message, to approximate a remote server's round trips.
+
+Usage:
+    pip install aiosmtpd
+    python scripts/benchmark_email.py
+    python scripts/benchmark_email.py --messages 300 --connections 2 --handshake-ms 150 --message-ms 20
+"""
+
+import os
+import sys
+import time
+import asyncio
+import smtplib
+import logging
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))  # main_project/
+
+from scripts.email_service import MailDispatcher, _build_absence_message
+
+
+class _CountingHandler:
+    def __init__(self, handshake_delay, message_delay):
+        self.handshake_delay = handshake_delay
+        self.message_delay = message_delay
+        self.received = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        session.host_name = hostname
+        await asyncio.sleep(self.handshake_delay)
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.message_delay)
+        self.received += 1
+        return '250 OK'
+
+
+def _accept_all(server, session, envelope, mechanism, auth_data):
+    from aiosmtpd.smtp import AuthResult
+    return AuthResult(success=True)
+
+
+def _messages(count):
+    return [(f'student{i}@example.com',
+             _build_absence_message(f'Student {i}', f'student{i}@example.com', '2026-02-21', 'Lecture'))
+            for i in range(count)]
+
+
+def run_per_email(host, port, messages):
+    """Old path: connect, log in and quit for every message."""
+    start = time.perf_counter()
+    for to_addr, msg in messages:
+        with smtplib.SMTP(host, port) as server:
+            server.login('bench', 'bench')
+            server.sendmail('bench@example.com', to_addr, msg.as_string())
+    return time.perf_counter() - start
+
+
+def run_dispatcher(host, port, messages, connections, batch_size):
+    dispatcher = MailDispatcher(host, port, 'bench@example.com', password='bench', use_ssl=False,
+                                connections=connections, batch_size=batch_size,
+                                rate_per_sec=0, queue_size=len(messages) + 1).start()
+    start = time.perf_counter()
+    futures = [dispatcher.send(to_addr, msg) for to_addr, msg in messages]
+    for future in futures:
+        future.result()
+    elapsed = time.perf_counter() - start
+    dispatcher.stop()
+    return elapsed, dispatcher.stats()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark per-email SMTP vs the pooled MailDispatcher')
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--connections', type=int, default=2, help='Dispatcher connections')
+    parser.add_argument('--batch-size', type=int, default=20)
+    parser.add_argument('--handshake-ms', type=float, default=50, help='Delay added to each EHLO')
+    parser.add_argument('--message-ms', type=float, default=5, help='Delay added to each DATA')
+    parser.add_argument('--port', type=int, default=8025)
+    args = parser.parse_args()
+
+    try:
+        from aiosmtpd.controller import Controller
+    except ImportError:
+        sys.exit('❌ aiosmtpd is not installed: pip install aiosmtpd')
+
+    # aiosmtpd logs a deprecation notice about its own login_data on every AUTH
+    logging.getLogger('mail.log').setLevel(logging.ERROR)
+    handler = _CountingHandler(args.handshake_ms / 1000, args.message_ms / 1000)
+    controller = Controller(handler, hostname='127.0.0.1', port=args.port,
+                            authenticator=_accept_all, auth_require_tls=False)
+    controller.start()
+    try:
+        messages = _messages(args.messages)
+        print(f"📧 {args.messages} messages, handshake +{args.handshake_ms:.0f} ms, "
+              f"message +{args.message_ms:.0f} ms")
+
+        elapsed = run_per_email('127.0.0.1', args.port, messages)
+        print(f"   per-email connection : {elapsed:7.2f}s  {args.messages / elapsed:8.1f} msg/s  "
+              f"({args.messages} logins)")
+
+        elapsed, stats = run_dispatcher('127.0.0.1', args.port, messages, args.connections, args.batch_size)
+        print(f"   pooled dispatcher    : {elapsed:7.2f}s  {args.messages / elapsed:8.1f} msg/s  "
+              f"({stats['connects']} logins, {stats['failed']} failed)")
+        print(f"✅ Server received {handler.received} messages")
+    finally:
+        controller.stop()
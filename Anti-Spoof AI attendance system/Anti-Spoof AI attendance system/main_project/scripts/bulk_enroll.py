@@ -0,0 +1,79 @@
+"""
+Bulk-enroll students from a CSV roster and a zip of photos through the
+running backend (POST /api/students/bulk), printing progress and per-row
+errors until the job finishes.
+
+CSV columns: name, roll_no, branch, sem, email, password[, photo]
+Photos: <roll_no>.jpg, files inside a <roll_no>/ folder, or the names
+listed in the photo column (separated by ';').
+
+Usage:
+    python scripts/bulk_enroll.py roster.csv photos.zip --token <admin ID token>
+    python scripts/bulk_enroll.py roster.csv photos.zip --email admin@x.com --password ...
+        (signs in with the Firebase Web API key from FIREBASE_WEB_API_KEY / --api-key)
+"""
+
+import os
+import sys
+import time
+import argparse
+import requests
+
+SIGN_IN_URL = 'https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={}'
+
+def sign_in(email, password, api_key):
+    """Exchange admin credentials for a Firebase ID token."""
+    resp = requests.post(SIGN_IN_URL.format(api_key),
+                         json={'email': email, 'password': password, 'returnSecureToken': True},
+                         timeout=30)
+    if resp.status_code != 200:
+        raise SystemExit(f"❌ Sign-in failed: {resp.json().get('error', {}).get('message', resp.text)}")
+    return resp.json()['idToken']
+
+def bulk_enroll(url, token, csv_path, zip_path, poll_interval=2.0):
+    """
+    Upload the roster and follow the job until it finishes.
+
+    Returns:
+        dict: Final job status (see GET /api/students/bulk/<job_id>)
+    """
+    headers = {'Authorization': f'Bearer {token}'}
+    with open(csv_path, 'rb') as roster, open(zip_path, 'rb') as photos:
+        resp = requests.post(f'{url}/api/students/bulk', headers=headers,
+                             files={'roster': roster, 'photos': photos}, timeout=600)
+    if resp.status_code != 202:
+        raise SystemExit(f"❌ {resp.json().get('error', resp.text)}")
+
+    job = resp.json()
+    print(f"📋 Job {job['job_id']}: {job['total']} row(s), {job['failed']} rejected during validation")
+    while job['status'] == 'running':
+        time.sleep(poll_interval)
+        job = requests.get(f"{url}/api/students/bulk/{job['job_id']}", headers=headers, timeout=30).json()
+        photos = f", photos {job['photos_done']}/{job['photos_total']}" if job['photos_total'] else ''
+        print(f"  … {job['phase']}: {job['processed']}/{job['total']} rows done{photos}, "
+              f"{job['enrolled']} enrolled, {job['failed']} failed ({job['elapsed']}s)")
+
+    for error in job['errors']:
+        print(f"  ❌ row {error['row']} ({error['roll_no'] or '—'}): {error['error']}")
+    print(f"✅ {job['enrolled']} enrolled, {job['failed']} failed in {job['elapsed']}s")
+    return job
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bulk-enroll students from a CSV roster and a photo zip')
+    parser.add_argument('csv', help='Roster CSV')
+    parser.add_argument('photos', help='Zip archive of photos')
+    parser.add_argument('--url', default=os.getenv('BACKEND_URL', 'http://localhost:5000'))
+    parser.add_argument('--token', default=os.getenv('ADMIN_ID_TOKEN'), help='Admin Firebase ID token')
+    parser.add_argument('--email', help='Admin email (instead of --token)')
+    parser.add_argument('--password', help='Admin password (instead of --token)')
+    parser.add_argument('--api-key', default=os.getenv('FIREBASE_WEB_API_KEY'), help='Firebase Web API key')
+    args = parser.parse_args()
+
+    token = args.token
+    if not token:
+        if not (args.email and args.password and args.api_key):
+            parser.error('Provide --token, or --email, --password and --api-key')
+        token = sign_in(args.email, args.password, args.api_key)
+
+    job = bulk_enroll(args.url.rstrip('/'), token, args.csv, args.photos)
+    sys.exit(0 if job['status'] == 'done' else 1)
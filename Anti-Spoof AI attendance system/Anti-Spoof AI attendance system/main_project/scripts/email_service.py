@@ -17,24 +17,60 @@ Setup:
 import smtplib
 import ssl
 import os
+import time
+import queue
 import threading
+from concurrent.futures import Future
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv, find_dotenv
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from storage.email_outbox import EmailOutbox
 
 load_dotenv(find_dotenv())
 
-SMTP_SERVER = "smtp.gmail.com"
-SMTP_PORT = 465  # SSL port
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))  # SSL port
+SMTP_USE_SSL = os.getenv("SMTP_USE_SSL", "true").lower() == "true"
 
 EMAIL_SENDER   = os.getenv("EMAIL_SENDER", "")
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD", "")
 EMAIL_ENABLED  = os.getenv("EMAIL_ENABLED", "false").lower() == "true"
 
+# Mail dispatcher: persistent connections, messages per batch, send rate cap
+EMAIL_CONNECTIONS    = int(os.getenv("EMAIL_CONNECTIONS", "2"))
+EMAIL_BATCH_SIZE     = int(os.getenv("EMAIL_BATCH_SIZE", "20"))
+EMAIL_RATE_PER_SEC   = float(os.getenv("EMAIL_RATE_PER_SEC", "5"))
+EMAIL_QUEUE_SIZE     = int(os.getenv("EMAIL_QUEUE_SIZE", "1000"))
+# Gmail drops a connection after ~100 messages; reconnect before that
+EMAIL_MAX_PER_CONNECTION = int(os.getenv("EMAIL_MAX_PER_CONNECTION", "90"))
+
+# Digest mode: collect absences and send one summary per student at EMAIL_DIGEST_TIME
+EMAIL_DIGEST      = os.getenv("EMAIL_DIGEST", "false").lower() == "true"
+EMAIL_DIGEST_TIME = os.getenv("EMAIL_DIGEST_TIME", "18:00")  # local HH:MM
+
+# Outbox: notifications are written to local SQLite first and survive restarts
+EMAIL_OUTBOX      = os.getenv("EMAIL_OUTBOX", "false").lower() == "true"
+EMAIL_OUTBOX_PATH = os.getenv("EMAIL_OUTBOX_PATH", "local_cache/email_outbox.db")
+
 
-def _build_absence_html(student_name: str, date: str, subject: str = "Class") -> str:
-    """Build a styled HTML email body for absence notification."""
+def _build_absence_html(student_name: str, date: str, subject: str = "Class",
+                        absences: list = None) -> str:
+    """
+    Build a styled HTML email body for absence notification.
+    With `absences` (list of (date, subject) pairs) it lists every session
+    instead, for a digest.
+    """
+    if absences:
+        sessions = "the following sessions"
+        details = "<br>\n        ".join(
+            f"<strong>{session_subject}</strong> &ndash; {session_date}"
+            for session_date, session_subject in absences)
+    else:
+        sessions = "the following session"
+        details = (f"<strong>Subject/Class:</strong> {subject}<br>\n"
+                   f"        <strong>Date:</strong> {date}")
     return f"""
 <!DOCTYPE html>
 <html>
@@ -65,11 +101,10 @@ def _build_absence_html(student_name: str, date: str, subject: str = "Class") ->
       <p>
         This is an automated notification from the
         <strong>AI Attendance System</strong>.
-        Our system has recorded your absence for the following session:
+        Our system has recorded your absence for {sessions}:
       </p>
       <div class="highlight">
-        <strong>Subject/Class:</strong> {subject}<br>
-        <strong>Date:</strong> {date}
+        {details}
       </div>
       <p>
         If you believe this is an error or if you were present but not detected,
@@ -90,10 +125,409 @@ def _build_absence_html(student_name: str, date: str, subject: str = "Class") ->
 """
 
 
+def _build_absence_message(student_name: str, student_email: str,
+                           date: str, subject: str = "Class") -> MIMEMultipart:
+    """Absence notification with plain-text and HTML parts."""
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = f"Absence Notice – {date}"
+    msg["From"]    = f"AI Attendance System <{EMAIL_SENDER}>"
+    msg["To"]      = student_email
+
+    # Plain-text fallback
+    plain_text = (
+        f"Dear {student_name},\n\n"
+        f"You were marked ABSENT for '{subject}' on {date}.\n\n"
+        f"If this is an error, please contact your administrator.\n\n"
+        f"Regards,\nAI Attendance System"
+    )
+
+    msg.attach(MIMEText(plain_text, "plain"))
+    msg.attach(MIMEText(_build_absence_html(student_name, date, subject), "html"))
+    return msg
+
+
+# --------------------- MAIL DISPATCHER ---------------------
+
+class _RateLimiter:
+    """Token bucket shared by all connections: at most `rate` sends per second."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._tokens = 1.0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(1.0, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            wait = (1.0 - self._tokens) / self.rate
+            self._tokens -= 1.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class MailQueueFull(RuntimeError):
+    """The dispatcher queue stayed full for the whole enqueue timeout."""
+
+
+class MailDispatcher:
+    """
+    Process-wide mail sender. A fixed pool of worker threads each keeps one
+    authenticated SMTP connection open and sends queued messages over it in
+    batches, instead of a TLS handshake and login per email.
+
+    Args:
+        host, port   : SMTP server
+        sender       : Envelope sender (and login user)
+        password     : Login password ('' = no login, e.g. a local test server)
+        use_ssl      : SMTP_SSL (implicit TLS) instead of plain SMTP
+        connections  : Worker threads / open connections
+        batch_size   : Messages taken from the queue per connection check
+        rate_per_sec : Send rate cap across all connections (0 = unlimited)
+        queue_size   : Messages waiting at most (see send() for what happens beyond that)
+        max_per_connection : Messages sent before a connection is recycled
+    """
+
+    def __init__(self, host: str, port: int, sender: str, password: str = "",
+                 use_ssl: bool = True, connections: int = 2, batch_size: int = 20,
+                 rate_per_sec: float = 5.0, queue_size: int = 1000,
+                 max_per_connection: int = 90):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.password = password
+        self.use_ssl = use_ssl
+        self.connections = max(1, connections)
+        self.batch_size = max(1, batch_size)
+        self.max_per_connection = max_per_connection
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._limiter = _RateLimiter(rate_per_sec)
+        self._lock = threading.Lock()
+        self._threads = []
+        self.sent = 0
+        self.failed = 0
+        self.rejected = 0
+        self.connects = 0
+
+    def start(self):
+        for n in range(self.connections):
+            thread = threading.Thread(target=self._work, name=f'mail-{n}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        """Send what is queued, then close every connection."""
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def send(self, to_addr: str, msg, timeout: float = 0.0) -> Future:
+        """
+        Queue one message. The Future resolves to True once the server
+        accepted it, or raises the SMTP error.
+
+        A full queue never holds up the caller (e.g. the marking pipeline)
+        for longer than `timeout` seconds (0 = not at all, None = wait for
+        room); past that the Future fails with MailQueueFull.
+        """
+        future = Future()
+        future.set_running_or_notify_cancel()
+        try:
+            self._queue.put((to_addr, msg, future), block=timeout != 0, timeout=timeout or None)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            future.set_exception(MailQueueFull(f"Mail queue full ({self._queue.maxsize} waiting)"))
+        return future
+
+    def _connect(self):
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.host, self.port, context=ssl.create_default_context(), timeout=30)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.password:
+            server.login(self.sender, self.password)
+        with self._lock:
+            self.connects += 1
+        return server
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except Exception:
+            pass
+
+    def _work(self):
+        server, sent_on_conn = None, 0
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # handled after this batch
+                    break
+                batch.append(item)
+
+            # An idle connection may have been dropped by the server
+            if server is not None:
+                try:
+                    if server.noop()[0] != 250:
+                        raise smtplib.SMTPServerDisconnected()
+                except Exception:
+                    self._close(server)
+                    server, sent_on_conn = None, 0
+
+            for to_addr, msg, future in batch:
+                self._limiter.acquire()
+                for attempt in range(2):
+                    try:
+                        if server is None or sent_on_conn >= self.max_per_connection:
+                            if server is not None:
+                                self._close(server)
+                            server, sent_on_conn = None, 0
+                            server = self._connect()
+                        server.sendmail(self.sender, to_addr, msg.as_string())
+                        sent_on_conn += 1
+                        self._finish(future, None)
+                        break
+                    except smtplib.SMTPRecipientsRefused as e:
+                        # Bad address: the connection is still fine
+                        self._finish(future, e)
+                        break
+                    except (smtplib.SMTPException, OSError) as e:
+                        # Dropped or broken connection: reconnect and retry once
+                        if server is not None:
+                            self._close(server)
+                        server, sent_on_conn = None, 0
+                        if attempt == 1 or isinstance(e, smtplib.SMTPAuthenticationError):
+                            self._finish(future, e)
+                            break
+        if server is not None:
+            self._close(server)
+
+    def _finish(self, future, error):
+        with self._lock:
+            if error is None:
+                self.sent += 1
+            else:
+                self.failed += 1
+        if error is None:
+            future.set_result(True)
+        else:
+            future.set_exception(error)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'sent': self.sent,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'connects': self.connects
+            }
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher() -> MailDispatcher:
+    """The process-wide MailDispatcher for the configured SMTP account."""
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = MailDispatcher(
+                    SMTP_SERVER, SMTP_PORT, EMAIL_SENDER, EMAIL_PASSWORD,
+                    use_ssl=SMTP_USE_SSL, connections=EMAIL_CONNECTIONS,
+                    batch_size=EMAIL_BATCH_SIZE, rate_per_sec=EMAIL_RATE_PER_SEC,
+                    queue_size=EMAIL_QUEUE_SIZE, max_per_connection=EMAIL_MAX_PER_CONNECTION
+                ).start()
+    return _dispatcher
+
+
+# --------------------- DAILY DIGEST ---------------------
+
+def _next_send_time(send_at: str) -> float:
+    """Epoch time of the next local `send_at` ("HH:MM")."""
+    hour, minute = send_at.split(":")
+    now = datetime.now()
+    target = now.replace(hour=int(hour), minute=int(minute), second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return target.timestamp()
+
+
+def _build_digest_message(student_name: str, student_email: str, absences: list) -> MIMEMultipart:
+    """One summary email listing `absences` ((date, subject) pairs, in order)."""
+    dates = sorted({date for date, _ in absences})
+    period = dates[0] if len(dates) == 1 else f"{dates[0]} to {dates[-1]}"
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = f"Absence Summary – {period}"
+    msg["From"]    = f"AI Attendance System <{EMAIL_SENDER}>"
+    msg["To"]      = student_email
+
+    lines = "\n".join(f"  - {subject} on {date}" for date, subject in absences)
+    plain_text = (
+        f"Dear {student_name},\n\n"
+        f"You were marked ABSENT for {len(absences)} session(s):\n{lines}\n\n"
+        f"If this is an error, please contact your administrator.\n\n"
+        f"Regards,\nAI Attendance System"
+    )
+
+    msg.attach(MIMEText(plain_text, "plain"))
+    msg.attach(MIMEText(_build_absence_html(student_name, dates[-1], absences=absences), "html"))
+    return msg
+
+
+class AbsenceDigest:
+    """
+    Collects absences per student and sends each student one summary email
+    per window instead of one email per session.
+
+    Args:
+        send_at : Local time of day ("HH:MM") the collected absences are sent
+    """
+
+    def __init__(self, send_at: str = "18:00"):
+        self.send_at = send_at
+        self._lock = threading.Lock()
+        self._pending = {}  # email -> {'name': str, 'absences': [(date, subject)]}
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='mail-digest', daemon=True)
+            self._thread.start()
+        return self
+
+    def add(self, absent_students: list, date: str, subject: str = "Class"):
+        """Record one session's absentees (same arguments as notify_absent_students_async)."""
+        with self._lock:
+            for student in absent_students:
+                email = student.get('email', '')
+                if not email:
+                    continue
+                entry = self._pending.setdefault(email, {'name': student.get('name', 'Student'), 'absences': []})
+                # A session marked twice is listed once
+                if (date, subject) not in entry['absences']:
+                    entry['absences'].append((date, subject))
+
+    def pending(self) -> int:
+        """Students with a digest waiting to be sent."""
+        with self._lock:
+            return len(self._pending)
+
+    def _run(self):
+        while True:
+            self._wake.wait(_next_send_time(self.send_at) - time.time())
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️  Absence digest failed: {e}")
+
+    def flush(self):
+        """Send every collected digest now (one email per student)."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        print(f"📧 Sending absence digest to {len(pending)} student(s)...")
+        dispatcher = get_dispatcher()
+        futures = []
+        for email, entry in pending.items():
+            msg = _build_digest_message(entry['name'], email, entry['absences'])
+            futures.append((email, dispatcher.send(email, msg, timeout=None)))
+        success = 0
+        for email, future in futures:
+            try:
+                future.result()
+                success += 1
+            except Exception as e:
+                _report_error(email, e)
+        print(f"📧 Digest summary: {success}/{len(pending)} sent successfully")
+
+
+_digest = None
+_digest_lock = threading.Lock()
+
+
+def get_digest() -> AbsenceDigest:
+    """The process-wide AbsenceDigest (EMAIL_DIGEST=true), started on first use."""
+    global _digest
+    if _digest is None:
+        with _digest_lock:
+            if _digest is None:
+                _digest = AbsenceDigest(EMAIL_DIGEST_TIME).start()
+                print(f"✅ Absence digest mode: summaries go out daily at {EMAIL_DIGEST_TIME}")
+    return _digest
+
+
+# --------------------- OUTBOX ---------------------
+
+def _send_outbox_email(student_email: str, payloads: list) -> Future:
+    """Outbox sender: one absence email, or a summary when several are due together."""
+    name = payloads[0].get('name', 'Student')
+    if len(payloads) == 1:
+        msg = _build_absence_message(name, student_email, payloads[0]['date'], payloads[0]['subject'])
+    else:
+        absences = list(dict.fromkeys((p['date'], p['subject']) for p in payloads))
+        msg = _build_digest_message(name, student_email, absences)
+    return get_dispatcher().send(student_email, msg)
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox():
+    """The process-wide EmailOutbox (started once), or None unless EMAIL_OUTBOX=true."""
+    global _outbox
+    if EMAIL_OUTBOX and _outbox is None:
+        with _outbox_lock:
+            if _outbox is None:
+                path = EMAIL_OUTBOX_PATH
+                if not os.path.isabs(path):
+                    path = os.path.join(os.path.dirname(__file__), '..', path)
+                _outbox = EmailOutbox(os.path.normpath(path), _send_outbox_email,
+                                      batch_size=EMAIL_BATCH_SIZE).start()
+    return _outbox
+
+
+def _email_ready() -> bool:
+    if not EMAIL_SENDER or not EMAIL_PASSWORD:
+        print("⚠️  EMAIL_SENDER / EMAIL_PASSWORD not set in .env — skipping email")
+        return False
+    return True
+
+
+def _report_error(student_email: str, e: Exception):
+    if isinstance(e, smtplib.SMTPAuthenticationError):
+        print("❌ Email auth failed — check EMAIL_SENDER and EMAIL_PASSWORD in .env")
+    else:
+        print(f"❌ Failed to send email to {student_email}: {e}")
+
+
 def send_absence_email(student_name: str, student_email: str,
                        date: str, subject: str = "Class") -> bool:
     """
-    Send a single absence notification email.
+    Send a single absence notification email (blocks until it is sent).
 
     Args:
         student_name  : Student's full name
@@ -108,69 +542,81 @@ def send_absence_email(student_name: str, student_email: str,
         print(f"📧 [Email disabled] Would notify {student_name} <{student_email}> for absence on {date}")
         return False
 
-    if not EMAIL_SENDER or not EMAIL_PASSWORD:
-        print("⚠️  EMAIL_SENDER / EMAIL_PASSWORD not set in .env — skipping email")
+    if not _email_ready():
         return False
 
     try:
-        msg = MIMEMultipart("alternative")
-        msg["Subject"] = f"Absence Notice – {date}"
-        msg["From"]    = f"AI Attendance System <{EMAIL_SENDER}>"
-        msg["To"]      = student_email
-
-        # Plain-text fallback
-        plain_text = (
-            f"Dear {student_name},\n\n"
-            f"You were marked ABSENT for '{subject}' on {date}.\n\n"
-            f"If this is an error, please contact your administrator.\n\n"
-            f"Regards,\nAI Attendance System"
-        )
-
-        msg.attach(MIMEText(plain_text, "plain"))
-        msg.attach(MIMEText(_build_absence_html(student_name, date, subject), "html"))
-
-        context = ssl.create_default_context()
-        with smtplib.SMTP_SSL(SMTP_SERVER, SMTP_PORT, context=context) as server:
-            server.login(EMAIL_SENDER, EMAIL_PASSWORD)
-            server.sendmail(EMAIL_SENDER, student_email, msg.as_string())
-
+        msg = _build_absence_message(student_name, student_email, date, subject)
+        get_dispatcher().send(student_email, msg, timeout=None).result()
         print(f"✅ Absence email sent to {student_name} <{student_email}> for {date}")
         return True
-
-    except smtplib.SMTPAuthenticationError:
-        print("❌ Email auth failed — check EMAIL_SENDER and EMAIL_PASSWORD in .env")
-        return False
     except Exception as e:
-        print(f"❌ Failed to send email to {student_email}: {e}")
+        _report_error(student_email, e)
         return False
 
 
-def notify_absent_students_async(absent_students: list, date: str, subject: str = "Class"):
+def notify_absent_students_async(absent_students: list, date: str, subject: str = "Class",
+                                 log_id: str = None):
     """
-    Send absence notification emails to all absent students in a background thread.
-    Non-blocking — the API response is returned immediately while emails send.
+    Queue absence notification emails for all absent students on the shared
+    dispatcher. Non-blocking — the API response is returned immediately while
+    emails send; emails that don't fit in a full dispatcher queue are reported
+    as failed (use EMAIL_OUTBOX=true to have them retried). With EMAIL_DIGEST=true
+    the absences are only collected for the student's daily summary; with
+    EMAIL_OUTBOX=true they are written to the durable outbox first.
 
     Args:
-        absent_students : list of dicts [{'name': str, 'email': str}, ...]
+        absent_students : list of dicts [{'uid': str, 'name': str, 'email': str}, ...]
         date            : attendance date string
         subject         : class / subject name
+        log_id          : attendance log id (one email per student and session)
     """
     if not absent_students:
         return
 
-    def _send_all():
-        print(f"📧 Sending {len(absent_students)} absence notification(s) for {date}...")
-        success = 0
+    if not EMAIL_ENABLED:
         for student in absent_students:
-            ok = send_absence_email(
-                student_name=student.get('name', 'Student'),
-                student_email=student.get('email', ''),
-                date=date,
-                subject=subject
-            )
-            if ok:
-                success += 1
-        print(f"📧 Email summary: {success}/{len(absent_students)} sent successfully")
+            print(f"📧 [Email disabled] Would notify {student.get('name', 'Student')} "
+                  f"<{student.get('email', '')}> for absence on {date}")
+        return
+
+    if not _email_ready():
+        return
+
+    outbox = get_outbox()
+    if outbox is not None:
+        session = log_id or f'{date}:{subject}'
+        added = outbox.enqueue([
+            {'student_uid': student.get('uid') or student['email'], 'log_id': session,
+             'email': student['email'],
+             'payload': {'name': student.get('name', 'Student'), 'date': date, 'subject': subject}}
+            for student in absent_students if student.get('email')
+        ], not_before=_next_send_time(EMAIL_DIGEST_TIME) if EMAIL_DIGEST else None)
+        print(f"📧 {added} absence notification(s) for {date} added to the outbox")
+        return
+
+    if EMAIL_DIGEST:
+        get_digest().add(absent_students, date, subject)
+        return
+
+    print(f"📧 Sending {len(absent_students)} absence notification(s) for {date}...")
+    lock = threading.Lock()
+    pending = [len(absent_students), 0]  # outstanding, succeeded
+
+    def _done(future, student_email):
+        error = future.exception()
+        if error is not None:
+            _report_error(student_email, error)
+        with lock:
+            pending[0] -= 1
+            pending[1] += error is None
+            finished = pending[0] == 0
+        if finished:
+            print(f"📧 Email summary: {pending[1]}/{len(absent_students)} sent successfully")
 
-    thread = threading.Thread(target=_send_all, daemon=True)
-    thread.start()
+    dispatcher = get_dispatcher()
+    for student in absent_students:
+        student_email = student.get('email', '')
+        msg = _build_absence_message(student.get('name', 'Student'), student_email, date, subject)
+        future = dispatcher.send(student_email, msg)
+        future.add_done_callback(lambda f, addr=student_email: _done(f, addr))
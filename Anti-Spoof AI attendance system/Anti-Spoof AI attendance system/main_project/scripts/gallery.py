@@ -0,0 +1,493 @@
+"""
+In-memory face gallery for attendance matching.
+Enrolled embeddings are partitioned by (branch, sem) and each partition is
+kept as one contiguous matrix, so a filtered marking request can match
+against its partition without extra Firestore queries.
+
+Each student contributes a small, bounded set of template rows: a centroid
+of every sample seen so far plus a few medoids (see compact_templates()).
+"""
+
+import threading
+import numpy as np
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
+
+from scripts.utils import topk_cosine_similarity
+from scripts.reduced_matching import PCAProjector, reduced_best_match, evaluate_recall
+
+# uids: list of student uids; matrix: (R, D) template rows;
+# reduced: (R, d) PCA-projected rows or None when reduced matching is off;
+# owners: (R,) index into uids of the student each row belongs to
+GallerySelection = namedtuple('GallerySelection', ['uids', 'matrix', 'reduced', 'owners'])
+
+# centroid: (D,) running mean of all samples; medoids: (T, D); seen: samples folded in
+TemplateSet = namedtuple('TemplateSet', ['centroid', 'medoids', 'seen'])
+
+MAX_MEDOIDS = 3
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _select_medoids(pool: np.ndarray, k: int) -> np.ndarray:
+    """Greedy k-medoids (facility location) over a small pool of unit vectors."""
+    if len(pool) <= k:
+        return pool
+    sims = pool @ pool.T
+    coverage = np.full(len(pool), -1.0, dtype=np.float32)
+    chosen = []
+    for _ in range(k):
+        gains = np.maximum(sims, coverage[:, None]).sum(axis=0)
+        gains[chosen] = -np.inf
+        best = int(np.argmax(gains))
+        chosen.append(best)
+        coverage = np.maximum(coverage, sims[:, best])
+    return pool[sorted(chosen)]
+
+
+def compact_templates(current: Optional[TemplateSet], new_templates: np.ndarray,
+                      max_medoids: int = MAX_MEDOIDS) -> TemplateSet:
+    """
+    Fold new face samples into a student's template set.
+
+    The centroid is a running mean over every sample ever seen; only up to
+    `max_medoids` representative samples are kept alongside it, so gallery
+    size per student stays bounded no matter how many samples arrive.
+
+    Args:
+        current: Existing TemplateSet, or None for a new student
+        new_templates: Array of shape (K, D) or (D,) of new embeddings
+        max_medoids: Maximum medoids to keep
+
+    Returns:
+        TemplateSet
+    """
+    new = _normalize_rows(np.atleast_2d(np.asarray(new_templates, dtype=np.float32)))
+    if current is None or current.seen == 0:
+        seen = 0
+        total = new.sum(axis=0)
+        pool = new
+    else:
+        seen = current.seen
+        total = current.centroid * seen + new.sum(axis=0)
+        # A single-shot student has no medoids yet - its centroid *is* that shot
+        previous = current.medoids if len(current.medoids) else current.centroid[None, :]
+        pool = np.vstack([previous, new])
+
+    centroid = _normalize_rows(total[None, :])[0]
+    return TemplateSet(centroid, _select_medoids(pool, max_medoids), seen + len(new))
+
+
+def _as_template_set(value) -> TemplateSet:
+    """Accept a TemplateSet, a {'centroid', 'medoids', 'seen'} dict or a single embedding."""
+    if isinstance(value, TemplateSet):
+        return value
+    if isinstance(value, dict):
+        centroid = np.asarray(value['centroid'], dtype=np.float32)
+        medoids = np.asarray(value.get('medoids', []), dtype=np.float32).reshape(-1, centroid.size)
+        return TemplateSet(centroid, medoids, int(value.get('seen', 1)))
+    vector = np.asarray(value, dtype=np.float32).ravel()
+    return TemplateSet(vector, np.empty((0, vector.size), dtype=np.float32), 1)
+
+
+def _template_rows(templates: TemplateSet) -> np.ndarray:
+    return _normalize_rows(np.vstack([templates.centroid[None, :], templates.medoids]))
+
+
+class EmbeddingGallery:
+    """
+    Enrolled template rows grouped into (branch, sem) partitions.
+
+    Partition matrices are never modified in place - enroll/delete build a
+    new matrix for the affected partition, so a request that already holds
+    a selection keeps a consistent view while the gallery changes.
+
+    With reduced_dim > 0, a PCA projection is fitted on the whole gallery
+    and every partition also keeps its projected matrix, so best_matches()
+    can shortlist in the reduced space and re-rank with the exact cosine.
+    """
+
+    def __init__(self, reduced_dim: int = 0, shortlist_k: int = 10, chunk_size: int = 4096):
+        self._lock = threading.Lock()
+        # (branch, sem) -> {'uids': [uid, ...], 'owners': (R,), 'matrix': (R, D), 'reduced': (R, d) or None}
+        self._partitions = {}
+        # uid -> (branch, sem)
+        self._uid_to_key = {}
+        # uid -> TemplateSet
+        self._templates = {}
+        # (branch_filter, sem_filter) -> GallerySelection; cleared on any change
+        self._selection_cache = {}
+        self.reduced_dim = reduced_dim
+        self.shortlist_k = shortlist_k
+        # Gallery rows scored per step by the streaming top-k search
+        self.chunk_size = chunk_size
+        self.projector = None
+        # Recall of reduced matching vs brute force, measured at build time
+        self.reduced_recall = None
+
+    @classmethod
+    def from_firestore(cls, templates: Dict[str, object],
+                       students: Dict[str, dict], **kwargs) -> 'EmbeddingGallery':
+        """
+        Build a gallery from get_all_templates() (or get_all_embeddings())
+        and get_all_students() output.
+
+        Args:
+            templates: {student_uid: template dict or embedding_vector}
+            students: {student_uid: student profile dict}
+            **kwargs: Passed to EmbeddingGallery() (reduced_dim, shortlist_k, chunk_size)
+
+        Returns:
+            EmbeddingGallery
+        """
+        gallery = cls(**kwargs)
+        gallery.build(templates, students)
+        return gallery
+
+    @staticmethod
+    def _partition_key(profile: Optional[dict]) -> Tuple[str, Optional[int]]:
+        profile = profile or {}
+        return profile.get('branch', '') or '', profile.get('sem', None)
+
+    def build(self, templates: Dict[str, object], students: Dict[str, dict]):
+        """Replace the gallery contents with a fresh set of templates."""
+        grouped = {}
+        uid_to_key = {}
+        template_sets = {}
+        for uid, value in templates.items():
+            key = self._partition_key(students.get(uid))
+            template_sets[uid] = _as_template_set(value)
+            grouped.setdefault(key, []).append(uid)
+            uid_to_key[uid] = key
+
+        partitions = {key: self._make_partition(uids, template_sets, projector=None)
+                      for key, uids in grouped.items()}
+
+        projector, recall = None, None
+        row_count = sum(len(part['owners']) for part in partitions.values())
+        # PCA only pays off (and is only well-defined) once the gallery is larger than the target dim
+        if self.reduced_dim and row_count > self.reduced_dim:
+            full = np.vstack([part['matrix'] for part in partitions.values()])
+            projector = PCAProjector.fit(full, self.reduced_dim)
+            for part in partitions.values():
+                part['reduced'] = projector.transform(part['matrix'])
+            # Rows are numbered per partition; give every student a gallery-wide owner id
+            offsets = np.cumsum([0] + [len(part['uids']) for part in partitions.values()])[:-1]
+            owners = np.concatenate([part['owners'] + offset
+                                     for part, offset in zip(partitions.values(), offsets)])
+            recall = evaluate_recall(full, projector, self.shortlist_k, owners=owners)
+            print(f"✅ Reduced matching: {self.reduced_dim}-dim PCA, shortlist {self.shortlist_k}, "
+                  f"recall vs brute force {recall['recall']:.4f} (loss {recall['recall_loss']:.4f}, {recall['source']} queries)")
+
+        with self._lock:
+            self._partitions = partitions
+            self._uid_to_key = uid_to_key
+            self._templates = template_sets
+            self._selection_cache = {}
+            self.projector = projector
+            self.reduced_recall = recall
+        print(f"✅ Gallery built: {len(uid_to_key)} students, {row_count} templates in {len(partitions)} partitions")
+
+    @staticmethod
+    def _make_partition(uids: List[str], template_sets: Dict[str, TemplateSet], projector) -> dict:
+        rows = [_template_rows(template_sets[uid]) for uid in uids]
+        matrix = np.vstack(rows)
+        return {
+            'uids': list(uids),
+            'owners': np.repeat(np.arange(len(uids)), [len(r) for r in rows]),
+            'matrix': matrix,
+            'reduced': projector.transform(matrix) if projector is not None else None
+        }
+
+    def apply_changes(self, upserts: Optional[Dict[str, tuple]] = None, removals=()):
+        """
+        Apply many adds, moves and removals with a single rebuild of each
+        affected partition (bulk enrollment, cohort promotion or purge),
+        instead of one partition copy per student.
+
+        Args:
+            upserts: {uid: (templates or None to keep the current ones, branch, sem)}
+            removals: uids to remove
+        """
+        with self._lock:
+            self._apply_changes_locked(upserts or {}, removals)
+
+    def _apply_changes_locked(self, upserts: Dict[str, tuple], removals=()):
+        template_sets = dict(self._templates)
+        uid_to_key = dict(self._uid_to_key)
+        affected = set()
+        for uid in removals:
+            key = uid_to_key.pop(uid, None)
+            if key is not None:
+                affected.add(key)
+                template_sets.pop(uid, None)
+        for uid, (value, branch, sem) in upserts.items():
+            if value is not None:
+                template_sets[uid] = _as_template_set(value)
+            elif uid not in template_sets:
+                continue
+            old_key, new_key = uid_to_key.get(uid), (branch or '', sem)
+            if old_key == new_key and value is None:
+                continue
+            if old_key is not None:
+                affected.add(old_key)
+            affected.add(new_key)
+            uid_to_key[uid] = new_key
+        if not affected:
+            return
+
+        members = {key: [] for key in affected}
+        for key in affected:
+            # Existing members keep their order; newcomers are appended
+            for uid in self._partitions.get(key, {}).get('uids', []):
+                if uid_to_key.get(uid) == key:
+                    members[key].append(uid)
+        for uid, key in uid_to_key.items():
+            if key in members and self._uid_to_key.get(uid) != key:
+                members[key].append(uid)
+
+        partitions = dict(self._partitions)
+        for key, uids in members.items():
+            if uids:
+                partitions[key] = self._make_partition(uids, template_sets, self.projector)
+            else:
+                partitions.pop(key, None)
+
+        self._partitions = partitions
+        self._uid_to_key = uid_to_key
+        self._templates = template_sets
+        self._selection_cache = {}
+
+    def add(self, uid: str, templates, branch: str = '', sem: Optional[int] = None):
+        """
+        Add (or replace) a student's templates in its (branch, sem) partition.
+
+        Args:
+            uid: Student uid
+            templates: TemplateSet, template dict, or a single embedding vector
+            branch: Student's branch
+            sem: Student's semester
+        """
+        template_set = _as_template_set(templates)
+        rows = _template_rows(template_set)
+        with self._lock:
+            self._remove_locked(uid)
+            key = (branch or '', sem)
+            # New rows are projected with the existing basis; it is refitted on the next build()
+            reduced = self.projector.transform(rows) if self.projector is not None else None
+            part = self._partitions.get(key)
+            if part is None:
+                self._partitions[key] = {
+                    'uids': [uid],
+                    'owners': np.zeros(len(rows), dtype=np.int64),
+                    'matrix': rows,
+                    'reduced': reduced
+                }
+            else:
+                self._partitions[key] = {
+                    'uids': part['uids'] + [uid],
+                    'owners': np.concatenate([part['owners'], np.full(len(rows), len(part['uids']))]),
+                    'matrix': np.vstack([part['matrix'], rows]),
+                    'reduced': np.vstack([part['reduced'], reduced]) if reduced is not None else None
+                }
+            self._uid_to_key[uid] = key
+            self._templates[uid] = template_set
+            self._selection_cache = {}
+
+    def fold_templates(self, samples: Dict[str, np.ndarray],
+                       max_medoids: int = MAX_MEDOIDS) -> Dict[str, TemplateSet]:
+        """
+        Fold new samples into many enrolled students' templates (see
+        compact_templates()) without changing the gallery: the caller saves
+        the result and then applies it with merge_templates(), so the gallery
+        never holds templates that were not stored.
+
+        Args:
+            samples: {uid: array of shape (K, D) or (D,)}
+            max_medoids: Maximum medoids to keep
+
+        Returns:
+            dict: {uid: compacted TemplateSet}; uids not enrolled are left out.
+                  TemplateSet.seen grows with every fold, so it orders versions of a set.
+        """
+        with self._lock:
+            current = {uid: self._templates.get(uid) for uid in samples if uid in self._uid_to_key}
+        return {uid: compact_templates(current[uid], new_templates, max_medoids)
+                for uid, new_templates in samples.items() if uid in current}
+
+    def merge_templates(self, templates: Dict[str, object],
+                        students: Optional[Dict[str, dict]] = None) -> int:
+        """
+        Apply saved template sets (folded here, or by another backend instance).
+        A set only replaces the local one when it has seen more samples, so an
+        older copy never undoes a local fold.
+
+        Args:
+            templates: {uid: TemplateSet or template dict}
+            students: Profiles of uids not in the gallery yet ({uid: profile});
+                      new uids without a profile are skipped
+
+        Returns:
+            int: Students added or updated
+        """
+        with self._lock:
+            upserts = {}
+            for uid, value in templates.items():
+                template_set = _as_template_set(value)
+                current = self._templates.get(uid)
+                if current is not None and current.seen >= template_set.seen:
+                    continue
+                key = self._uid_to_key.get(uid)
+                if key is None:
+                    if not students or students.get(uid) is None:
+                        continue
+                    key = self._partition_key(students[uid])
+                upserts[uid] = (template_set, *key)
+            self._apply_changes_locked(upserts)
+        return len(upserts)
+
+    def move(self, uid: str, branch: str = '', sem: Optional[int] = None) -> bool:
+        """
+        Move a student's templates to another (branch, sem) partition,
+        e.g. after their profile changed. Returns True if anything moved.
+        """
+        with self._lock:
+            key = self._uid_to_key.get(uid)
+            if key is None or key == (branch or '', sem):
+                return False
+            self._apply_changes_locked({uid: (None, branch, sem)})
+        return True
+
+    def remove(self, uid: str) -> bool:
+        """Remove a student's templates. Returns True if it was present."""
+        with self._lock:
+            removed = self._remove_locked(uid)
+            if removed:
+                self._selection_cache = {}
+            return removed
+
+    def _remove_locked(self, uid: str) -> bool:
+        key = self._uid_to_key.pop(uid, None)
+        if key is None:
+            return False
+        self._templates.pop(uid, None)
+        part = self._partitions[key]
+        idx = part['uids'].index(uid)
+        if len(part['uids']) == 1:
+            del self._partitions[key]
+        else:
+            keep = part['owners'] != idx
+            owners = part['owners'][keep]
+            self._partitions[key] = {
+                'uids': part['uids'][:idx] + part['uids'][idx + 1:],
+                'owners': owners - (owners > idx),
+                'matrix': part['matrix'][keep],
+                'reduced': part['reduced'][keep] if part['reduced'] is not None else None
+            }
+        return True
+
+    def select(self, branch: str = '', sem: Optional[int] = None) -> GallerySelection:
+        """
+        Get the enrolled uids and template matrix matching a branch/sem filter.
+
+        Args:
+            branch: Branch filter ('' = any branch)
+            sem: Semester filter (None = any semester)
+
+        Returns:
+            GallerySelection: (uids, template matrix (R, D), reduced matrix or None, row owners (R,))
+        """
+        cache_key = (branch or '', sem)
+        with self._lock:
+            cached = self._selection_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+            parts = [
+                part for (p_branch, p_sem), part in sorted(self._partitions.items(), key=lambda kv: str(kv[0]))
+                if (not branch or p_branch == branch) and (sem is None or p_sem == sem)
+            ]
+            if not parts:
+                selection = GallerySelection([], np.empty((0, 0), dtype=np.float32), None,
+                                             np.empty(0, dtype=np.int64))
+            elif len(parts) == 1:
+                part = parts[0]
+                selection = GallerySelection(part['uids'], part['matrix'], part['reduced'], part['owners'])
+            else:
+                uids = [uid for part in parts for uid in part['uids']]
+                offsets = np.cumsum([0] + [len(part['uids']) for part in parts[:-1]])
+                owners = np.concatenate([part['owners'] + offset for part, offset in zip(parts, offsets)])
+                reduced = None
+                if all(part['reduced'] is not None for part in parts):
+                    reduced = np.vstack([part['reduced'] for part in parts])
+                selection = GallerySelection(uids, np.vstack([part['matrix'] for part in parts]),
+                                             reduced, owners)
+            self._selection_cache[cache_key] = selection
+            return selection
+
+    def best_matches(self, queries: np.ndarray, selection: GallerySelection) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the best-scoring student for each query embedding.
+
+        Every template row is scored; a student's score is the max over its
+        templates, so the best student is simply the owner of the best row.
+        Uses the reduced-dimension shortlist + exact re-rank when a projection
+        is available, otherwise an exact chunked top-1 search. Neither path
+        materializes the full (N, R) similarity matrix.
+
+        Args:
+            queries: Array of shape (N, D)
+            selection: GallerySelection returned by select()
+
+        Returns:
+            tuple: (best indices into selection.uids, exact cosine scores), each of shape (N,)
+        """
+        projector = self.projector
+        if selection.reduced is not None and projector is not None \
+                and selection.reduced.shape[1] == projector.dim:
+            best_rows, best_scores = reduced_best_match(
+                _normalize_rows(np.asarray(queries, dtype=np.float32)),
+                selection.matrix, selection.reduced, projector, self.shortlist_k, self.chunk_size)
+        else:
+            top_idx, top_scores = topk_cosine_similarity(queries, selection.matrix, k=1,
+                                                         chunk_size=self.chunk_size)
+            best_rows, best_scores = top_idx[:, 0], top_scores[:, 0]
+        return selection.owners[best_rows], best_scores
+
+    def runner_up_scores(self, queries: np.ndarray, selection: GallerySelection,
+                         best: np.ndarray) -> np.ndarray:
+        """
+        Exact score of the best *other* student for each query (the margin
+        check before a match is trusted enough to update templates).
+
+        Args:
+            queries: Array of shape (N, D)
+            selection: GallerySelection returned by select()
+            best: (N,) indices into selection.uids of each query's best student
+
+        Returns:
+            np.ndarray: (N,) runner-up cosine scores (-1 when the selection has one student)
+        """
+        # Chunked like the top-k search, so only an (N, chunk_size) block is held
+        queries = _normalize_rows(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        best = np.asarray(best)
+        runner_up = np.full(len(queries), -1.0, dtype=np.float32)
+        for start in range(0, len(selection.matrix), self.chunk_size):
+            chunk = np.asarray(selection.matrix[start:start + self.chunk_size], dtype=np.float32)
+            scores = queries @ chunk.T                                        # (N, chunk)
+            scores[selection.owners[None, start:start + len(chunk)] == best[:, None]] = -1.0
+            np.maximum(runner_up, scores.max(axis=1), out=runner_up)
+        return runner_up
+
+    def partition_of(self, uid: str) -> Optional[Tuple[str, Optional[int]]]:
+        """Return the (branch, sem) partition a uid is stored in, if any."""
+        with self._lock:
+            return self._uid_to_key.get(uid)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._uid_to_key)
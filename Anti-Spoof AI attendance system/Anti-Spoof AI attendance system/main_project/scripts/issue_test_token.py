@@ -0,0 +1,27 @@
+"""
+Issue an ID token signed with the local test key, for a backend started
+with AUTH_TEST_MODE=1 (no Firebase project needed to call the API).
+The key is created at AUTH_TEST_KEY_PATH on first use and shared with the
+backend through that file.
+
+Usage:
+    python scripts/issue_test_token.py --uid admin-1 --role admin
+    curl -H "Authorization: Bearer $(python scripts/issue_test_token.py --uid s1)" localhost:5000/api/attendance/my
+"""
+
+import os
+import sys
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))  # main_project/
+
+from firebase.token_cache import LocalTokenIssuer
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Issue a locally signed test ID token')
+    parser.add_argument('--uid', required=True, help='User id (token subject)')
+    parser.add_argument('--role', default='student', choices=['student', 'admin'])
+    parser.add_argument('--ttl', type=int, default=3600, help='Lifetime in seconds')
+    args = parser.parse_args()
+
+    print(LocalTokenIssuer.from_env().issue(args.uid, role=args.role, ttl=args.ttl))
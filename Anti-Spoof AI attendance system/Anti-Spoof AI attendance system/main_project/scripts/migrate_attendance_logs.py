@@ -0,0 +1,88 @@
+"""
+One-off migration: bring attendance_log documents written before the
+'present' map and denormalized student names up to the current format.
+  - adds 'present' = {uid: confidence} (used by get_student_attendance)
+  - fills name / roll_no into each detected_students entry
+Safe to re-run - documents already migrated are skipped.
+
+Usage:
+    python scripts/migrate_attendance_logs.py [--dry-run]
+"""
+
+import os
+import sys
+import argparse
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))  # main_project/
+
+from firebase.firebase_service import (
+    initialize_firebase,
+    get_students_by_uids,
+    stream_collection_parallel,
+    presence_map
+)
+
+BATCH_SIZE = 500  # Firestore WriteBatch limit
+
+def migrate_attendance_logs(db, dry_run=False):
+    """
+    Add the presence map and student names to legacy attendance logs.
+
+    Args:
+        db: Firestore client
+        dry_run (bool): Only count documents that would be migrated
+
+    Returns:
+        tuple: (migrated, skipped)
+    """
+    pending_docs = []
+    skipped = 0
+    logs = db.collection('attendance_log')
+    for log_id, data in stream_collection_parallel(db, 'attendance_log',
+                                                   field_paths=['detected_students', 'present', 'session_encoding']):
+        detected = data.get('detected_students', [])
+        # Roster-bitmap sessions are read from their bitmap and need no map
+        if 'session_encoding' in data or ('present' in data and all('name' in entry for entry in detected)):
+            skipped += 1
+            continue
+        pending_docs.append((logs.document(log_id), data))
+
+    if dry_run:
+        print(f"✅ Would migrate {len(pending_docs)} attendance log(s), skipped {skipped} already current")
+        return len(pending_docs), skipped
+
+    profiles = get_students_by_uids(
+        db, {entry['student_uid'] for _, data in pending_docs for entry in data.get('detected_students', [])},
+        field_paths=['name', 'roll_no'])
+
+    batch = db.batch()
+    pending = 0
+    migrated = 0
+    for ref, data in pending_docs:
+        detected = [
+            {**entry,
+             'name': entry.get('name', (profiles.get(entry['student_uid']) or {}).get('name', '')),
+             'roll_no': entry.get('roll_no', (profiles.get(entry['student_uid']) or {}).get('roll_no', ''))}
+            for entry in data.get('detected_students', [])
+        ]
+        batch.update(ref, {'detected_students': detected, 'present': presence_map(data)})
+        pending += 1
+        migrated += 1
+        if pending == BATCH_SIZE:
+            batch.commit()
+            print(f"  … {migrated} logs migrated")
+            batch = db.batch()
+            pending = 0
+
+    if pending:
+        batch.commit()
+
+    print(f"✅ Migrated {migrated} attendance log(s), skipped {skipped} already current")
+    return migrated, skipped
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Add presence maps and student names to legacy attendance logs')
+    parser.add_argument('--dry-run', action='store_true', help='Report what would change without writing')
+    args = parser.parse_args()
+
+    print("🔥 Initializing Firebase...")
+    migrate_attendance_logs(initialize_firebase(), dry_run=args.dry_run)
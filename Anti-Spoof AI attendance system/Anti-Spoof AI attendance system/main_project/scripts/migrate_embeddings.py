@@ -0,0 +1,82 @@
+"""
+One-off migration: convert legacy embedding documents (512-element list of
+Firestore doubles) to the compact v2 bytes format used by save_embedding().
+Safe to re-run - documents already in v2 format are skipped.
+
+Usage:
+    python scripts/migrate_embeddings.py [--dtype float16|int8] [--dry-run]
+"""
+
+import os
+import sys
+import argparse
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))  # main_project/
+
+from firebase_admin import firestore
+from firebase.firebase_service import (
+    initialize_firebase,
+    encode_embedding,
+    decode_embedding,
+    EMBEDDING_FORMAT_VERSION
+)
+
+BATCH_SIZE = 500  # Firestore WriteBatch limit
+
+def migrate_embeddings(db, dtype='float16', dry_run=False):
+    """
+    Rewrite every legacy embedding document in the v2 format.
+
+    Args:
+        db: Firestore client
+        dtype (str): 'float16' or 'int8'
+        dry_run (bool): Only count documents that would be migrated
+
+    Returns:
+        tuple: (migrated, skipped)
+    """
+    migrated = 0
+    skipped = 0
+    bytes_before = 0
+    bytes_after = 0
+    batch = db.batch()
+    pending = 0
+
+    for doc in db.collection('embeddings').stream():
+        data = doc.to_dict()
+        if data.get('embedding_version', 1) >= EMBEDDING_FORMAT_VERSION:
+            skipped += 1
+            continue
+
+        fields = encode_embedding(decode_embedding(data), dtype=dtype)
+        bytes_before += 8 * len(data.get('embedding', []))
+        bytes_after += len(fields['embedding_bytes'])
+        migrated += 1
+        if dry_run:
+            continue
+
+        fields['embedding'] = firestore.DELETE_FIELD
+        batch.update(doc.reference, fields)
+        pending += 1
+        if pending == BATCH_SIZE:
+            batch.commit()
+            print(f"  … {migrated} documents migrated")
+            batch = db.batch()
+            pending = 0
+
+    if pending:
+        batch.commit()
+
+    action = "Would migrate" if dry_run else "Migrated"
+    print(f"✅ {action} {migrated} embedding(s) to {dtype}, skipped {skipped} already in v{EMBEDDING_FORMAT_VERSION}")
+    if migrated:
+        print(f"   Payload: {bytes_before / 1024:.1f} KB → {bytes_after / 1024:.1f} KB")
+    return migrated, skipped
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert legacy embeddings to compact bytes storage')
+    parser.add_argument('--dtype', choices=['float16', 'int8'], default='float16')
+    parser.add_argument('--dry-run', action='store_true', help='Report what would change without writing')
+    args = parser.parse_args()
+
+    print("🔥 Initializing Firebase...")
+    migrate_embeddings(initialize_firebase(), dtype=args.dtype, dry_run=args.dry_run)
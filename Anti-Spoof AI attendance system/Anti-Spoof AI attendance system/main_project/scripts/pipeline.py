@@ -0,0 +1,121 @@
+"""
+Staged pipeline executor.
+Work items flow through a fixed sequence of stages, each with its own
+worker threads and a bounded input queue. Different requests occupy
+different stages at the same time (the recognizer works on request N while
+request N+1 is being detected and request N-1 is being saved), so under a
+burst the throughput approaches that of the slowest stage. A full queue
+blocks the stage before it, which bounds memory.
+"""
+
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List
+
+_STOP = object()
+
+
+class Stage:
+    """
+    One pipeline step.
+
+    Args:
+        name: Stage name (used in stats)
+        fn: Function(item) -> item for the next stage; raising fails the item
+        workers: Threads running this stage
+        queue_size: Items waiting for this stage at most
+    """
+
+    def __init__(self, name: str, fn: Callable, workers: int = 1, queue_size: int = 8):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self._lock = threading.Lock()
+        self.busy = 0
+        self.processed = 0
+        self.failed = 0
+        self.total_time = 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            done = self.processed + self.failed
+            return {
+                'workers': self.workers,
+                'queued': self.queue.qsize(),
+                'capacity': self.queue.maxsize,
+                'busy': self.busy,
+                'processed': self.processed,
+                'failed': self.failed,
+                'avg_ms': round(1000 * self.total_time / done, 1) if done else None
+            }
+
+
+class StagedPipeline:
+    """
+    Runs items through `stages` in order; submit() returns a Future with the
+    last stage's result (or the first exception raised by any stage).
+    """
+
+    def __init__(self, stages: List[Stage]):
+        self.stages = stages
+        self._threads = []
+
+    def start(self):
+        for index, stage in enumerate(self.stages):
+            next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+            for n in range(stage.workers):
+                thread = threading.Thread(target=self._work, args=(stage, next_stage),
+                                          name=f'pipeline-{stage.name}-{n}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        return self
+
+    def stop(self):
+        """Let queued items finish, then stop every worker."""
+        for stage in self.stages:
+            for _ in range(stage.workers):
+                stage.queue.put(_STOP)
+            for thread in [t for t in self._threads if t.name.startswith(f'pipeline-{stage.name}-')]:
+                thread.join()
+        self._threads = []
+
+    def submit(self, item) -> Future:
+        """Queue an item (blocks while the first stage's queue is full)."""
+        future = Future()
+        future.set_running_or_notify_cancel()
+        self.stages[0].queue.put((future, item))
+        return future
+
+    def _work(self, stage: Stage, next_stage):
+        while True:
+            job = stage.queue.get()
+            if job is _STOP:
+                return
+            future, item = job
+            with stage._lock:
+                stage.busy += 1
+            started = time.perf_counter()
+            try:
+                result = stage.fn(item)
+            except Exception as e:
+                with stage._lock:
+                    stage.busy -= 1
+                    stage.failed += 1
+                    stage.total_time += time.perf_counter() - started
+                future.set_exception(e)
+                continue
+            with stage._lock:
+                stage.busy -= 1
+                stage.processed += 1
+                stage.total_time += time.perf_counter() - started
+            if next_stage is not None:
+                next_stage.queue.put((future, result))
+            else:
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, dict]:
+        """Per-stage queue depth, busy workers, counts and mean time per item."""
+        return {stage.name: stage.stats() for stage in self.stages}
@@ -0,0 +1,114 @@
+"""
+Result cache for idempotent requests.
+Results are kept by key for a limited time in a bounded LRU. A request whose
+key is already being computed waits for that computation instead of
+starting a second one, so a client retrying a slow request gets the
+original result and nothing runs (or is written) twice. Failures are not
+cached.
+
+The key is always derived from the request content, so a retry hits the
+same entry whether or not it carries a client idempotency key. A client key
+is only remembered to reject its reuse for different content.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class IdempotencyConflict(ValueError):
+    """An idempotency key was reused for a different request."""
+
+
+class ResultCache:
+    """
+    Args:
+        max_entries (int): Results (and client keys) kept at most (least recently used are dropped)
+        ttl (float): Seconds a result is served for (0 disables caching,
+                     concurrent duplicates still share one computation)
+    """
+
+    def __init__(self, max_entries=64, ttl=600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()      # key -> (result, expires_at)
+        self._inflight = {}                # key -> Future
+        self._client_keys = OrderedDict()  # idempotency key -> (key, expires_at)
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, compute, idempotency_key=None):
+        """
+        Result for `key` (a digest of the request content), calling compute()
+        only if there is no fresh or in-flight one. `idempotency_key` is the
+        client-chosen key of the request, if any; reusing it for another
+        `key` raises IdempotencyConflict.
+
+        Returns:
+            tuple: (result, replayed) — replayed is True when the result was not computed by this call
+        """
+        now = time.time()
+        with self._lock:
+            claimed = idempotency_key is not None and self._claim(idempotency_key, key, now)
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0], True
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                self.hits += 1
+            else:
+                future = Future()
+                self._inflight[key] = future
+                self.misses += 1
+
+        if inflight is not None:
+            return inflight.result(), True
+
+        try:
+            result = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+                # Let the client retry with the same key after a failure
+                if claimed:
+                    self._client_keys.pop(idempotency_key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._inflight[key]
+            if self.ttl > 0:
+                self._entries[key] = (result, time.time() + self.ttl)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        future.set_result(result)
+        return result, False
+
+    def _claim(self, idempotency_key, key, now):
+        """Bind a client key to `key`; True if this call bound it. Caller holds the lock."""
+        bound = self._client_keys.get(idempotency_key)
+        if bound is not None and bound[1] > now:
+            if bound[0] != key:
+                raise IdempotencyConflict("Idempotency key was already used for a different request")
+            self._client_keys.move_to_end(idempotency_key)
+            return False
+        self._client_keys[idempotency_key] = (key, now + self.ttl)
+        self._client_keys.move_to_end(idempotency_key)
+        while len(self._client_keys) > self.max_entries:
+            self._client_keys.popitem(last=False)
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._client_keys.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,158 @@
+"""
+Roster parsing and progress tracking for bulk enrollment.
+A roster is a CSV (name, roll_no, branch, sem, email, password[, photo])
+plus a zip of photos. A row's photos are the `photo` column (several
+names separated by ';') or, if that is empty, every image named after the
+roll number - `<roll_no>.jpg` or anything inside a `<roll_no>/` folder.
+"""
+
+import io
+import csv
+import time
+import uuid
+import zipfile
+import threading
+from collections import namedtuple
+from typing import Dict, List, Tuple
+
+REQUIRED_COLUMNS = ('name', 'roll_no', 'branch', 'sem', 'email', 'password')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+RosterRow = namedtuple('RosterRow', ['row', 'name', 'roll_no', 'branch', 'sem', 'email', 'password', 'photos'])
+
+
+def _photo_index(archive: zipfile.ZipFile) -> Dict[str, List[str]]:
+    """Map lowercase file stems and top-level folder names to zip entries."""
+    index = {}
+    for entry in archive.namelist():
+        if entry.endswith('/') or not entry.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        parts = entry.split('/')
+        stem = parts[-1].rsplit('.', 1)[0].lower()
+        index.setdefault(stem, []).append(entry)
+        index.setdefault('@' + parts[-1].lower(), []).append(entry)
+        if len(parts) > 1:
+            index.setdefault(parts[-2].lower(), []).append(entry)
+    return index
+
+
+def parse_roster(csv_bytes: bytes, archive: zipfile.ZipFile, valid_branches,
+                 min_password: int = 6) -> Tuple[List[RosterRow], List[dict]]:
+    """
+    Validate a roster CSV against the photo archive.
+
+    Args:
+        csv_bytes: Raw CSV file contents (UTF-8, header row required)
+        archive: Opened zip of photos
+        valid_branches: Accepted branch codes
+        min_password: Minimum password length
+
+    Returns:
+        tuple: (valid RosterRows, [{'row', 'roll_no', 'error'}] for rejected rows)
+    """
+    reader = csv.DictReader(io.StringIO(csv_bytes.decode('utf-8-sig')))
+    missing = [c for c in REQUIRED_COLUMNS if c not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"CSV is missing column(s): {', '.join(missing)}")
+
+    photos = _photo_index(archive)
+    rows, errors = [], []
+    seen_roll, seen_email = set(), set()
+    for line, raw in enumerate(reader, start=2):  # header is line 1
+        values = {k: (raw.get(k) or '').strip() for k in REQUIRED_COLUMNS + ('photo',)}
+        roll_no = values['roll_no']
+
+        def reject(message):
+            errors.append({'row': line, 'roll_no': roll_no, 'error': message})
+
+        if not all(values[c] for c in REQUIRED_COLUMNS):
+            reject('All of name, roll_no, branch, sem, email, password are required')
+            continue
+        if values['branch'] not in valid_branches:
+            reject(f"Invalid branch {values['branch']!r}")
+            continue
+        try:
+            sem = int(values['sem'])
+            if sem < 1 or sem > 7:
+                raise ValueError()
+        except ValueError:
+            reject('Invalid semester. Must be 1–7.')
+            continue
+        if len(values['password']) < min_password:
+            reject(f'Password must be at least {min_password} characters')
+            continue
+        email = values['email'].lower()
+        if roll_no in seen_roll:
+            reject(f'Duplicate roll number {roll_no} in CSV')
+            continue
+        if email in seen_email:
+            reject(f'Duplicate email {email} in CSV')
+            continue
+
+        if values['photo']:
+            names = [n.strip().lower() for n in values['photo'].split(';') if n.strip()]
+            bases = [n.rsplit('/', 1)[-1] for n in names]
+            entries = [e for b in bases for e in (photos.get('@' + b) or photos.get(b, []))]
+        else:
+            entries = photos.get(roll_no.lower(), [])
+        if not entries:
+            reject('No photo found in the archive')
+            continue
+
+        seen_roll.add(roll_no)
+        seen_email.add(email)
+        rows.append(RosterRow(line, values['name'], roll_no, values['branch'], sem,
+                              email, values['password'], list(dict.fromkeys(entries))))
+    return rows, errors
+
+
+class BulkEnrollJob:
+    """Progress and per-row errors of one bulk enrollment run (thread-safe)."""
+
+    def __init__(self, total: int = 0):
+        self.id = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self.status = 'running'    # running | done | failed
+        self.phase = 'validating'
+        self.total = total         # roster rows
+        self.photos_total = 0
+        self.photos_done = 0
+        self.enrolled = 0
+        self.errors = []
+        self.started_at = time.time()
+        self.finished_at = None
+
+    def update(self, **fields):
+        with self._lock:
+            for key, value in fields.items():
+                setattr(self, key, value)
+
+    def advance(self, enrolled=0):
+        with self._lock:
+            self.enrolled += enrolled
+
+    def add_error(self, row, roll_no, error):
+        with self._lock:
+            self.errors.append({'row': row, 'roll_no': roll_no, 'error': error})
+
+    def finish(self, status='done'):
+        with self._lock:
+            self.status = status
+            self.phase = status
+            self.finished_at = time.time()
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'job_id': self.id,
+                'status': self.status,
+                'phase': self.phase,
+                'total': self.total,
+                'processed': self.enrolled + len(self.errors),
+                'photos_total': self.photos_total,
+                'photos_done': self.photos_done,
+                'enrolled': self.enrolled,
+                'failed': len(self.errors),
+                'errors': sorted(self.errors, key=lambda e: e['row']),
+                'elapsed': round((self.finished_at or time.time()) - self.started_at, 1)
+            }
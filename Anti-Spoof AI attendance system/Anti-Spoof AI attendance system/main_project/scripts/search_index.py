@@ -0,0 +1,136 @@
+"""
+In-memory search index over student names and roll numbers.
+Prefix queries use a sorted key list (bisect); substring queries use a
+trigram index whose candidates are verified against the normalized text.
+Kept current from the student store's change feed on enroll and delete.
+"""
+
+import bisect
+import threading
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+
+def normalize_text(text) -> str:
+    """Lowercase, strip accents and collapse whitespace."""
+    text = unicodedata.normalize('NFKD', str(text or ''))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(text.lower().split())
+
+
+def _trigrams(text: str):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class StudentSearchIndex:
+    """Prefix + substring index over normalized names and roll numbers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []        # sorted [(key, uid)] - full name, each name word, roll number
+        self._texts = {}       # uid -> (normalized name, normalized roll_no)
+        self._trigrams = {}    # trigram -> {uid}
+        self._profiles = {}    # uid -> profile dict used for results/filters
+
+    def build(self, students: Dict[str, dict]):
+        """Replace the index contents with {uid: profile}."""
+        with self._lock:
+            self._keys, self._texts, self._trigrams, self._profiles = [], {}, {}, {}
+            for uid, profile in students.items():
+                self._add_locked(uid, profile, sort=False)
+            self._keys.sort()
+        print(f"✅ Search index built: {len(students)} students")
+
+    def upsert(self, uid: str, profile: Optional[dict]):
+        """Add or update a student (profile=None removes it)."""
+        with self._lock:
+            self._remove_locked(uid)
+            if profile is not None:
+                self._add_locked(uid, profile, sort=True)
+
+    def remove(self, uid: str):
+        with self._lock:
+            self._remove_locked(uid)
+
+    def _index_keys(self, name: str, roll_no: str) -> List[str]:
+        keys = {name, roll_no} | set(name.split())
+        return [key for key in keys if key]
+
+    def _add_locked(self, uid, profile, sort):
+        name = normalize_text(profile.get('name'))
+        roll_no = normalize_text(profile.get('roll_no'))
+        self._texts[uid] = (name, roll_no)
+        self._profiles[uid] = profile
+        for key in self._index_keys(name, roll_no):
+            if sort:
+                bisect.insort(self._keys, (key, uid))
+            else:
+                self._keys.append((key, uid))
+        for gram in _trigrams(name) | _trigrams(roll_no):
+            self._trigrams.setdefault(gram, set()).add(uid)
+
+    def _remove_locked(self, uid):
+        texts = self._texts.pop(uid, None)
+        if texts is None:
+            return
+        self._profiles.pop(uid, None)
+        name, roll_no = texts
+        for key in self._index_keys(name, roll_no):
+            pos = bisect.bisect_left(self._keys, (key, uid))
+            if pos < len(self._keys) and self._keys[pos] == (key, uid):
+                del self._keys[pos]
+        for gram in _trigrams(name) | _trigrams(roll_no):
+            uids = self._trigrams.get(gram)
+            if uids is not None:
+                uids.discard(uid)
+                if not uids:
+                    del self._trigrams[gram]
+
+    def search(self, query: str, branch: str = '', sem: Optional[int] = None,
+               offset: int = 0, limit: int = 20) -> Tuple[List[Tuple[str, dict]], int]:
+        """
+        Find students whose name/roll number starts with or contains `query`.
+        Prefix matches rank before substring-only matches; each group is
+        ordered by name.
+
+        Args:
+            query: Search text
+            branch: Optional branch filter
+            sem: Optional semester filter
+            offset: Results to skip (pagination)
+            limit: Maximum results to return
+
+        Returns:
+            tuple: ([(uid, profile), ...], total number of matches)
+        """
+        q = normalize_text(query)
+        if not q:
+            return [], 0
+
+        with self._lock:
+            # Prefix: every key in [q, q + '\uffff')
+            lo = bisect.bisect_left(self._keys, (q, ''))
+            hi = bisect.bisect_left(self._keys, (q + '\uffff', ''))
+            prefix = {uid for _, uid in self._keys[lo:hi]}
+
+            # Substring: intersect trigram postings, then verify
+            substring = set()
+            if len(q) >= 3:
+                postings = [self._trigrams.get(gram, set()) for gram in _trigrams(q)]
+                candidates = set.intersection(*postings) if postings else set()
+                substring = {uid for uid in candidates - prefix
+                             if q in self._texts[uid][0] or q in self._texts[uid][1]}
+
+            def _keep(uid):
+                profile = self._profiles[uid]
+                return (not branch or profile.get('branch') == branch) and (sem is None or profile.get('sem') == sem)
+
+            def _ordered(uids):
+                return sorted((uid for uid in uids if _keep(uid)), key=lambda uid: (self._texts[uid][0], uid))
+
+            ranked = _ordered(prefix) + _ordered(substring)
+            return [(uid, dict(self._profiles[uid])) for uid in ranked[offset:offset + limit]], len(ranked)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._texts)
@@ -0,0 +1,188 @@
+"""
+Compact roster-bitmap encoding for attendance sessions.
+A session stores its roster once as an ordered uid list; presence is a
+packed bitmap over that roster and the confidences of the present students
+(in roster order) are a uint8 or float16 array, next to their names and roll
+numbers. Absentees are therefore recorded explicitly, and SessionSet
+aggregates a semester of sessions with boolean matrices and matrix products
+instead of per-entry dict scans.
+
+Confidences are quantized: uint8 stores round(c * 255), so they decode to
+two decimals (0.5 -> 128 -> 0.5); float16 decodes to three.
+"""
+
+import numpy as np
+from typing import Dict, List, Optional, Sequence
+
+SESSION_ENCODING_VERSION = 1
+SESSION_FIELDS = ('session_encoding', 'session_roster', 'session_presence',
+                  'session_confidence', 'session_confidence_dtype', 'session_names', 'session_roll_nos')
+# Decimals a decoded confidence is exact to, per storage dtype
+_CONFIDENCE_DECIMALS = {'uint8': 2, 'float16': 3}
+
+def encode_session(roster: Sequence[str], present: Dict[str, float],
+                   confidence_dtype: str = 'uint8', profiles: Optional[Dict[str, dict]] = None) -> dict:
+    """
+    Encode one session as Firestore fields.
+
+    Args:
+        roster: Ordered uids of every student expected in the session
+        present: {uid: confidence} for the students marked present
+        confidence_dtype: 'uint8' (confidence * 255) or 'float16'
+        profiles: {uid: profile} to store the present students' name and roll_no
+
+    Returns:
+        dict: session_encoding, session_roster, session_presence,
+              session_confidence, session_confidence_dtype
+              (+ session_names, session_roll_nos with profiles)
+    """
+    roster = list(roster)
+    # Present students missing from the roster (e.g. enrolled since) still count
+    on_roster = set(roster)
+    roster += [uid for uid in present if uid not in on_roster]
+    bits = np.fromiter((uid in present for uid in roster), dtype=bool, count=len(roster))
+    conf = np.array([present[uid] for uid in roster if uid in present], dtype=np.float32)
+    if confidence_dtype == 'uint8':
+        packed_conf = np.round(np.clip(conf, 0.0, 1.0) * 255).astype(np.uint8)
+    elif confidence_dtype == 'float16':
+        packed_conf = conf.astype('<f2')
+    else:
+        raise ValueError(f"Unsupported confidence dtype: {confidence_dtype}")
+    encoded = {
+        'session_encoding': SESSION_ENCODING_VERSION,
+        'session_roster': roster,
+        'session_presence': np.packbits(bits, bitorder='little').tobytes(),
+        'session_confidence': packed_conf.tobytes(),
+        'session_confidence_dtype': confidence_dtype
+    }
+    if profiles is not None:
+        present_uids = [uid for uid in roster if uid in present]
+        encoded['session_names'] = [(profiles.get(uid) or {}).get('name', '') for uid in present_uids]
+        encoded['session_roll_nos'] = [(profiles.get(uid) or {}).get('roll_no', '') for uid in present_uids]
+    return encoded
+
+
+def is_encoded(data: dict) -> bool:
+    return 'session_presence' in data and 'session_roster' in data
+
+
+def decode_presence(data: dict) -> np.ndarray:
+    """Presence bitmap of an encoded session as a bool array over its roster."""
+    packed = np.frombuffer(data['session_presence'], dtype=np.uint8)
+    return np.unpackbits(packed, count=len(data['session_roster']), bitorder='little').astype(bool)
+
+
+def decode_confidences(data: dict) -> np.ndarray:
+    """Confidences of the present students (roster order), rounded to the stored precision."""
+    dtype = data.get('session_confidence_dtype', 'uint8')
+    if dtype == 'uint8':
+        conf = np.frombuffer(data['session_confidence'], dtype=np.uint8).astype(np.float64) / 255.0
+    else:
+        conf = np.frombuffer(data['session_confidence'], dtype='<f2').astype(np.float64)
+    return np.round(conf, _CONFIDENCE_DECIMALS.get(dtype, 3))
+
+
+def decode_session(data: dict) -> Dict[str, float]:
+    """Inverse of encode_session(): {uid: confidence} for present students."""
+    bits = decode_presence(data)
+    present_uids = [uid for uid, hit in zip(data['session_roster'], bits) if hit]
+    return dict(zip(present_uids, decode_confidences(data).tolist()))
+
+
+def student_confidence(data: dict, uid: str) -> Optional[float]:
+    """Confidence of `uid` in an encoded session, or None if absent / not on the roster."""
+    try:
+        position = data['session_roster'].index(uid)
+    except ValueError:
+        return None
+    bits = decode_presence(data)
+    if not bits[position]:
+        return None
+    return float(decode_confidences(data)[int(bits[:position].sum())])
+
+
+def decode_entries(data: dict) -> List[dict]:
+    """detected_students-style entries of an encoded session (names when stored)."""
+    entries = [{'student_uid': uid, 'confidence': confidence}
+               for uid, confidence in decode_session(data).items()]
+    if 'session_names' in data:
+        for entry, name, roll_no in zip(entries, data['session_names'], data.get('session_roll_nos', [])):
+            entry['name'] = name
+            entry['roll_no'] = roll_no
+    return entries
+
+
+class SessionSet:
+    """
+    Presence and enrollment matrices for a set of sessions, aligned on the
+    union of their rosters.
+
+    Args:
+        sessions: Attendance log dicts. Encoded sessions use their own roster;
+                  others need `fallback_roster` (absentees were not stored)
+        fallback_roster: Roster assumed for sessions without the encoding
+    """
+
+    def __init__(self, sessions: List[dict], fallback_roster: Optional[Sequence[str]] = None):
+        fallback_roster = list(fallback_roster or [])
+        fallback_set = set(fallback_roster)
+        rosters, presents, subjects = [], [], []
+        for data in sessions:
+            if is_encoded(data):
+                roster = data['session_roster']
+                bits = decode_presence(data)
+            else:
+                present = data.get('present')
+                if present is None:
+                    present = {e['student_uid']: e.get('confidence') for e in data.get('detected_students', [])}
+                roster = fallback_roster + [uid for uid in present if uid not in fallback_set]
+                bits = np.fromiter((uid in present for uid in roster), dtype=bool, count=len(roster))
+            rosters.append(roster)
+            presents.append(bits)
+            subjects.append(data.get('subject', '') or '')
+
+        self.uids = list(dict.fromkeys(uid for roster in rosters for uid in roster))
+        column = {uid: i for i, uid in enumerate(self.uids)}
+        self.subjects = sorted(set(subjects))
+        subject_index = {subject: i for i, subject in enumerate(self.subjects)}
+
+        self.enrolled = np.zeros((len(sessions), len(self.uids)), dtype=bool)   # (S, U)
+        self.present = np.zeros_like(self.enrolled)                           # (S, U)
+        for s, (roster, bits) in enumerate(zip(rosters, presents)):
+            cols = np.fromiter((column[uid] for uid in roster), dtype=np.int64, count=len(roster))
+            self.enrolled[s, cols] = True
+            self.present[s, cols[bits]] = True
+        self.session_subject = np.array([subject_index[s] for s in subjects], dtype=np.int64)  # (S,)
+
+    def _subject_onehot(self) -> np.ndarray:
+        onehot = np.zeros((len(self.subjects), len(self.session_subject)), dtype=np.int64)  # (K, S)
+        onehot[self.session_subject, np.arange(len(self.session_subject))] = 1
+        return onehot
+
+    def student_rates(self) -> Dict[str, float]:
+        """Overall attendance percentage per student."""
+        present = self.present.sum(axis=0)
+        total = self.enrolled.sum(axis=0)
+        pct = np.round(np.divide(present * 100.0, total, out=np.zeros(total.shape), where=total > 0), 1)
+        return dict(zip(self.uids, pct.tolist()))
+
+    def subject_rates(self) -> Dict[str, dict]:
+        """{subject: {'sessions', 'present', 'expected', 'pct'}} over all students."""
+        onehot = self._subject_onehot()
+        present = onehot @ self.present.sum(axis=1)
+        expected = onehot @ self.enrolled.sum(axis=1)
+        sessions = onehot.sum(axis=1)
+        return {
+            subject: {
+                'sessions': int(sessions[k]),
+                'present': int(present[k]),
+                'expected': int(expected[k]),
+                'pct': round(100.0 * int(present[k]) / int(expected[k]), 1) if expected[k] else 0.0
+            }
+            for k, subject in enumerate(self.subjects)
+        }
+
+    def class_rate(self) -> float:
+        """Percentage of expected attendances that were present."""
+        expected = int(self.enrolled.sum())
+        return round(100.0 * int(self.present.sum()) / expected, 1) if expected else 0.0
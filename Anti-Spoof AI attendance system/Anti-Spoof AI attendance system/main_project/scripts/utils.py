@@ -48,6 +48,57 @@ def batch_cosine_similarity(embeddings1: np.ndarray, embeddings2: np.ndarray) ->
     
     return similarity_matrix
 
+def topk_cosine_similarity(queries: np.ndarray,
+                           gallery: np.ndarray,
+                           k: int = 1,
+                           chunk_size: int = 4096,
+                           normalize: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Streaming top-k similarity search over a gallery processed in fixed-size chunks.
+    Only an (N, chunk_size) score block and the running (N, k) top-k are held
+    in memory, so `gallery` may be a np.memmap larger than RAM.
+
+    Args:
+        queries: Array of shape (N, D)
+        gallery: Array of shape (M, D) - ndarray or np.memmap
+        k: Number of best matches to keep per query
+        chunk_size: Gallery rows scored per step
+        normalize: L2-normalize rows (cosine). False = raw dot product,
+                   e.g. for already-projected embeddings.
+
+    Returns:
+        tuple: (indices, scores), each of shape (N, min(k, M)), sorted by
+               descending score per query
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    if normalize:
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    n, m = len(queries), len(gallery)
+    k = min(k, m)
+
+    top_idx = np.empty((n, 0), dtype=np.int64)
+    top_scores = np.empty((n, 0), dtype=np.float32)
+    for start in range(0, m, chunk_size):
+        chunk = np.asarray(gallery[start:start + chunk_size], dtype=np.float32)
+        if normalize:
+            norms = np.linalg.norm(chunk, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            chunk = chunk / norms
+        scores = queries @ chunk.T                                            # (N, chunk)
+
+        # Merge this chunk's candidates with the running top-k
+        cand_scores = np.concatenate([top_scores, scores], axis=1)
+        cand_idx = np.concatenate(
+            [top_idx, np.broadcast_to(np.arange(start, start + len(chunk)), scores.shape)], axis=1)
+        if cand_scores.shape[1] > k:
+            keep = np.argpartition(-cand_scores, k - 1, axis=1)[:, :k]
+            cand_scores = np.take_along_axis(cand_scores, keep, axis=1)
+            cand_idx = np.take_along_axis(cand_idx, keep, axis=1)
+        top_scores, top_idx = cand_scores, cand_idx
+
+    order = np.argsort(-top_scores, axis=1)
+    return np.take_along_axis(top_idx, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
 def find_best_match(query_embedding: np.ndarray, 
                     database_embeddings: Dict[str, np.ndarray],
                     threshold: float = 0.4) -> Tuple[str, float]:
@@ -247,6 +298,7 @@ if __name__ == '__main__':
     print("\nAvailable functions:")
     print("  - cosine_similarity()")
     print("  - batch_cosine_similarity()")
+    print("  - topk_cosine_similarity()")
     print("  - find_best_match()")
     print("  - draw_bounding_boxes()")
     print("  - validate_email()")
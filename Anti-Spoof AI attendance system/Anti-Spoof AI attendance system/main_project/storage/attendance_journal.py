@@ -0,0 +1,225 @@
+# Write-behind journal for attendance sessions (ATTENDANCE_WRITE_BEHIND=1).
+# mark_attendance appends the session to a local SQLite journal and answers
+# as soon as that commit is on disk; a background worker flushes pending
+# sessions to the storage backend in batches. Every session gets its log id
+# when it is journaled and the backend writes are idempotent on that id, so
+# a flush that is retried after a timeout or a crash never logs (or counts)
+# a session twice. Failed flushes back off exponentially.
+
+import os
+import json
+import time
+import uuid
+import random
+import sqlite3
+import threading
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendance_journal (
+    seq             INTEGER PRIMARY KEY AUTOINCREMENT,
+    log_id          TEXT NOT NULL UNIQUE,
+    payload         TEXT NOT NULL,
+    created_at      REAL NOT NULL,
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    last_error      TEXT,
+    flushed_at      REAL
+);
+CREATE INDEX IF NOT EXISTS idx_journal_pending ON attendance_journal (flushed_at, next_attempt_at, seq);
+"""
+
+
+class AttendanceJournal:
+    """
+    Durable local queue of attendance sessions in front of a storage backend.
+
+    Args:
+        path (str): Journal database file
+        storage: Storage backend the sessions are flushed to (storage/base.py)
+        batch_size (int): Sessions per flush
+        flush_interval (float): Seconds between flushes when idle
+        base_backoff (float): First retry delay in seconds (doubles per attempt)
+        max_backoff (float): Retry delay cap in seconds
+        retention_days (float): Flushed entries are deleted after this long
+    """
+
+    def __init__(self, path, storage, batch_size=50, flush_interval=1.0,
+                 base_backoff=1.0, max_backoff=300.0, retention_days=7.0):
+        self.path = path
+        self.storage = storage
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.retention = retention_days * 86400
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            # FULL: a session is on disk before the request is answered
+            conn.execute('PRAGMA synchronous=FULL')
+            self._local.conn = conn
+        return conn
+
+    # ─── Lifecycle ────────────────────────────────────────────────────────────
+
+    def start(self):
+        """Start the flush worker (sessions left from a previous run go first)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            backlog = self.backlog()
+            print(f"✅ Attendance journal ready: {self.path} ({backlog['pending']} pending)")
+        return self
+
+    def stop(self, flush=True):
+        """Stop the worker, optionally flushing what is due first."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if flush:
+            self.flush()
+
+    # ─── Writes ───────────────────────────────────────────────────────────────
+
+    def append(self, date, detected_students, subject='', branch='', sem=None, profiles=None, roster=None):
+        """
+        Journal one session (same arguments as Storage.log_attendance) and
+        wake the worker. Returns once the entry is committed locally.
+
+        Returns:
+            str: Log id the session will have in the backend
+        """
+        log_id = uuid.uuid4().hex[:20]
+        profiles = profiles or {}
+        payload = {
+            'date': date,
+            'detected_students': detected_students,
+            'subject': subject,
+            'branch': branch,
+            'sem': sem,
+            # Only the names the log denormalizes, not every roster profile
+            'profiles': {
+                e['student_uid']: {'name': (profiles.get(e['student_uid']) or {}).get('name', ''),
+                                   'roll_no': (profiles.get(e['student_uid']) or {}).get('roll_no', '')}
+                for e in detected_students
+            },
+            'roster': list(roster) if roster is not None else None,
+            'timestamp': datetime.now().astimezone().isoformat()
+        }
+        with self._conn() as conn:
+            conn.execute('INSERT INTO attendance_journal (log_id, payload, created_at) VALUES (?, ?, ?)',
+                         (log_id, json.dumps(payload), time.time()))
+        self._wake.set()
+        return log_id
+
+    # ─── Flushing ─────────────────────────────────────────────────────────────
+
+    def _run(self):
+        last_prune = 0.0
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                # Drain everything that is due, one batch at a time
+                while self.flush_once() == self.batch_size and not self._stop.is_set():
+                    pass
+                if time.time() - last_prune > 3600:
+                    self.prune()
+                    last_prune = time.time()
+            except Exception as e:
+                print(f"⚠️  Attendance journal flush failed: {e}")
+
+    def flush_once(self):
+        """
+        Flush up to batch_size due sessions.
+
+        Returns:
+            int: Sessions taken from the journal (flushed or rescheduled)
+        """
+        now = time.time()
+        rows = self._conn().execute(
+            'SELECT seq, log_id, payload, attempts FROM attendance_journal '
+            'WHERE flushed_at IS NULL AND next_attempt_at <= ? ORDER BY seq LIMIT ?',
+            (now, self.batch_size)).fetchall()
+        if not rows:
+            return 0
+
+        sessions = []
+        for row in rows:
+            session = json.loads(row['payload'])
+            session['log_id'] = row['log_id']
+            session['timestamp'] = datetime.fromisoformat(session['timestamp'])
+            sessions.append(session)
+        try:
+            stored = set(self.storage.log_attendance_many(sessions))
+        except Exception as e:
+            self._reschedule(rows, str(e))
+            print(f"⚠️  Attendance journal: {len(rows)} session(s) not flushed, will retry: {e}")
+            return len(rows)
+
+        done = [row for row in rows if row['log_id'] in stored]
+        with self._conn() as conn:
+            conn.executemany('UPDATE attendance_journal SET flushed_at = ?, last_error = NULL WHERE seq = ?',
+                             [(time.time(), row['seq']) for row in done])
+        missing = [row for row in rows if row['log_id'] not in stored]
+        if missing:
+            self._reschedule(missing, 'not stored by the backend')
+        return len(rows)
+
+    def _reschedule(self, rows, error):
+        now = time.time()
+        with self._conn() as conn:
+            conn.executemany(
+                'UPDATE attendance_journal SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE seq = ?',
+                [(row['attempts'] + 1,
+                  # Exponential backoff with jitter so instances don't retry in lockstep
+                  now + min(self.max_backoff, self.base_backoff * 2 ** row['attempts']) * random.uniform(0.5, 1.0),
+                  error, row['seq'])
+                 for row in rows])
+
+    def flush(self):
+        """Flush every session that is due now (blocking)."""
+        while self.flush_once() == self.batch_size:
+            pass
+
+    def prune(self):
+        """Delete flushed entries older than the retention period."""
+        with self._conn() as conn:
+            conn.execute('DELETE FROM attendance_journal WHERE flushed_at IS NOT NULL AND flushed_at < ?',
+                         (time.time() - self.retention,))
+
+    # ─── Metrics ──────────────────────────────────────────────────────────────
+
+    def backlog(self):
+        """
+        Returns:
+            dict: {'pending': int, 'oldest_age': seconds or None, 'retrying': int, 'last_error': str or None}
+        """
+        row = self._conn().execute(
+            'SELECT COUNT(*) AS pending, MIN(created_at) AS oldest, SUM(attempts > 0) AS retrying '
+            'FROM attendance_journal WHERE flushed_at IS NULL').fetchone()
+        error = self._conn().execute(
+            'SELECT last_error FROM attendance_journal WHERE flushed_at IS NULL AND last_error IS NOT NULL '
+            'ORDER BY seq DESC LIMIT 1').fetchone()
+        return {
+            'pending': row['pending'],
+            'oldest_age': round(time.time() - row['oldest'], 1) if row['oldest'] else None,
+            'retrying': row['retrying'] or 0,
+            'last_error': error['last_error'] if error else None
+        }
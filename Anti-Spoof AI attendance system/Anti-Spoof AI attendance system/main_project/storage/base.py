@@ -0,0 +1,189 @@
+# Storage interface for students, embeddings, attendance logs and admins.
+# The backend picks an implementation by configuration (STORAGE_BACKEND):
+#   firestore (default) -> storage/firestore_storage.py
+#   sqlite              -> storage/sqlite_storage.py (single-site / offline / benchmarks)
+# Authentication stays with Firebase Auth in both cases.
+
+
+class Storage:
+    """
+    Persistence operations used by the backend. Return shapes match the
+    Firestore helpers in firebase/firebase_service.py, so routes don't care
+    which backend is active.
+    """
+
+    name = 'abstract'
+
+    # Writes the backend applies per round trip (enroll_students callers chunk by this)
+    write_batch_size = 500
+
+    # ─── Admins ───────────────────────────────────────────────────────────────
+
+    def add_admin(self, uid, name, email):
+        raise NotImplementedError
+
+    def get_admin(self, uid):
+        """Admin profile dict, or None."""
+        raise NotImplementedError
+
+    # ─── Students ─────────────────────────────────────────────────────────────
+
+    def new_student_id(self):
+        """A fresh unique student id (used as the Auth uid for imports)."""
+        raise NotImplementedError
+
+    def add_student(self, uid, roll_no, name, email, branch='', sem=None):
+        raise NotImplementedError
+
+    def enroll_students(self, entries):
+        """
+        Save many new students with their templates in as few writes as possible.
+
+        Args:
+            entries (list): [(uid, profile dict, TemplateSet)]
+        """
+        raise NotImplementedError
+
+    def get_student_by_roll_no(self, roll_no):
+        raise NotImplementedError
+
+    def get_students_by_uids(self, uids, field_paths=None):
+        """{uid: profile dict} for the uids that exist."""
+        raise NotImplementedError
+
+    def get_all_students(self):
+        """{uid: profile dict} for every student."""
+        raise NotImplementedError
+
+    def list_students(self, branch='', sem=None):
+        """[(uid, profile dict)] for every student, optionally filtered by branch and/or sem."""
+        raise NotImplementedError
+
+    def list_students_page(self, branch='', sem=None, sort_by='name', limit=50, page_token=None):
+        """(list of STUDENT_LIST_FIELDS dicts incl. 'uid', next_page_token or None)"""
+        raise NotImplementedError
+
+    def count_students_by_class(self):
+        """{branch: {sem: count}}"""
+        raise NotImplementedError
+
+    def promote_students(self, uids, to_sem):
+        raise NotImplementedError
+
+    def remove_students(self, students, archive=False):
+        """Delete profiles + embeddings of {uid: profile}; archive copies profiles to alumni."""
+        raise NotImplementedError
+
+    def delete_student(self, uid):
+        """Delete one student's profile and embeddings."""
+        self.remove_students({uid: {}})
+
+    # Backends with a change feed (Firestore listeners) set this to True
+    has_change_feed = False
+
+    def watch_students(self, on_changes):
+        """
+        Start a change feed calling on_changes([(uid, profile_or_None), ...]);
+        the first call carries the whole collection.
+
+        Returns:
+            Handle with unsubscribe() and is_active (False once the feed has
+            stopped and has to be restarted)
+        """
+        raise NotImplementedError
+
+    # ─── Embeddings ───────────────────────────────────────────────────────────
+
+    def save_templates(self, uid, centroid, medoids, seen):
+        raise NotImplementedError
+
+    def save_templates_many(self, templates, if_newer=False):
+        """
+        Save {uid: TemplateSet} in batched writes. With if_newer, a set only
+        replaces a stored one that has seen fewer samples (TemplateSet.seen
+        grows with every fold), so a stale set can't overwrite a newer one.
+        """
+        raise NotImplementedError
+
+    def get_all_templates(self):
+        """{uid: {'centroid', 'medoids', 'seen'}}"""
+        raise NotImplementedError
+
+    def get_templates_since(self, since):
+        """
+        Template sets saved at or after `since` (timezone-aware datetime), as
+        get_all_templates() returns them; lets each backend instance pick up
+        the others' enrollments and template updates.
+        """
+        raise NotImplementedError
+
+    # ─── Attendance ───────────────────────────────────────────────────────────
+
+    def log_attendance(self, date, detected_students, subject='', branch='', sem=None,
+                       profiles=None, roster=None, log_id=None, timestamp=None):
+        """
+        Save one session; returns its id. With `log_id` the write is
+        idempotent (an already stored id is not logged or counted again).
+        """
+        raise NotImplementedError
+
+    def log_attendance_many(self, sessions):
+        """
+        Save many sessions (log_attendance keyword dicts, each with 'log_id').
+
+        Returns:
+            list: IDs of the sessions now stored (written or already present)
+        """
+        return [self.log_attendance(**session) for session in sessions]
+
+    def list_attendance_logs_page(self, date_from='', date_to='', subject='', branch='', sem=None,
+                                  limit=50, page_token=None):
+        """(list of log dicts incl. 'id' and 'detected_students', next_page_token or None)"""
+        raise NotImplementedError
+
+    def get_student_attendance(self, student_uid, student=None, date_from='', date_to='',
+                               limit=None, page_token=None, with_stats=True):
+        """(records, subject_stats, next_page_token or None)"""
+        raise NotImplementedError
+
+    def get_attendance_stats(self, student_uid, branch, sem):
+        """{subject: {'present', 'total', 'pct'}}"""
+        raise NotImplementedError
+
+    def get_class_sessions(self, branch, sem, date_from='', date_to=''):
+        """Session dicts (subject + 'present' map and/or roster-bitmap fields), newest first."""
+        raise NotImplementedError
+
+
+STORAGE_BACKENDS = ('firestore', 'sqlite')
+
+
+def create_storage(backend=None, db=None):
+    """
+    Build the storage backend named by `backend` (default STORAGE_BACKEND env,
+    'firestore').
+
+    Args:
+        backend (str): 'firestore' or 'sqlite'
+        db: Firestore client (firestore backend only)
+
+    Returns:
+        Storage
+    """
+    import os
+
+    backend = (backend or os.getenv('STORAGE_BACKEND') or 'firestore').lower()
+    if backend == 'firestore':
+        from storage.firestore_storage import FirestoreStorage
+        if db is None:
+            from firebase.firebase_service import initialize_firebase
+            db = initialize_firebase()
+        return FirestoreStorage(db)
+    if backend == 'sqlite':
+        from storage.sqlite_storage import SQLiteStorage
+        path = os.getenv('SQLITE_PATH', 'local_cache/attendance.db')
+        if not os.path.isabs(path):
+            # Relative to main_project/, like FIREBASE_CREDENTIALS_PATH
+            path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), path)
+        return SQLiteStorage(path)
+    raise ValueError(f"Unknown STORAGE_BACKEND {backend!r} (expected one of: {', '.join(STORAGE_BACKENDS)})")
@@ -0,0 +1,243 @@
+# Durable outbox for notification emails (EMAIL_OUTBOX=true).
+# mark_attendance writes one row per absent student to a local SQLite table
+# and returns; a background worker drains due rows in batches through the
+# mail dispatcher. Rows are unique on (student_uid, log_id), so marking the
+# same session again or replaying after a restart never queues a second
+# email. Failed sends back off exponentially and rows that keep failing are
+# parked as dead after max_attempts. A row is marked sent as soon as the
+# server accepts it; only a crash in that gap can send an email twice.
+
+import os
+import json
+import time
+import random
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_uid     TEXT NOT NULL,
+    log_id          TEXT NOT NULL,
+    email           TEXT NOT NULL,
+    payload         TEXT NOT NULL,
+    created_at      REAL NOT NULL,
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    last_error      TEXT,
+    sent_at         REAL,
+    dead_at         REAL,
+    UNIQUE (student_uid, log_id)
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_pending ON email_outbox (sent_at, dead_at, next_attempt_at, id);
+CREATE INDEX IF NOT EXISTS idx_outbox_sent ON email_outbox (sent_at);
+"""
+
+
+class EmailOutbox:
+    """
+    Durable local queue of emails in front of a sender.
+
+    Args:
+        path (str): Outbox database file
+        send: Function(email, payloads) -> Future resolving once the server accepted
+              one email covering all `payloads` (due rows for the same address
+              are sent together)
+        batch_size (int): Rows taken per flush
+        flush_interval (float): Seconds between flushes when idle
+        base_backoff (float): First retry delay in seconds (doubles per attempt)
+        max_backoff (float): Retry delay cap in seconds
+        max_attempts (int): Failed sends before a row is parked as dead
+        retention_days (float): Sent and dead rows are deleted after this long
+    """
+
+    def __init__(self, path, send, batch_size=50, flush_interval=2.0, base_backoff=30.0,
+                 max_backoff=3600.0, max_attempts=8, retention_days=30.0):
+        self.path = path
+        self.send = send
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.retention = retention_days * 86400
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=FULL')
+            self._local.conn = conn
+        return conn
+
+    # ─── Lifecycle ────────────────────────────────────────────────────────────
+
+    def start(self):
+        """Start the dispatch worker (rows left from a previous run go first)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='email-outbox', daemon=True)
+            self._thread.start()
+            backlog = self.backlog()
+            print(f"✅ Email outbox ready: {self.path} ({backlog['pending']} pending)")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    # ─── Writes ───────────────────────────────────────────────────────────────
+
+    def enqueue(self, entries, not_before=None):
+        """
+        Add emails to the outbox; an entry whose (student_uid, log_id) is
+        already there is ignored.
+
+        Args:
+            entries (list): [{'student_uid': str, 'log_id': str, 'email': str, 'payload': dict}, ...]
+            not_before (float): Epoch time before which they aren't sent (None = now)
+
+        Returns:
+            int: Entries added
+        """
+        now = time.time()
+        with self._conn() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                'INSERT OR IGNORE INTO email_outbox '
+                '(student_uid, log_id, email, payload, created_at, next_attempt_at) VALUES (?, ?, ?, ?, ?, ?)',
+                [(e['student_uid'], e['log_id'], e['email'], json.dumps(e['payload']), now, not_before or 0)
+                 for e in entries])
+            added = conn.total_changes - before
+        if not not_before:
+            self._wake.set()
+        return added
+
+    # ─── Dispatching ──────────────────────────────────────────────────────────
+
+    def _run(self):
+        last_prune = 0.0
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                while self.flush_once() and not self._stop.is_set():
+                    pass
+                if time.time() - last_prune > 3600:
+                    self.prune()
+                    last_prune = time.time()
+            except Exception as e:
+                print(f"⚠️  Email outbox dispatch failed: {e}")
+
+    def flush_once(self):
+        """
+        Send up to batch_size due rows (plus other due rows for the same
+        addresses, so they go out as one email each).
+
+        Returns:
+            int: Rows taken from the outbox (sent or rescheduled)
+        """
+        now = time.time()
+        conn = self._conn()
+        emails = [row['email'] for row in conn.execute(
+            'SELECT DISTINCT email FROM (SELECT email FROM email_outbox '
+            'WHERE sent_at IS NULL AND dead_at IS NULL AND next_attempt_at <= ? ORDER BY id LIMIT ?)',
+            (now, self.batch_size))]
+        if not emails:
+            return 0
+        rows = conn.execute(
+            'SELECT id, email, payload, attempts FROM email_outbox '
+            'WHERE sent_at IS NULL AND dead_at IS NULL AND next_attempt_at <= ? '
+            f'AND email IN ({",".join("?" * len(emails))}) ORDER BY id',
+            (now, *emails)).fetchall()
+
+        groups = {}
+        for row in rows:
+            groups.setdefault(row['email'], []).append(row)
+        futures = []
+        for email, group in groups.items():
+            try:
+                futures.append((group, self.send(email, [json.loads(row['payload']) for row in group])))
+            except Exception as e:
+                self._reschedule(group, str(e))
+
+        failed = 0
+        for group, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                failed += len(group)
+                self._reschedule(group, str(e))
+                continue
+            with self._conn() as conn:
+                conn.executemany('UPDATE email_outbox SET sent_at = ?, last_error = NULL WHERE id = ?',
+                                 [(time.time(), row['id']) for row in group])
+        if failed:
+            print(f"⚠️  Email outbox: {failed} email(s) not sent, will retry")
+        return len(rows)
+
+    def _reschedule(self, rows, error):
+        now = time.time()
+        with self._conn() as conn:
+            conn.executemany(
+                'UPDATE email_outbox SET attempts = ?, next_attempt_at = ?, last_error = ?, '
+                'dead_at = CASE WHEN ? >= ? THEN ? END WHERE id = ?',
+                [(row['attempts'] + 1,
+                  # Exponential backoff with jitter so a send storm doesn't retry in lockstep
+                  now + min(self.max_backoff, self.base_backoff * 2 ** row['attempts']) * random.uniform(0.5, 1.0),
+                  error, row['attempts'] + 1, self.max_attempts, now, row['id'])
+                 for row in rows])
+
+    def prune(self):
+        """Delete sent and dead rows older than the retention period."""
+        cutoff = time.time() - self.retention
+        with self._conn() as conn:
+            conn.execute('DELETE FROM email_outbox WHERE sent_at < ? OR dead_at < ?', (cutoff, cutoff))
+
+    # ─── Metrics ──────────────────────────────────────────────────────────────
+
+    def backlog(self, window=3600):
+        """
+        Queue size and send latency (enqueue to accepted) over the last `window` seconds.
+
+        Returns:
+            dict: {'pending': int, 'due': int, 'oldest_age': seconds or None, 'retrying': int,
+                   'dead': int, 'last_error': str or None, 'sent_recent': int,
+                   'latency_avg': seconds or None, 'latency_p95': seconds or None}
+        """
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            'SELECT COUNT(*) AS pending, SUM(next_attempt_at <= ?) AS due, MIN(created_at) AS oldest, '
+            'SUM(attempts > 0) AS retrying FROM email_outbox WHERE sent_at IS NULL AND dead_at IS NULL',
+            (now,)).fetchone()
+        dead = conn.execute('SELECT COUNT(*) FROM email_outbox WHERE dead_at IS NOT NULL').fetchone()[0]
+        error = conn.execute(
+            'SELECT last_error FROM email_outbox WHERE sent_at IS NULL AND last_error IS NOT NULL '
+            'ORDER BY id DESC LIMIT 1').fetchone()
+        latencies = sorted(r[0] for r in conn.execute(
+            'SELECT sent_at - created_at FROM email_outbox WHERE sent_at >= ?', (now - window,)))
+        return {
+            'pending': row['pending'],
+            'due': row['due'] or 0,
+            'oldest_age': round(now - row['oldest'], 1) if row['oldest'] else None,
+            'retrying': row['retrying'] or 0,
+            'dead': dead,
+            'last_error': error['last_error'] if error else None,
+            'sent_recent': len(latencies),
+            'latency_avg': round(sum(latencies) / len(latencies), 2) if latencies else None,
+            'latency_p95': round(latencies[int(0.95 * (len(latencies) - 1))], 2) if latencies else None
+        }
@@ -0,0 +1,163 @@
+# Firestore storage backend - thin wrapper over firebase/firebase_service.py
+
+from firebase.firebase_service import (
+    add_admin,
+    add_student,
+    save_templates,
+    save_templates_if_newer,
+    get_all_templates,
+    get_templates_since,
+    log_attendance,
+    log_attendance_many,
+    list_attendance_logs_page,
+    get_student_attendance,
+    get_attendance_stats,
+    get_class_sessions,
+    get_students_by_uids,
+    get_all_students,
+    get_student_by_roll_no,
+    list_students_page,
+    count_students_by_class,
+    promote_students,
+    remove_students,
+    FIRESTORE_BATCH_LIMIT
+)
+from storage.base import Storage
+
+
+class FirestoreStorage(Storage):
+    """
+    Storage backed by Firestore collections (students, embeddings,
+    attendance_log, attendance_stats, admins, alumni).
+
+    Args:
+        db: Firestore client
+    """
+
+    name = 'firestore'
+    write_batch_size = FIRESTORE_BATCH_LIMIT
+    has_change_feed = True
+
+    def __init__(self, db):
+        self.db = db
+
+    # ─── Admins ───────────────────────────────────────────────────────────────
+
+    def add_admin(self, uid, name, email):
+        return add_admin(self.db, uid, name, email)
+
+    def get_admin(self, uid):
+        doc = self.db.collection('admins').document(uid).get()
+        return doc.to_dict() if doc.exists else None
+
+    # ─── Students ─────────────────────────────────────────────────────────────
+
+    def new_student_id(self):
+        return self.db.collection('students').document().id
+
+    def add_student(self, uid, roll_no, name, email, branch='', sem=None):
+        return add_student(self.db, uid, roll_no, name, email, branch=branch, sem=sem)
+
+    def enroll_students(self, entries):
+        # Profile + embedding per student, committed every FIRESTORE_BATCH_LIMIT writes
+        for start in range(0, len(entries), FIRESTORE_BATCH_LIMIT // 2):
+            batch = self.db.batch()
+            for uid, profile, t in entries[start:start + FIRESTORE_BATCH_LIMIT // 2]:
+                add_student(self.db, uid, profile['roll_no'], profile['name'], profile['email'],
+                            branch=profile.get('branch', ''), sem=profile.get('sem'), batch=batch)
+                save_templates(self.db, uid, t.centroid, t.medoids, t.seen, batch=batch)
+            batch.commit()
+
+    def get_student_by_roll_no(self, roll_no):
+        return get_student_by_roll_no(self.db, roll_no)
+
+    def get_students_by_uids(self, uids, field_paths=None):
+        return get_students_by_uids(self.db, uids, field_paths=field_paths)
+
+    def get_all_students(self):
+        return get_all_students(self.db)
+
+    def list_students(self, branch='', sem=None):
+        query = self.db.collection('students')
+        if branch:
+            query = query.where('branch', '==', branch)
+        if sem is not None:
+            query = query.where('sem', '==', sem)
+        return [(doc.id, doc.to_dict()) for doc in query.stream()]
+
+    def list_students_page(self, branch='', sem=None, sort_by='name', limit=50, page_token=None):
+        return list_students_page(self.db, branch=branch, sem=sem, sort_by=sort_by,
+                                  limit=limit, page_token=page_token)
+
+    def count_students_by_class(self):
+        return count_students_by_class(self.db)
+
+    def promote_students(self, uids, to_sem):
+        return promote_students(self.db, uids, to_sem)
+
+    def remove_students(self, students, archive=False):
+        return remove_students(self.db, students, archive=archive)
+
+    def delete_student(self, uid):
+        self.db.collection('students').document(uid).delete()
+        self.db.collection('embeddings').document(uid).delete()
+
+    def watch_students(self, on_changes):
+        def _on_snapshot(col_snapshot, changes, read_time):
+            on_changes([
+                (change.document.id, None if change.type.name == 'REMOVED' else change.document.to_dict())
+                for change in changes
+            ])
+        # The Watch handle has unsubscribe() and is_active
+        return self.db.collection('students').on_snapshot(_on_snapshot)
+
+    # ─── Embeddings ───────────────────────────────────────────────────────────
+
+    def save_templates(self, uid, centroid, medoids, seen):
+        return save_templates(self.db, uid, centroid, medoids, seen)
+
+    def save_templates_many(self, templates, if_newer=False):
+        if not templates:
+            return
+        if if_newer:
+            save_templates_if_newer(self.db, templates)
+            return
+        for start in range(0, len(templates), FIRESTORE_BATCH_LIMIT):
+            batch = self.db.batch()
+            for uid, t in list(templates.items())[start:start + FIRESTORE_BATCH_LIMIT]:
+                save_templates(self.db, uid, t.centroid, t.medoids, t.seen, batch=batch)
+            batch.commit()
+
+    def get_all_templates(self):
+        return get_all_templates(self.db)
+
+    def get_templates_since(self, since):
+        return get_templates_since(self.db, since)
+
+    # ─── Attendance ───────────────────────────────────────────────────────────
+
+    def log_attendance(self, date, detected_students, subject='', branch='', sem=None,
+                       profiles=None, roster=None, log_id=None, timestamp=None):
+        return log_attendance(self.db, date, detected_students, subject=subject, branch=branch,
+                              sem=sem, profiles=profiles, roster=roster, log_id=log_id,
+                              timestamp=timestamp)
+
+    def log_attendance_many(self, sessions):
+        return log_attendance_many(self.db, sessions)
+
+    def list_attendance_logs_page(self, date_from='', date_to='', subject='', branch='', sem=None,
+                                  limit=50, page_token=None):
+        return list_attendance_logs_page(self.db, date_from=date_from, date_to=date_to, subject=subject,
+                                         branch=branch, sem=sem, limit=limit, page_token=page_token)
+
+    def get_student_attendance(self, student_uid, student=None, date_from='', date_to='',
+                               limit=None, page_token=None, with_stats=True):
+        return get_student_attendance(self.db, student_uid, student=student, date_from=date_from,
+                                      date_to=date_to, limit=limit, page_token=page_token,
+                                      with_stats=with_stats)
+
+    def get_attendance_stats(self, student_uid, branch, sem):
+        return get_attendance_stats(self.db, student_uid, branch, sem)
+
+    def get_class_sessions(self, branch, sem, date_from='', date_to=''):
+        return get_class_sessions(self.db, branch, sem, date_from=date_from, date_to=date_to)
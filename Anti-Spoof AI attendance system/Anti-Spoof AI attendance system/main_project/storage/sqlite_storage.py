@@ -0,0 +1,468 @@
+# SQLite storage backend (STORAGE_BACKEND=sqlite)
+# One database file in WAL mode, so marking requests write while the
+# dashboard reads. Embeddings are float32 BLOBs, attendance presence is one
+# row per (log, student) and per-subject stats are indexed GROUP BY queries,
+# so no counter documents are needed.
+
+import os
+import json
+import uuid
+import sqlite3
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from firebase.firebase_service import (
+    encode_page_token,
+    decode_page_token,
+    STUDENT_LIST_FIELDS,
+    STUDENT_SORT_KEYS
+)
+from storage.base import Storage
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS admins (
+    uid         TEXT PRIMARY KEY,
+    name        TEXT NOT NULL,
+    email       TEXT NOT NULL,
+    created_at  TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS students (
+    uid         TEXT PRIMARY KEY,
+    roll_no     TEXT NOT NULL UNIQUE,
+    name        TEXT NOT NULL,
+    email       TEXT NOT NULL,
+    branch      TEXT NOT NULL DEFAULT '',
+    sem         INTEGER,
+    enrolled_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_students_class ON students (branch, sem, name, uid);
+CREATE TABLE IF NOT EXISTS alumni (
+    uid          TEXT PRIMARY KEY,
+    profile      TEXT NOT NULL,
+    graduated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS embeddings (
+    uid         TEXT PRIMARY KEY,
+    dim         INTEGER NOT NULL,
+    centroid    BLOB NOT NULL,
+    medoids     BLOB NOT NULL,
+    seen        INTEGER NOT NULL,
+    updated_at  TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS attendance_log (
+    id            TEXT PRIMARY KEY,
+    date          TEXT NOT NULL,
+    subject       TEXT NOT NULL DEFAULT '',
+    branch        TEXT NOT NULL DEFAULT '',
+    sem           INTEGER,
+    timestamp     TEXT NOT NULL,
+    total_present INTEGER NOT NULL,
+    roster        TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_log_class ON attendance_log (branch, sem, date DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_log_subject ON attendance_log (subject, date DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_log_date ON attendance_log (date DESC, id DESC);
+CREATE TABLE IF NOT EXISTS attendance_present (
+    log_id      TEXT NOT NULL REFERENCES attendance_log (id) ON DELETE CASCADE,
+    student_uid TEXT NOT NULL,
+    confidence  REAL,
+    name        TEXT NOT NULL DEFAULT '',
+    roll_no     TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (log_id, student_uid)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_present_student ON attendance_present (student_uid, log_id);
+"""
+
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def _date_range(date_from, date_to, column='date'):
+    clauses, params = [], []
+    if date_from:
+        clauses.append(f'{column} >= ?')
+        params.append(date_from)
+    if date_to:
+        clauses.append(f'{column} <= ?')
+        params.append(date_to)
+    return clauses, params
+
+
+class SQLiteStorage(Storage):
+    """
+    Storage in a local SQLite database.
+
+    Args:
+        path (str): Database file (created with its schema if missing)
+        busy_timeout (float): Seconds a writer waits for the lock
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path, busy_timeout=30.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+        print(f"✅ SQLite storage ready: {path}")
+
+    def _conn(self):
+        """This thread's connection (sqlite3 connections are not shared across threads)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+        return conn
+
+    # ─── Admins ───────────────────────────────────────────────────────────────
+
+    def add_admin(self, uid, name, email):
+        with self._conn() as conn:
+            conn.execute('INSERT OR REPLACE INTO admins (uid, name, email, created_at) VALUES (?, ?, ?, ?)',
+                         (uid, name, email, _now()))
+        print(f"✅ Admin added to SQLite: {name}")
+        return uid
+
+    def get_admin(self, uid):
+        row = self._conn().execute('SELECT name, email, created_at FROM admins WHERE uid = ?', (uid,)).fetchone()
+        return dict(row) if row else None
+
+    # ─── Students ─────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _profile(row):
+        data = dict(row)
+        data.pop('uid', None)
+        return data
+
+    def new_student_id(self):
+        return uuid.uuid4().hex[:28]
+
+    def _insert_student(self, conn, uid, profile):
+        conn.execute(
+            'INSERT INTO students (uid, roll_no, name, email, branch, sem, enrolled_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (uid, profile['roll_no'], profile['name'], profile['email'],
+             profile.get('branch', '') or '', profile.get('sem'), _now()))
+
+    def add_student(self, uid, roll_no, name, email, branch='', sem=None):
+        with self._conn() as conn:
+            self._insert_student(conn, uid, {'roll_no': roll_no, 'name': name, 'email': email,
+                                             'branch': branch, 'sem': sem})
+        print(f"✅ Student added to SQLite: {name} (Roll No: {roll_no}, Branch: {branch}, Sem: {sem})")
+        return uid
+
+    def enroll_students(self, entries):
+        # One transaction for the whole chunk
+        with self._conn() as conn:
+            for uid, profile, t in entries:
+                self._insert_student(conn, uid, profile)
+                self._upsert_templates(conn, uid, t.centroid, t.medoids, t.seen)
+
+    def get_student_by_roll_no(self, roll_no):
+        row = self._conn().execute('SELECT * FROM students WHERE roll_no = ?', (roll_no,)).fetchone()
+        return dict(row) if row else None
+
+    def get_students_by_uids(self, uids, field_paths=None):
+        uids = list(dict.fromkeys(uids))
+        columns = ', '.join(['uid'] + list(field_paths)) if field_paths else '*'
+        students = {}
+        conn = self._conn()
+        for start in range(0, len(uids), 500):  # stay under SQLITE_MAX_VARIABLE_NUMBER
+            chunk = uids[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            for row in conn.execute(f'SELECT {columns} FROM students WHERE uid IN ({placeholders})', chunk):
+                students[row['uid']] = self._profile(row)
+        return students
+
+    def get_all_students(self):
+        return {row['uid']: self._profile(row) for row in self._conn().execute('SELECT * FROM students')}
+
+    def _class_filter(self, branch, sem):
+        clauses, params = [], []
+        if branch:
+            clauses.append('branch = ?')
+            params.append(branch)
+        if sem is not None:
+            clauses.append('sem = ?')
+            params.append(sem)
+        return clauses, params
+
+    def list_students(self, branch='', sem=None):
+        clauses, params = self._class_filter(branch, sem)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        return [(row['uid'], self._profile(row))
+                for row in self._conn().execute(f'SELECT * FROM students {where}', params)]
+
+    def list_students_page(self, branch='', sem=None, sort_by='name', limit=50, page_token=None):
+        if sort_by not in STUDENT_SORT_KEYS:
+            raise ValueError(f"sort_by must be one of: {', '.join(STUDENT_SORT_KEYS)}")
+        clauses, params = self._class_filter(branch, sem)
+        # Missing values (sem, roll_no may be NULL) sort last, as in the replica;
+        # a row comparison with NULL is NULL, so the cursor spells that order out
+        if page_token:
+            sort_value, last_uid = decode_page_token(page_token)
+            if sort_value is None:
+                clauses.append(f'({sort_by} IS NULL AND uid > ?)')
+                params.append(last_uid)
+            else:
+                clauses.append(f'({sort_by} IS NULL OR ({sort_by}, uid) > (?, ?))')
+                params += [sort_value, last_uid]
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self._conn().execute(
+            f"SELECT uid, {', '.join(STUDENT_LIST_FIELDS)} FROM students {where} "
+            f"ORDER BY {sort_by} IS NULL, {sort_by}, uid LIMIT ?", params + [limit]).fetchall()
+        students = [dict(row) for row in rows]
+
+        next_token = None
+        if len(students) == limit:
+            next_token = encode_page_token(students[-1].get(sort_by), students[-1]['uid'])
+        return students, next_token
+
+    def count_students_by_class(self):
+        counts = {}
+        for row in self._conn().execute('SELECT branch, sem, COUNT(*) AS n FROM students GROUP BY branch, sem'):
+            counts.setdefault(row['branch'] or '', {})[row['sem']] = row['n']
+        return counts
+
+    def promote_students(self, uids, to_sem):
+        with self._conn() as conn:
+            conn.executemany('UPDATE students SET sem = ? WHERE uid = ?', [(to_sem, uid) for uid in uids])
+        print(f"✅ {len(uids)} student(s) moved to sem {to_sem}")
+        return len(uids)
+
+    def remove_students(self, students, archive=False):
+        with self._conn() as conn:
+            if archive:
+                conn.executemany('INSERT OR REPLACE INTO alumni (uid, profile, graduated_at) VALUES (?, ?, ?)',
+                                 [(uid, json.dumps(profile, default=str), _now()) for uid, profile in students.items()])
+            conn.executemany('DELETE FROM students WHERE uid = ?', [(uid,) for uid in students])
+            conn.executemany('DELETE FROM embeddings WHERE uid = ?', [(uid,) for uid in students])
+        print(f"✅ {len(students)} student(s) {'archived' if archive else 'deleted'}")
+        return len(students)
+
+    # ─── Embeddings ───────────────────────────────────────────────────────────
+
+    def _upsert_templates(self, conn, uid, centroid, medoids, seen, if_newer=False):
+        centroid = np.asarray(centroid, dtype='<f4').ravel()
+        medoids = np.asarray(medoids, dtype='<f4').reshape(-1, centroid.size)
+        conn.execute(
+            'INSERT INTO embeddings (uid, dim, centroid, medoids, seen, updated_at) VALUES (?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (uid) DO UPDATE SET dim = excluded.dim, centroid = excluded.centroid, '
+            'medoids = excluded.medoids, seen = excluded.seen, updated_at = excluded.updated_at'
+            + (' WHERE excluded.seen > embeddings.seen' if if_newer else ''),
+            (uid, int(centroid.size), centroid.tobytes(), medoids.tobytes(), int(seen), _now()))
+
+    def save_templates(self, uid, centroid, medoids, seen):
+        with self._conn() as conn:
+            self._upsert_templates(conn, uid, centroid, medoids, seen)
+        print(f"✅ {len(medoids) + 1} template(s) saved for student UID: {uid} ({seen} samples)")
+        return uid
+
+    def save_templates_many(self, templates, if_newer=False):
+        with self._conn() as conn:
+            for uid, t in templates.items():
+                self._upsert_templates(conn, uid, t.centroid, t.medoids, t.seen, if_newer=if_newer)
+
+    @staticmethod
+    def _templates_row(row):
+        return {
+            'centroid': np.frombuffer(row['centroid'], dtype='<f4').copy(),
+            'medoids': np.frombuffer(row['medoids'], dtype='<f4').reshape(-1, row['dim']).copy(),
+            'seen': row['seen']
+        }
+
+    def get_all_templates(self):
+        templates = {row['uid']: self._templates_row(row) for row in self._conn().execute(
+            'SELECT uid, dim, centroid, medoids, seen FROM embeddings')}
+        print(f"✅ Retrieved templates for {len(templates)} students from SQLite")
+        return templates
+
+    def get_templates_since(self, since):
+        # updated_at is local time (see _now)
+        since = since.astimezone().replace(tzinfo=None).isoformat(timespec='seconds')
+        return {row['uid']: self._templates_row(row) for row in self._conn().execute(
+            'SELECT uid, dim, centroid, medoids, seen FROM embeddings WHERE updated_at >= ?', (since,))}
+
+    # ─── Attendance ───────────────────────────────────────────────────────────
+
+    def _insert_session(self, conn, date, detected_students, subject='', branch='', sem=None,
+                        profiles=None, roster=None, log_id=None, timestamp=None):
+        if profiles is None:
+            profiles = self.get_students_by_uids([e['student_uid'] for e in detected_students],
+                                                 field_paths=['name', 'roll_no'])
+        log_id = log_id or uuid.uuid4().hex
+        cursor = conn.execute(
+            'INSERT OR IGNORE INTO attendance_log (id, date, subject, branch, sem, timestamp, total_present, roster) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (log_id, date, subject, branch or '', sem,
+             timestamp.replace(tzinfo=None).isoformat(timespec='seconds') if timestamp else _now(),
+             len(detected_students),
+             json.dumps(list(roster)) if roster is not None else None))
+        if cursor.rowcount == 0:
+            return log_id  # already logged
+        conn.executemany(
+            'INSERT OR IGNORE INTO attendance_present (log_id, student_uid, confidence, name, roll_no) '
+            'VALUES (?, ?, ?, ?, ?)',
+            [(log_id, e['student_uid'], e['confidence'],
+              (profiles.get(e['student_uid']) or {}).get('name', ''),
+              (profiles.get(e['student_uid']) or {}).get('roll_no', ''))
+             for e in detected_students])
+        return log_id
+
+    def log_attendance(self, date, detected_students, subject='', branch='', sem=None,
+                       profiles=None, roster=None, log_id=None, timestamp=None):
+        with self._conn() as conn:
+            log_id = self._insert_session(conn, date, detected_students, subject, branch, sem,
+                                          profiles, roster, log_id, timestamp)
+        print(f"✅ Attendance logged for {date} ({subject}): {len(detected_students)} students present")
+        return log_id
+
+    def log_attendance_many(self, sessions):
+        with self._conn() as conn:
+            stored = [self._insert_session(conn, **session) for session in sessions]
+        print(f"✅ {len(stored)} attendance session(s) logged")
+        return stored
+
+    def _present_rows(self, log_ids):
+        """{log_id: [attendance_present rows]} for the given logs."""
+        by_log = {log_id: [] for log_id in log_ids}
+        conn = self._conn()
+        for start in range(0, len(log_ids), 500):
+            chunk = log_ids[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            for row in conn.execute(f'SELECT * FROM attendance_present WHERE log_id IN ({placeholders})', chunk):
+                by_log[row['log_id']].append(row)
+        return by_log
+
+    def list_attendance_logs_page(self, date_from='', date_to='', subject='', branch='', sem=None,
+                                  limit=50, page_token=None):
+        clauses, params = _date_range(date_from, date_to)
+        for column, value in (('subject', subject), ('branch', branch)):
+            if value:
+                clauses.append(f'{column} = ?')
+                params.append(value)
+        if sem is not None:
+            clauses.append('sem = ?')
+            params.append(sem)
+        if page_token:
+            last_date, last_id = decode_page_token(page_token)
+            clauses.append('(date, id) < (?, ?)')
+            params += [last_date, last_id]
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self._conn().execute(
+            f'SELECT id, date, subject, branch, sem, timestamp, total_present FROM attendance_log {where} '
+            'ORDER BY date DESC, id DESC LIMIT ?', params + [limit]).fetchall()
+
+        present = self._present_rows([row['id'] for row in rows])
+        logs = []
+        for row in rows:
+            data = dict(row)
+            entries = present[row['id']]
+            data['present'] = {e['student_uid']: e['confidence'] for e in entries}
+            data['detected_students'] = [
+                {'student_uid': e['student_uid'], 'confidence': e['confidence'],
+                 'name': e['name'], 'roll_no': e['roll_no']}
+                for e in entries
+            ]
+            logs.append(data)
+
+        next_token = None
+        if len(logs) == limit:
+            next_token = encode_page_token(logs[-1]['date'], logs[-1]['id'])
+        return logs, next_token
+
+    def get_student_attendance(self, student_uid, student=None, date_from='', date_to='',
+                               limit=None, page_token=None, with_stats=True):
+        if student is None:
+            student = self.get_students_by_uids([student_uid]).get(student_uid)
+        student_data = student or {}
+        clauses, params = _date_range(date_from, date_to, column='l.date')
+        base = ('FROM attendance_log l LEFT JOIN attendance_present p '
+                'ON p.log_id = l.id AND p.student_uid = ? '
+                "WHERE l.branch = ? AND l.sem IS ? AND l.subject != ''")
+        base_params = [student_uid, student_data.get('branch', '') or '', student_data.get('sem')] + params
+        if clauses:
+            base += ' AND ' + ' AND '.join(clauses)
+
+        page_sql, page_params = base, list(base_params)
+        if page_token:
+            last_date, last_id = decode_page_token(page_token)
+            page_sql += ' AND (l.date, l.id) < (?, ?)'
+            page_params += [last_date, last_id]
+        page_sql = (f'SELECT l.id, l.date, l.subject, l.timestamp, p.confidence, p.student_uid AS hit {page_sql} '
+                    'ORDER BY l.date DESC, l.id DESC')
+        if limit:
+            page_sql += ' LIMIT ?'
+            page_params.append(limit)
+        rows = self._conn().execute(page_sql, page_params).fetchall()
+        records = [
+            {
+                'date': row['date'],
+                'subject': row['subject'],
+                'status': 'present' if row['hit'] is not None else 'absent',
+                'timestamp': row['timestamp'],
+                'confidence': row['confidence']
+            }
+            for row in rows
+        ]
+        next_token = encode_page_token(rows[-1]['date'], rows[-1]['id']) if limit and len(rows) == limit else None
+
+        subject_stats = {}
+        if with_stats:
+            stats_sql = (f'SELECT l.subject, COUNT(*) AS total, COUNT(p.student_uid) AS present {base} '
+                         'GROUP BY l.subject')
+            for row in self._conn().execute(stats_sql, base_params):
+                subject_stats[row['subject']] = {
+                    'present': row['present'],
+                    'total': row['total'],
+                    'pct': round((row['present'] / row['total']) * 100, 1) if row['total'] else 0.0
+                }
+
+        print(f"✅ Retrieved {len(records)} attendance records for student {student_uid}")
+        return records, subject_stats, next_token
+
+    def get_attendance_stats(self, student_uid, branch, sem):
+        # Same numbers as the Firestore counters: every session of the class
+        # with a subject, and the ones this student was present in
+        rows = self._conn().execute(
+            'SELECT l.subject, COUNT(*) AS total, COUNT(p.student_uid) AS present '
+            'FROM attendance_log l LEFT JOIN attendance_present p ON p.log_id = l.id AND p.student_uid = ? '
+            "WHERE l.branch = ? AND l.sem IS ? AND l.subject != '' GROUP BY l.subject",
+            (student_uid, branch or '', sem))
+        return {
+            row['subject']: {
+                'present': row['present'],
+                'total': row['total'],
+                'pct': round((row['present'] / row['total']) * 100, 1) if row['total'] else 0.0
+            }
+            for row in rows
+        }
+
+    def get_class_sessions(self, branch, sem, date_from='', date_to=''):
+        from scripts.session_encoding import encode_session
+
+        clauses, params = _date_range(date_from, date_to)
+        where = ' AND '.join(['branch = ?', 'sem IS ?'] + clauses)
+        rows = self._conn().execute(
+            f'SELECT id, date, subject, roster FROM attendance_log WHERE {where} ORDER BY date DESC, id DESC',
+            [branch or '', sem] + params).fetchall()
+        present = self._present_rows([row['id'] for row in rows])
+
+        sessions = []
+        for row in rows:
+            data = {'id': row['id'], 'date': row['date'], 'subject': row['subject'],
+                    'present': {e['student_uid']: e['confidence'] for e in present[row['id']]}}
+            if row['roster'] is not None:
+                # Stored rosters record absentees too, like bitmap-encoded Firestore sessions
+                data.update(encode_session(json.loads(row['roster']), data['present']))
+            sessions.append(data)
+        return sessions
@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))  # main_project/
+
+pytest.importorskip('jwt')
+pytest.importorskip('cryptography')
+
+from firebase.token_cache import TokenCache, LocalTokenIssuer
+
+
+@pytest.fixture
+def issuer(tmp_path):
+    return LocalTokenIssuer(str(tmp_path / 'key.pem'))
+
+
+@pytest.fixture
+def frozen_time(monkeypatch):
+    # Late in the current second, so a float cutoff would land after a same-second iat
+    now = int(time.time()) + 0.9
+    monkeypatch.setattr(time, 'time', lambda: now)
+    return now
+
+
+def test_verify_is_cached(issuer):
+    cache = TokenCache(issuer.verify)
+    token = issuer.issue('student-1')
+    assert cache.verify(token)['uid'] == 'student-1'
+    assert cache.verify(token)['uid'] == 'student-1'
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_revoke_rejects_earlier_tokens(issuer, frozen_time):
+    cache = TokenCache(issuer.verify)
+    old = issuer.issue('student-1', iat=int(frozen_time) - 10)
+    cache.verify(old)
+    cache.revoke('student-1')
+    assert len(cache) == 0
+    with pytest.raises(PermissionError):
+        cache.verify(old)
+
+
+def test_reissue_in_same_second_as_revoke_is_accepted(issuer, frozen_time):
+    cache = TokenCache(issuer.verify)
+    cache.verify(issuer.issue('student-1'))
+    cache.revoke('student-1')
+    token = issuer.issue('student-1')
+    assert cache.verify(token)['iat'] == int(frozen_time)
+
+
+def test_revoke_only_affects_that_user(issuer, frozen_time):
+    cache = TokenCache(issuer.verify)
+    other = issuer.issue('student-2', iat=int(frozen_time) - 10)
+    cache.verify(other)
+    cache.revoke('student-1')
+    assert cache.verify(other)['uid'] == 'student-2'
@@ -17,25 +17,41 @@ import numpy as np
 import cv2
 import torch
 from PIL import Image
-from datetime import datetime
+from datetime import datetime, timezone, timedelta
+import io
+import hashlib
 import tempfile
+import time
+import threading
 import traceback
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 
 # Firebase Admin
 from firebase_admin import auth as firebase_auth
 from firebase.firebase_service import (
     initialize_firebase,
     create_user,
-    add_student,
-    save_embedding,
-    get_all_embeddings,
-    get_student_by_uid,
-    log_attendance,
-    check_roll_no_exists,
-    get_student_attendance
+    presence_map,
+    find_registered_emails,
+    import_users,
+    delete_users,
+    encode_page_token,
+    decode_page_token,
+    STUDENT_LIST_FIELDS
 )
-from scripts.utils import batch_cosine_similarity, normalize_embedding
-from scripts.email_service import notify_absent_students_async
+from firebase.student_replica import StudentReplica, DirectStudentStore
+from firebase.token_cache import TokenCache, LocalTokenIssuer
+from storage.base import create_storage
+from storage.attendance_journal import AttendanceJournal
+from scripts.utils import normalize_embedding
+from scripts.email_service import notify_absent_students_async, get_outbox
+from scripts.gallery import EmbeddingGallery, compact_templates
+from scripts.search_index import StudentSearchIndex
+from scripts.session_encoding import SessionSet, SESSION_FIELDS, is_encoded, decode_entries
+from scripts.roster_import import parse_roster, BulkEnrollJob
+from scripts.pipeline import Stage, StagedPipeline
+from scripts.result_cache import ResultCache, IdempotencyConflict
 
 FRONTEND_DIR = os.path.join(os.path.dirname(__file__), '..', 'frontend')
 
@@ -43,11 +59,79 @@ app = Flask(__name__, static_folder=FRONTEND_DIR, static_url_path='')
 CORS(app)
 
 # ─── Global state (models loaded once at startup) ─────────────────────────────
-db = None
+storage = None  # Storage backend (storage/base.py), picked by STORAGE_BACKEND
 yolo_model = None
 retinaface_model = None
 adaface_model = None
 device = None
+gallery = None  # EmbeddingGallery, loaded lazily on first use
+_gallery_lock = threading.Lock()
+student_store = None  # StudentReplica, loaded lazily on first use
+_student_store_lock = threading.Lock()
+search_index = None  # StudentSearchIndex, built lazily from the student store
+_search_index_lock = threading.Lock()
+token_cache = None  # TokenCache of verified ID tokens, created on first request
+_token_cache_lock = threading.Lock()
+attendance_journal = None  # AttendanceJournal when ATTENDANCE_WRITE_BEHIND=1
+_attendance_journal_lock = threading.Lock()
+marking_pipeline = None  # StagedPipeline for /api/attendance/mark, started on first use
+_marking_pipeline_lock = threading.Lock()
+_template_update_lock = threading.Lock()  # fold -> save -> apply, one update at a time
+
+# AUTH_TEST_MODE=1 verifies tokens signed by a local key instead of Firebase
+# (issue them with scripts/issue_test_token.py)
+AUTH_TEST_MODE = os.getenv('AUTH_TEST_MODE', '') == '1'
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', '10000'))
+
+# Write-behind attendance logging: sessions are committed to a local journal
+# and flushed to storage in the background
+ATTENDANCE_WRITE_BEHIND = os.getenv('ATTENDANCE_WRITE_BEHIND', '') == '1'
+ATTENDANCE_JOURNAL_PATH = os.getenv('ATTENDANCE_JOURNAL_PATH', 'local_cache/attendance_journal.db')
+ATTENDANCE_JOURNAL_BATCH = int(os.getenv('ATTENDANCE_JOURNAL_BATCH', '50'))
+
+# Optional reduced-dimension matching (0 = brute-force 512-dim cosine)
+MATCH_REDUCED_DIM = int(os.getenv('MATCH_REDUCED_DIM', '0'))
+MATCH_SHORTLIST_K = int(os.getenv('MATCH_SHORTLIST_K', '10'))
+MATCH_CHUNK_SIZE = int(os.getenv('MATCH_CHUNK_SIZE', '4096'))
+# Seconds between polls for templates saved by other backend instances (0 = off)
+GALLERY_SYNC_INTERVAL = float(os.getenv('GALLERY_SYNC_INTERVAL', '30'))
+
+# A face is matched to its best student at or above this cosine score
+MATCH_THRESHOLD = float(os.getenv('MATCH_THRESHOLD', '0.4'))
+
+# Matches at or above this score are folded into the student's templates (> 1 disables),
+# if they beat the next-best student by TEMPLATE_UPDATE_MARGIN; TEMPLATE_AUTO_UPDATE=0 turns it off
+TEMPLATE_AUTO_UPDATE = os.getenv('TEMPLATE_AUTO_UPDATE', '1') == '1'
+TEMPLATE_UPDATE_THRESHOLD = float(os.getenv('TEMPLATE_UPDATE_THRESHOLD', '0.8'))
+TEMPLATE_UPDATE_MARGIN = float(os.getenv('TEMPLATE_UPDATE_MARGIN', '0.1'))
+
+# Request-side reads (gallery, roster) that overlap with model inference
+REQUEST_IO_WORKERS = int(os.getenv('REQUEST_IO_WORKERS', '4'))
+request_io_pool = ThreadPoolExecutor(max_workers=REQUEST_IO_WORKERS, thread_name_prefix='request-io')
+
+# Attendance-marking pipeline: workers per stage (override with
+# MARK_PIPELINE_WORKERS=detect=1,persist=4,...) and queue size between stages
+MARK_PIPELINE_WORKERS = {'ingest': 2, 'detect': 1, 'align': 1, 'embed': 1, 'match': 2, 'persist': 4}
+MARK_PIPELINE_QUEUE = int(os.getenv('MARK_PIPELINE_QUEUE', '8'))
+# Faces per AdaFace forward pass when marking (separate from BULK_EMBED_BATCH,
+# so enrollment throughput tuning doesn't change marking latency and memory)
+MARK_EMBED_BATCH = int(os.getenv('MARK_EMBED_BATCH', '16'))
+
+# A re-uploaded photo for the same date/subject/class gets the earlier result
+# back for this long (with or without an Idempotency-Key), instead of another
+# pipeline run and a duplicate attendance log
+MARK_RESULT_TTL = float(os.getenv('MARK_RESULT_TTL', '600'))
+mark_results = ResultCache(max_entries=int(os.getenv('MARK_RESULT_CACHE_SIZE', '64')), ttl=MARK_RESULT_TTL)
+
+VALID_BRANCHES = ['CS', 'CS-AIML', 'CS-DS', 'CS-D', 'CS-CY', 'EC', 'EEE', 'CE', 'ME']
+
+# Bulk enrollment: photos run through detection + embedding this many at a time
+BULK_EMBED_BATCH = int(os.getenv('BULK_EMBED_BATCH', '32'))
+# Jobs live in this process only (poll the worker that accepted the upload)
+# and are forgotten BULK_JOB_TTL seconds after they finish
+BULK_JOB_TTL = float(os.getenv('BULK_JOB_TTL', '3600'))
+bulk_jobs = {}  # job_id -> BulkEnrollJob
+_bulk_jobs_lock = threading.Lock()
 
 def _download_hf_model(repo_id, save_path, HF_TOKEN=None):
     """
@@ -140,10 +224,113 @@ def load_models():
 
     print("[OK] All models loaded!")
 
+def get_student_store():
+    """
+    Return the in-process replica of the students collection, starting it once.
+    A snapshot listener keeps it current across backend instances.
+    """
+    global student_store
+    if student_store is None:
+        with _student_store_lock:
+            if student_store is None:
+                if os.getenv('STUDENT_REPLICA_MODE') == 'off':
+                    store = DirectStudentStore(storage)
+                else:
+                    store = StudentReplica(storage)
+                store.subscribe(_on_student_changed)
+                student_store = store.start()
+    return student_store
+
+def get_attendance_journal():
+    """Return the write-behind attendance journal (started once), or None when disabled."""
+    global attendance_journal
+    if ATTENDANCE_WRITE_BEHIND and attendance_journal is None:
+        with _attendance_journal_lock:
+            if attendance_journal is None:
+                path = ATTENDANCE_JOURNAL_PATH
+                if not os.path.isabs(path):
+                    path = os.path.join(os.path.dirname(__file__), '..', '..', path)
+                attendance_journal = AttendanceJournal(
+                    os.path.normpath(path), storage, batch_size=ATTENDANCE_JOURNAL_BATCH).start()
+    return attendance_journal
+
+def get_search_index():
+    """Return the student search index, building it from the student store once."""
+    global search_index
+    if search_index is None:
+        with _search_index_lock:
+            if search_index is None:
+                index = StudentSearchIndex()
+                index.build(get_student_store().snapshot())
+                search_index = index
+    return search_index
+
+def _on_student_changed(uid, profile):
+    """Keep the gallery and search index in step with student changes seen by the store."""
+    if search_index is not None:
+        search_index.upsert(uid, profile)
+    if gallery is None:
+        return
+    if profile is None:
+        gallery.remove(uid)
+    else:
+        gallery.move(uid, branch=profile.get('branch', '') or '', sem=profile.get('sem'))
+
+def get_gallery():
+    """
+    Return the in-memory embedding gallery, loading it from storage once.
+    Enroll/delete keep it current, so marking requests never re-read embeddings.
+    """
+    global gallery
+    if gallery is None:
+        with _gallery_lock:
+            if gallery is None:
+                loaded_at = datetime.now(timezone.utc)
+                gallery = EmbeddingGallery.from_firestore(
+                    storage.get_all_templates(), get_student_store().snapshot(),
+                    reduced_dim=MATCH_REDUCED_DIM, shortlist_k=MATCH_SHORTLIST_K,
+                    chunk_size=MATCH_CHUNK_SIZE)
+                if GALLERY_SYNC_INTERVAL > 0:
+                    threading.Thread(target=_sync_gallery, args=(gallery, loaded_at),
+                                     name='gallery-sync', daemon=True).start()
+    return gallery
+
+def _sync_gallery(enrolled, since):
+    """
+    Poll storage for template sets saved since the last poll (enrollments and
+    folded samples from other backend instances) and merge them into the
+    gallery; sets this instance already has are skipped by their `seen` count.
+    """
+    # Overlap the polls a little to cover clock skew and commits that land late
+    overlap = timedelta(seconds=max(GALLERY_SYNC_INTERVAL, 60))
+    while True:
+        time.sleep(GALLERY_SYNC_INTERVAL)
+        started = datetime.now(timezone.utc)
+        try:
+            changed = storage.get_templates_since(since - overlap)
+            if changed:
+                merged = enrolled.merge_templates(changed, get_student_store().get_many(list(changed)))
+                if merged:
+                    print(f"✅ Gallery sync: {merged} student(s) updated from storage")
+            since = started
+        except Exception as e:
+            print(f"⚠️  Gallery sync failed: {e}")
+
 # ─── Auth Middleware ───────────────────────────────────────────────────────────
+def get_token_cache():
+    """Return the verified-token cache, creating it (and its verifier) once."""
+    global token_cache
+    if token_cache is None:
+        with _token_cache_lock:
+            if token_cache is None:
+                verifier = LocalTokenIssuer.from_env().verify if AUTH_TEST_MODE else firebase_auth.verify_id_token
+                token_cache = TokenCache(verifier, max_entries=TOKEN_CACHE_SIZE)
+    return token_cache
+
 def verify_token(req):
     """
     Verify Firebase ID token from Authorization header.
+    Decoded tokens are cached until they expire.
     Returns (uid, role) or raises an exception.
     """
     auth_header = req.headers.get('Authorization', '')
@@ -151,7 +338,7 @@ def verify_token(req):
         raise PermissionError("Missing Authorization header")
 
     id_token = auth_header.split('Bearer ')[1]
-    decoded = firebase_auth.verify_id_token(id_token)
+    decoded = get_token_cache().verify(id_token)
     uid = decoded['uid']
     role = decoded.get('role', 'student')
     return uid, role
@@ -163,10 +350,8 @@ def require_admin(req):
     return uid
 
 # ─── Helper: Process face from image ──────────────────────────────────────────
-def process_face(image_np_bgr):
-    """
-    Given a BGR numpy image of a face region, returns normalized 512-dim embedding.
-    """
+def _align_face(image_np_bgr):
+    """RetinaFace-aligned 112x112 face tensor of shape (1, 3, 112, 112)."""
     # Convert BGR to RGB
     image_rgb = cv2.cvtColor(image_np_bgr, cv2.COLOR_BGR2RGB)
     
@@ -175,16 +360,81 @@ def process_face(image_np_bgr):
     image_tensor = (image_tensor - 0.5) / 0.5
     image_tensor = image_tensor.unsqueeze(0).to(device)
     
+    # RetinaFace returns tuple: (aligned_x, orig_ldmks, aligned_ldmks, score, thetas, bbox)
+    aligned_output = retinaface_model(image_tensor)
+    return aligned_output[0] if isinstance(aligned_output, tuple) else aligned_output
+
+def process_face(image_np_bgr):
+    """
+    Given a BGR numpy image of a face region, returns normalized 512-dim embedding.
+    """
     with torch.no_grad():
-        # RetinaFace returns tuple: (aligned_x, orig_ldmks, aligned_ldmks, score, thetas, bbox)
-        aligned_output = retinaface_model(image_tensor)
-        aligned_face = aligned_output[0] if isinstance(aligned_output, tuple) else aligned_output
-        
         # AdaFace expects 112x112 face tensor
-        embedding = adaface_model(aligned_face)
+        embedding = adaface_model(_align_face(image_np_bgr))
     emb = embedding.cpu().numpy().flatten()
     return normalize_embedding(emb)
 
+def process_faces(faces_bgr, batch_size=32):
+    """
+    Embed many face crops. Crops differ in size, so alignment runs per face;
+    the aligned 112x112 faces are then embedded by AdaFace in batches.
+
+    Returns:
+        list: Normalized 512-dim embeddings, one per face (None if alignment failed)
+    """
+    embeddings = [None] * len(faces_bgr)
+    with torch.no_grad():
+        for start in range(0, len(faces_bgr), batch_size):
+            aligned, positions = [], []
+            for i in range(start, min(start + batch_size, len(faces_bgr))):
+                try:
+                    aligned.append(_align_face(faces_bgr[i]))
+                    positions.append(i)
+                except Exception:
+                    continue
+            if not aligned:
+                continue
+            batch = adaface_model(torch.cat(aligned)).cpu().numpy().reshape(len(aligned), -1)
+            for i, emb in zip(positions, batch):
+                embeddings[i] = normalize_embedding(emb)
+    return embeddings
+
+def embed_enrollment_photos(photos):
+    """
+    Detect the main face in each uploaded enrollment photo and embed it.
+    Photos without a detectable face are skipped.
+
+    Returns:
+        list: Normalized 512-dim embeddings, one per usable photo
+    """
+    embeddings = []
+    for photo in photos:
+        # Save photo to temp file
+        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp:
+            photo.save(tmp.name)
+            tmp_path = tmp.name
+
+        # Load image
+        image = Image.open(tmp_path).convert('RGB')
+        image_np = np.array(image)
+
+        # Detect face with YOLOv8
+        results = yolo_model.predict(source=tmp_path, conf=0.4, verbose=False)
+        os.unlink(tmp_path)
+
+        if len(results[0].boxes) == 0:
+            continue
+
+        # Crop face
+        box = results[0].boxes[0].xyxy[0].cpu().numpy()
+        x1, y1, x2, y2 = map(int, box)
+        face_crop = image_np[y1:y2, x1:x2]
+        face_bgr = cv2.cvtColor(face_crop, cv2.COLOR_RGB2BGR)
+
+        # Generate embedding
+        embeddings.append(process_face(face_bgr))
+    return embeddings
+
 # ─── Routes ───────────────────────────────────────────────────────────────────
 
 # ─── Serve Frontend ────────────────────────────────────────────────────────────
@@ -194,7 +444,15 @@ def serve_index():
 
 @app.route('/api/health', methods=['GET'])
 def health():
-    return jsonify({'status': 'ok', 'models_loaded': yolo_model is not None})
+    outbox = get_outbox()
+    return jsonify({
+        'status': 'ok',
+        'models_loaded': yolo_model is not None,
+        'reduced_matching_recall': gallery.reduced_recall if gallery is not None else None,
+        'attendance_journal': attendance_journal.backlog() if attendance_journal is not None else None,
+        'mark_pipeline': marking_pipeline.stats() if marking_pipeline is not None else None,
+        'email_outbox': outbox.backlog() if outbox is not None else None
+    })
 
 
 # ---------- AUTH ----------
@@ -209,34 +467,113 @@ def get_role():
         return jsonify({'error': str(e)}), 401
 
 
+@app.route('/api/auth/revoke', methods=['POST'])
+def revoke_sessions():
+    """
+    Sign a user out everywhere. Admin only.
+    Expects JSON: uid. Revokes their refresh tokens and rejects every ID
+    token issued so far, cached or not.
+    """
+    try:
+        require_admin(request)
+    except PermissionError as e:
+        return jsonify({'error': str(e)}), 403
+
+    try:
+        uid = ((request.get_json(silent=True) or {}).get('uid') or '').strip()
+        if not uid:
+            return jsonify({'error': 'uid is required'}), 400
+        if not AUTH_TEST_MODE:
+            firebase_auth.revoke_refresh_tokens(uid)
+        get_token_cache().revoke(uid)
+        return jsonify({'message': 'Sessions revoked', 'uid': uid})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 # ---------- STUDENTS ----------
 
 @app.route('/api/students', methods=['GET'])
 def get_students():
-    """Get all enrolled students. Admin only. Optional ?branch= filter."""
+    """
+    One page of enrolled students. Admin only.
+    Query params: branch, sem, sort (name|roll_no|branch|sem),
+    limit (default 50, max 200), page_token (from the previous page).
+    """
+    try:
+        require_admin(request)
+    except PermissionError as e:
+        return jsonify({'error': str(e)}), 403
+
+    try:
+        branch_filter = request.args.get('branch', '').strip()
+        sem_filter = request.args.get('sem', '').strip()
+        sort_by = request.args.get('sort', 'name').strip()
+        limit = min(max(int(request.args.get('limit', 50)), 1), 200)
+        page_token = request.args.get('page_token', '').strip() or None
+        students, next_token = get_student_store().page(
+            branch=branch_filter, sem=int(sem_filter) if sem_filter else None,
+            sort_by=sort_by, limit=limit, page_token=page_token)
+        return jsonify({'students': students, 'next_page_token': next_token})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/students/search', methods=['GET'])
+def search_students():
+    """
+    Search students by name or roll number (prefix or substring). Admin only.
+    Query params: q, branch, sem, limit (default 20, max 100), page_token.
+    """
     try:
         require_admin(request)
     except PermissionError as e:
         return jsonify({'error': str(e)}), 403
 
     try:
+        query = request.args.get('q', '').strip()
         branch_filter = request.args.get('branch', '').strip()
         sem_filter = request.args.get('sem', '').strip()
-        query = db.collection('students')
-        if branch_filter:
-            query = query.where('branch', '==', branch_filter)
-        if sem_filter:
-            query = query.where('sem', '==', int(sem_filter))
-        docs = query.stream()
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+        page_token = request.args.get('page_token', '').strip()
+        offset = 0
+        if page_token:
+            offset, token_query = decode_page_token(page_token)
+            if token_query != query or not isinstance(offset, int) or offset < 0:
+                raise ValueError("Page token does not match this query")
+
+        results, total = get_search_index().search(
+            query, branch=branch_filter, sem=int(sem_filter) if sem_filter else None,
+            offset=offset, limit=limit)
         students = []
-        for doc in docs:
-            data = doc.to_dict()
-            data['uid'] = doc.id
-            data.pop('password', None)
-            if 'enrolled_at' in data and data['enrolled_at']:
-                data['enrolled_at'] = str(data['enrolled_at'])
-            students.append(data)
-        return jsonify({'students': students})
+        for uid, data in results:
+            item = {field: data.get(field) for field in STUDENT_LIST_FIELDS}
+            item['uid'] = uid
+            students.append(item)
+
+        next_token = encode_page_token(offset + limit, query) if offset + limit < total else None
+        return jsonify({'students': students, 'total': total, 'next_page_token': next_token})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/students/counts', methods=['GET'])
+def get_student_counts():
+    """Student counts per branch and semester. Admin only."""
+    try:
+        require_admin(request)
+    except PermissionError as e:
+        return jsonify({'error': str(e)}), 403
+
+    try:
+        counts = get_student_store().count_by_class()
+        # JSON object keys must be strings
+        return jsonify({'counts': {branch: {str(sem): n for sem, n in sems.items()}
+                                   for branch, sems in counts.items()}})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -247,7 +584,7 @@ def enroll_student():
     Enroll a new student.
     Expects multipart/form-data:
       - name, roll_no, email, password (text fields)
-      - photo (file)
+      - photo (file, may be repeated - each usable photo becomes a template)
     """
     try:
         require_admin(request)
@@ -261,14 +598,13 @@ def enroll_student():
         sem_raw = request.form.get('sem', '').strip()
         email = request.form.get('email', '').strip()
         password = request.form.get('password', '').strip()
-        photo = request.files.get('photo')
+        photos = request.files.getlist('photo')
 
         # Validate
-        if not all([name, roll_no, branch, sem_raw, email, password, photo]):
+        if not all([name, roll_no, branch, sem_raw, email, password, photos]):
             return jsonify({'error': 'All fields (name, roll_no, branch, sem, email, password, photo) are required'}), 400
-        valid_branches = ['CS','CS-AIML','CS-DS','CS-D','CS-CY','EC','EEE','CE','ME']
-        if branch not in valid_branches:
-            return jsonify({'error': 'Invalid branch. Must be one of: ' + ', '.join(valid_branches)}), 400
+        if branch not in VALID_BRANCHES:
+            return jsonify({'error': 'Invalid branch. Must be one of: ' + ', '.join(VALID_BRANCHES)}), 400
         try:
             sem = int(sem_raw)
             if sem < 1 or sem > 7:
@@ -277,33 +613,14 @@ def enroll_student():
             return jsonify({'error': 'Invalid semester. Must be 1–7.'}), 400
         if len(password) < 6:
             return jsonify({'error': 'Password must be at least 6 characters'}), 400
-        if check_roll_no_exists(db, roll_no):
+        if get_student_store().roll_no_exists(roll_no):
             return jsonify({'error': f'Roll number {roll_no} already exists'}), 409
 
-        # Save photo to temp file
-        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp:
-            photo.save(tmp.name)
-            tmp_path = tmp.name
-
-        # Load image
-        image = Image.open(tmp_path).convert('RGB')
-        image_np = np.array(image)
-
-        # Detect face with YOLOv8
-        results = yolo_model.predict(source=tmp_path, conf=0.4, verbose=False)
-        os.unlink(tmp_path)
-
-        if len(results[0].boxes) == 0:
+        # Generate one embedding per usable photo
+        embeddings = embed_enrollment_photos(photos)
+        if not embeddings:
             return jsonify({'error': 'No face detected in photo. Please use a clear front-facing photo.'}), 400
-
-        # Crop face
-        box = results[0].boxes[0].xyxy[0].cpu().numpy()
-        x1, y1, x2, y2 = map(int, box)
-        face_crop = image_np[y1:y2, x1:x2]
-        face_bgr = cv2.cvtColor(face_crop, cv2.COLOR_RGB2BGR)
-
-        # Generate embedding
-        embedding = process_face(face_bgr)
+        templates = compact_templates(None, np.array(embeddings))
 
         # Create Firebase Auth user
         user = create_user(email, password, name, role='student')
@@ -312,9 +629,13 @@ def enroll_student():
 
         student_uid = user['uid']
 
-        # Save to Firestore
-        add_student(db, student_uid, roll_no, name, email, branch=branch, sem=sem)
-        save_embedding(db, student_uid, embedding)
+        # Save profile + templates
+        storage.add_student(student_uid, roll_no, name, email, branch=branch, sem=sem)
+        get_student_store().upsert(student_uid, {
+            'roll_no': roll_no, 'name': name, 'email': email, 'branch': branch, 'sem': sem
+        })
+        storage.save_templates(student_uid, templates.centroid, templates.medoids, templates.seen)
+        get_gallery().add(student_uid, templates, branch=branch, sem=sem)
 
         return jsonify({
             'message': f'Student {name} enrolled successfully!',
@@ -323,7 +644,8 @@ def enroll_student():
             'name': name,
             'email': email,
             'branch': branch,
-            'sem': sem
+            'sem': sem,
+            'templates_used': len(embeddings)
         }), 201
 
     except Exception as e:
@@ -331,34 +653,177 @@ def enroll_student():
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/students/<uid>', methods=['DELETE'])
-def delete_student(uid):
-    """Delete a student. Admin only."""
+@app.route('/api/students/<uid>/templates', methods=['POST'])
+def add_student_templates(uid):
+    """
+    Add more face photos to an enrolled student. Admin only.
+    Expects multipart/form-data with one or more 'photo' files.
+    """
     try:
         require_admin(request)
     except PermissionError as e:
         return jsonify({'error': str(e)}), 403
 
     try:
-        # Delete from Auth
-        firebase_auth.delete_user(uid)
-        # Delete from Firestore
-        db.collection('students').document(uid).delete()
-        db.collection('embeddings').document(uid).delete()
-        return jsonify({'message': 'Student deleted successfully'})
+        photos = request.files.getlist('photo')
+        if not photos:
+            return jsonify({'error': 'No photo provided'}), 400
+        if get_gallery().partition_of(uid) is None:
+            return jsonify({'error': 'Student not found'}), 404
+
+        embeddings = embed_enrollment_photos(photos)
+        if not embeddings:
+            return jsonify({'error': 'No face detected in photo. Please use a clear front-facing photo.'}), 400
+
+        templates = _update_templates(get_gallery(), {uid: np.array(embeddings)}).get(uid)
+        if templates is None:
+            return jsonify({'error': 'Student not found'}), 404
+        return jsonify({
+            'message': f'{len(embeddings)} photo(s) added',
+            'uid': uid,
+            'templates': len(templates.medoids) + 1,
+            'samples_seen': templates.seen
+        })
     except Exception as e:
+        traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
 
-# ---------- ATTENDANCE ----------
+# ─── Bulk enrollment ──────────────────────────────────────────────────────────
+def _embed_roster_rows(rows, archive, job):
+    """
+    Detect and embed every roster photo in batches of BULK_EMBED_BATCH.
 
-@app.route('/api/attendance/mark', methods=['POST'])
-def mark_attendance():
+    Returns:
+        dict: {row number: TemplateSet} for rows with at least one usable face
     """
-    Mark attendance from a group photo.
+    photos = [(row, entry) for row in rows for entry in row.photos]
+    job.update(photos_total=len(photos), photos_done=0)
+    by_row = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for start in range(0, len(photos), BULK_EMBED_BATCH):
+            chunk = photos[start:start + BULK_EMBED_BATCH]
+            paths, images = [], []
+            for i, (row, entry) in enumerate(chunk):
+                path = os.path.join(tmp_dir, f'{start + i}.jpg')
+                try:
+                    image = Image.open(io.BytesIO(archive.read(entry))).convert('RGB')
+                except Exception:
+                    image = None
+                if image is not None:
+                    image.save(path)
+                paths.append(path if image is not None else None)
+                images.append(np.array(image) if image is not None else None)
+
+            # Detect the main face in every readable photo of the chunk in one call
+            readable = [i for i, path in enumerate(paths) if path]
+            results = yolo_model.predict(source=[paths[i] for i in readable], conf=0.4, verbose=False) if readable else []
+            crops, owners = [], []
+            for i, result in zip(readable, results):
+                if len(result.boxes) == 0:
+                    continue
+                x1, y1, x2, y2 = map(int, result.boxes[0].xyxy[0].cpu().numpy())
+                face_crop = images[i][y1:y2, x1:x2]
+                if face_crop.size == 0:
+                    continue
+                crops.append(cv2.cvtColor(face_crop, cv2.COLOR_RGB2BGR))
+                owners.append(chunk[i][0].row)
+            for path in paths:
+                if path:
+                    os.unlink(path)
+
+            for owner, emb in zip(owners, process_faces(crops, batch_size=BULK_EMBED_BATCH)):
+                if emb is not None:
+                    by_row.setdefault(owner, []).append(emb)
+
+            job.update(photos_done=start + len(chunk))
+
+    return {row_no: compact_templates(None, np.array(embs)) for row_no, embs in by_row.items()}
+
+def run_bulk_enrollment(job, rows, archive):
+    """
+    Enroll validated roster rows: batched embedding, auth.import_users in
+    chunks of 1000, then students + embeddings saved through
+    storage.enroll_students (2 writes per student, storage.write_batch_size
+    writes per commit).
+    Progress and per-row errors are recorded on `job`.
+    """
+    try:
+        store = get_student_store()
+        pending = []
+        for row in rows:
+            if store.roll_no_exists(row.roll_no):
+                job.add_error(row.row, row.roll_no, f'Roll number {row.roll_no} already exists')
+            else:
+                pending.append(row)
+
+        registered = find_registered_emails([row.email for row in pending])
+        for row in [r for r in pending if r.email in registered]:
+            job.add_error(row.row, row.roll_no, f'Email {row.email} is already registered')
+        pending = [r for r in pending if r.email not in registered]
+
+        job.update(phase='embedding')
+        templates = _embed_roster_rows(pending, archive, job)
+        for row in [r for r in pending if r.row not in templates]:
+            job.add_error(row.row, row.roll_no, 'No face detected in photo. Please use a clear front-facing photo.')
+        pending = [r for r in pending if r.row in templates]
+
+        job.update(phase='creating accounts')
+        users = [{'uid': storage.new_student_id(), 'email': row.email,
+                  'password': row.password, 'display_name': row.name} for row in pending]
+        failed = import_users(users, role='student')
+        for index, reason in failed.items():
+            job.add_error(pending[index].row, pending[index].roll_no, f'Account creation failed: {reason}')
+        created = [(row, user['uid']) for i, (row, user) in enumerate(zip(pending, users)) if i not in failed]
+
+        job.update(phase='saving')
+        per_batch = storage.write_batch_size // 2
+        saved = {}
+        try:
+            for start in range(0, len(created), per_batch):
+                chunk = created[start:start + per_batch]
+                storage.enroll_students([
+                    (uid, {'roll_no': row.roll_no, 'name': row.name, 'email': row.email,
+                           'branch': row.branch, 'sem': row.sem}, templates[row.row])
+                    for row, uid in chunk
+                ])
+                for row, uid in chunk:
+                    saved[uid] = row
+                job.advance(enrolled=len(chunk))
+                print(f"  … {job.enrolled}/{len(created)} students saved")
+        finally:
+            # One gallery update for the whole batch, then the roster/search index
+            get_gallery().apply_changes(upserts={
+                uid: (templates[row.row], row.branch, row.sem) for uid, row in saved.items()})
+            for uid, row in saved.items():
+                store.upsert(uid, {'roll_no': row.roll_no, 'name': row.name, 'email': row.email,
+                                   'branch': row.branch, 'sem': row.sem})
+
+        job.finish('done')
+        print(f"✅ Bulk enrollment {job.id}: {job.enrolled} enrolled, {len(job.errors)} failed")
+    except Exception as e:
+        traceback.print_exc()
+        job.add_error(0, '', f'Bulk enrollment aborted: {e}')
+        job.finish('failed')
+
+def _prune_bulk_jobs():
+    """Forget jobs that finished more than BULK_JOB_TTL seconds ago. Caller holds _bulk_jobs_lock."""
+    cutoff = time.time() - BULK_JOB_TTL
+    for job_id in [job_id for job_id, job in bulk_jobs.items()
+                   if job.finished_at is not None and job.finished_at < cutoff]:
+        del bulk_jobs[job_id]
+
+@app.route('/api/students/bulk', methods=['POST'])
+def bulk_enroll_students():
+    """
+    Enroll a batch of students. Admin only.
     Expects multipart/form-data:
-      - photo (file)
-      - date (optional, defaults to today)
+      - roster (CSV: name, roll_no, branch, sem, email, password[, photo])
+      - photos (zip; photos named <roll_no>.jpg, in <roll_no>/ folders,
+                or listed in the CSV photo column separated by ';')
+    Runs in the background; poll GET /api/students/bulk/<job_id> for progress.
+    The job is tracked by this backend process only, until BULK_JOB_TTL
+    seconds after it finishes.
     """
     try:
         require_admin(request)
@@ -366,145 +831,399 @@ def mark_attendance():
         return jsonify({'error': str(e)}), 403
 
     try:
-        photo = request.files.get('photo')
-        date = request.form.get('date', datetime.now().strftime('%Y-%m-%d'))
-        branch_filter = request.form.get('branch', '').strip()
-        sem_filter = request.form.get('sem', '').strip()
-        subject = request.form.get('subject', '').strip()
+        roster = request.files.get('roster')
+        photos = request.files.get('photos')
+        if not roster or not photos:
+            return jsonify({'error': 'Both roster (CSV) and photos (zip) files are required'}), 400
+        try:
+            archive = zipfile.ZipFile(io.BytesIO(photos.read()))
+        except zipfile.BadZipFile:
+            return jsonify({'error': 'photos must be a zip archive'}), 400
+
+        rows, errors = parse_roster(roster.read(), archive, VALID_BRANCHES)
+        job = BulkEnrollJob(total=len(rows) + len(errors))
+        for error in errors:
+            job.add_error(error['row'], error['roll_no'], error['error'])
+        with _bulk_jobs_lock:
+            _prune_bulk_jobs()
+            bulk_jobs[job.id] = job
+        threading.Thread(target=run_bulk_enrollment, args=(job, rows, archive), daemon=True).start()
+        return jsonify(job.to_dict()), 202
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
 
-        if not subject:
-            return jsonify({'error': 'Subject is required to mark attendance'}), 400
 
-        if not photo:
-            return jsonify({'error': 'No photo provided'}), 400
+@app.route('/api/students/bulk/<job_id>', methods=['GET'])
+def get_bulk_enrollment(job_id):
+    """Progress and per-row errors of a bulk enrollment job. Admin only."""
+    try:
+        require_admin(request)
+    except PermissionError as e:
+        return jsonify({'error': str(e)}), 403
 
-        # Save to temp file
-        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp:
-            photo.save(tmp.name)
-            tmp_path = tmp.name
+    with _bulk_jobs_lock:
+        _prune_bulk_jobs()
+        job = bulk_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.to_dict())
 
-        # Load image
-        image = Image.open(tmp_path).convert('RGB')
-        image_np = np.array(image)
 
-        # Detect all faces
-        results = yolo_model.predict(source=tmp_path, conf=0.4, verbose=False)
-        os.unlink(tmp_path)
+# ─── Cohort operations ────────────────────────────────────────────────────────
+COHORT_ACTIONS = ('promote', 'graduate', 'purge')
+
+@app.route('/api/students/cohort', methods=['POST'])
+def cohort_operation():
+    """
+    Apply a term-rollover operation to every student of a branch/sem. Admin only.
+    Expects JSON:
+      - action: 'promote' (sem -> to_sem, default sem + 1),
+                'graduate' (profile archived to 'alumni', login and face data removed),
+                'purge' (student deleted entirely)
+      - sem (required), branch (optional - all branches if omitted)
+      - to_sem (promote only), dry_run (optional - only report who would be affected)
+    """
+    try:
+        require_admin(request)
+    except PermissionError as e:
+        return jsonify({'error': str(e)}), 403
 
-        boxes = results[0].boxes.xyxy.cpu().numpy()
+    try:
+        body = request.get_json(silent=True) or {}
+        action = body.get('action', '')
+        branch = (body.get('branch') or '').strip()
+        if action not in COHORT_ACTIONS:
+            return jsonify({'error': 'action must be one of: ' + ', '.join(COHORT_ACTIONS)}), 400
+        if branch and branch not in VALID_BRANCHES:
+            return jsonify({'error': 'Invalid branch. Must be one of: ' + ', '.join(VALID_BRANCHES)}), 400
+        try:
+            sem = int(body.get('sem'))
+            to_sem = int(body.get('to_sem') or sem + 1)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'sem (and to_sem) must be integers'}), 400
+        if action == 'promote' and not (1 <= to_sem <= 7 and to_sem != sem):
+            return jsonify({'error': 'Cannot promote beyond sem 7 - graduate the cohort instead'}), 400
+
+        store = get_student_store()
+        cohort = dict(store.list(branch, sem))
+        result = {'action': action, 'branch': branch, 'sem': sem, 'matched': len(cohort)}
+        if body.get('dry_run') or not cohort:
+            return jsonify({**result, 'dry_run': bool(body.get('dry_run')), 'affected': 0})
+
+        if action == 'promote':
+            storage.promote_students(list(cohort), to_sem)
+            get_gallery().apply_changes(upserts={
+                uid: (None, profile.get('branch', ''), to_sem) for uid, profile in cohort.items()})
+            for uid, profile in cohort.items():
+                store.upsert(uid, {**profile, 'sem': to_sem})
+            return jsonify({**result, 'to_sem': to_sem, 'affected': len(cohort)})
+
+        # graduate / purge: Auth accounts first, so nobody keeps a login without a profile
+        failed = delete_users(list(cohort))
+        removed = {uid: profile for uid, profile in cohort.items() if uid not in failed}
+        storage.remove_students(removed, archive=(action == 'graduate'))
+        get_gallery().apply_changes(removals=list(removed))
+        for uid in removed:
+            store.remove(uid)
+            get_token_cache().revoke(uid)
+        return jsonify({
+            **result,
+            'affected': len(removed),
+            'errors': [{'uid': uid, 'roll_no': cohort[uid].get('roll_no'), 'error': reason}
+                       for uid, reason in failed.items()]
+        })
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
 
-        if len(boxes) == 0:
-            return jsonify({'error': 'No faces detected in the photo'}), 400
 
-        # Get all enrolled embeddings
-        enrolled_embeddings = get_all_embeddings(db)
-        if len(enrolled_embeddings) == 0:
-            return jsonify({'error': 'No students enrolled yet'}), 400
+@app.route('/api/students/<uid>', methods=['DELETE'])
+def delete_student(uid):
+    """Delete a student. Admin only."""
+    try:
+        require_admin(request)
+    except PermissionError as e:
+        return jsonify({'error': str(e)}), 403
 
-        # Filter by branch if requested
-        if branch_filter:
-            branch_docs = db.collection('students').where('branch', '==', branch_filter).stream()
-            branch_uids = {doc.id for doc in branch_docs}
-            enrolled_embeddings = {uid: emb for uid, emb in enrolled_embeddings.items() if uid in branch_uids}
+    try:
+        # Delete from Auth
+        firebase_auth.delete_user(uid)
+        get_token_cache().revoke(uid)
+        # Delete profile + embeddings
+        storage.delete_student(uid)
+        get_gallery().remove(uid)
+        get_student_store().remove(uid)
+        return jsonify({'message': 'Student deleted successfully'})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        # Filter by semester if requested
-        if sem_filter:
-            sem_docs = db.collection('students').where('sem', '==', int(sem_filter)).stream()
-            sem_uids = {doc.id for doc in sem_docs}
-            enrolled_embeddings = {uid: emb for uid, emb in enrolled_embeddings.items() if uid in sem_uids}
 
-        student_uids = list(enrolled_embeddings.keys())
-        enrolled_matrix = np.array([enrolled_embeddings[uid] for uid in student_uids])
+# ---------- ATTENDANCE ----------
 
-        # Process each detected face
-        detected_embeddings = []
-        for box in boxes:
+def _load_class(branch, sem):
+    """Gallery, its branch/sem selection and the roster profiles for a marking request."""
+    enrolled = get_gallery()
+    selection = enrolled.select(branch=branch, sem=sem)
+    profiles = get_student_store().get_many(selection.uids) if selection.uids else {}
+    return enrolled, selection, profiles
+
+class MarkingRejected(ValueError):
+    """A marking request that can't produce attendance (answered with 400)."""
+
+# Marking runs as a staged pipeline; each stage works on a job dict and
+# passes it on, so consecutive requests overlap across stages.
+
+def _mark_ingest(job):
+    # The class gallery and roster profiles don't depend on the photo: load
+    # them while detection and embedding run, and join just before matching
+    job['class_future'] = request_io_pool.submit(_load_class, job['branch'], job['sem'])
+    job['image_np'] = np.array(Image.open(io.BytesIO(job.pop('photo_bytes'))).convert('RGB'))
+    return job
+
+def _mark_detect(job):
+    # YOLO reads numpy input as BGR, like the images it loads from disk
+    results = yolo_model.predict(source=cv2.cvtColor(job['image_np'], cv2.COLOR_RGB2BGR),
+                                 conf=0.4, verbose=False)
+    job['boxes'] = results[0].boxes.xyxy.cpu().numpy()
+    if len(job['boxes']) == 0:
+        raise MarkingRejected('No faces detected in the photo')
+    return job
+
+def _mark_align(job):
+    aligned = []
+    with torch.no_grad():
+        for box in job['boxes']:
             x1, y1, x2, y2 = map(int, box)
-            face_crop = image_np[y1:y2, x1:x2]
+            face_crop = job['image_np'][y1:y2, x1:x2]
             if face_crop.size == 0:
                 continue
-            face_bgr = cv2.cvtColor(face_crop, cv2.COLOR_RGB2BGR)
             try:
-                emb = process_face(face_bgr)
-                detected_embeddings.append(emb)
+                aligned.append(_align_face(cv2.cvtColor(face_crop, cv2.COLOR_RGB2BGR)))
             except Exception:
                 continue
-
-        if not detected_embeddings:
-            return jsonify({'error': 'Could not process any faces'}), 400
-
-        # Match faces against enrolled students
-        detected_matrix = np.array(detected_embeddings)
-        similarity_matrix = batch_cosine_similarity(detected_matrix, enrolled_matrix)
-
-        THRESHOLD = 0.4
-        attendance_records = []
-        matched_uids = set()
-
-        for similarities in similarity_matrix:
-            best_idx = np.argmax(similarities)
-            best_score = float(similarities[best_idx])
-            if best_score >= THRESHOLD:
-                matched_uid = student_uids[best_idx]
-                if matched_uid not in matched_uids:
-                    matched_uids.add(matched_uid)
-                    attendance_records.append({
-                        'student_uid': matched_uid,
-                        'confidence': round(best_score, 4)
-                    })
-
-        # Save to Firestore — always log the session even if nobody was detected
-        # present, so absent students can see the class in their dashboard.
-        log_id = log_attendance(db, date, attendance_records, subject=subject,
-                                branch=branch_filter or '', sem=int(sem_filter) if sem_filter else None)
-
-        # Build response with student names
-        present_students = []
-        for record in attendance_records:
-            student = get_student_by_uid(db, record['student_uid'])
-            if student:
-                present_students.append({
-                    'uid': record['student_uid'],
-                    'name': student['name'],
-                    'roll_no': student['roll_no'],
-                    'confidence': record['confidence']
-                })
-
-        # All students for absent list
-        all_students = []
-        absent_list_for_email = []
-        for uid in student_uids:
-            student = get_student_by_uid(db, uid)
-            if student:
-                status = 'present' if uid in matched_uids else 'absent'
-                all_students.append({
+    if not aligned:
+        raise MarkingRejected('Could not process any faces')
+    job['aligned'] = aligned
+    del job['image_np']
+    return job
+
+def _mark_embed(job):
+    aligned = job.pop('aligned')
+    embeddings = []
+    with torch.no_grad():
+        for start in range(0, len(aligned), MARK_EMBED_BATCH):
+            chunk = aligned[start:start + MARK_EMBED_BATCH]
+            embeddings.extend(adaface_model(torch.cat(chunk)).cpu().numpy().reshape(len(chunk), -1))
+    job['detected_matrix'] = np.array([normalize_embedding(emb) for emb in embeddings])
+    return job
+
+def _mark_match(job):
+    # Enrolled embeddings for the requested branch/sem partition(s)
+    enrolled, selection, profiles = job.pop('class_future').result()
+    if len(enrolled) == 0:
+        raise MarkingRejected('No students enrolled yet')
+    student_uids = selection.uids
+    if not student_uids:
+        raise MarkingRejected('No students enrolled for the selected branch/semester')
+
+    # Match faces against enrolled students
+    detected_matrix = job.pop('detected_matrix')
+    best_indices, best_scores = enrolled.best_matches(detected_matrix, selection)
+
+    accepted = best_scores >= MATCH_THRESHOLD
+    accepted_idx = best_indices[accepted]
+    accepted_scores = best_scores[accepted]
+    # A student matched by several faces counts once, keeping the first face's score
+    _, first = np.unique(accepted_idx, return_index=True)
+    first.sort()
+    job['attendance_records'] = [
+        {'student_uid': student_uids[idx], 'confidence': round(float(score), 4)}
+        for idx, score in zip(accepted_idx[first], accepted_scores[first])
+    ]
+
+    # High-confidence, unambiguous matches become new template samples
+    # (folded in by persist, once the session is logged)
+    job['template_samples'] = {}
+    confident = accepted_scores[first] >= TEMPLATE_UPDATE_THRESHOLD
+    if TEMPLATE_AUTO_UPDATE and confident.any():
+        update_idx = accepted_idx[first][confident]
+        update_embs = detected_matrix[accepted][first][confident]
+        # A face nearly as close to another student may be misidentified
+        runner_up = enrolled.runner_up_scores(update_embs, selection, update_idx)
+        clear = accepted_scores[first][confident] - runner_up >= TEMPLATE_UPDATE_MARGIN
+        job['template_samples'] = {
+            student_uids[idx]: emb for idx, emb in zip(update_idx[clear], update_embs[clear])
+        }
+    job['gallery'] = enrolled
+    job['student_uids'] = student_uids
+    job['profiles'] = profiles
+    return job
+
+def _mark_persist(job):
+    date, subject = job['date'], job['subject']
+    student_uids, profiles = job['student_uids'], job['profiles']
+    attendance_records = job['attendance_records']
+    matched_uids = {record['student_uid'] for record in attendance_records}
+
+    # Save the session — always log it even if nobody was detected
+    # present, so absent students can see the class in their dashboard.
+    # With write-behind on, this only waits for the local journal commit.
+    journal = get_attendance_journal()
+    log_session = journal.append if journal is not None else storage.log_attendance
+    log_id = log_session(date, attendance_records, subject=subject,
+                         branch=job['branch'] or '', sem=job['sem'],
+                         profiles=profiles, roster=student_uids)
+
+    # Template updates are a side effect: a failure must not fail the marking
+    if job['template_samples']:
+        try:
+            _update_templates(job['gallery'], job['template_samples'])
+        except Exception as e:
+            print(f"⚠️  Template update failed for {len(job['template_samples'])} student(s): {e}")
+
+    # Build response
+    present_students = []
+    for record in attendance_records:
+        student = profiles.get(record['student_uid'])
+        if student:
+            present_students.append({
+                'uid': record['student_uid'],
+                'name': student['name'],
+                'roll_no': student['roll_no'],
+                'confidence': record['confidence']
+            })
+
+    # All students for absent list
+    all_students = []
+    absent_list_for_email = []
+    for uid in student_uids:
+        student = profiles.get(uid)
+        if student:
+            status = 'present' if uid in matched_uids else 'absent'
+            all_students.append({
+                'uid': uid,
+                'name': student['name'],
+                'roll_no': student['roll_no'],
+                'status': status
+            })
+            if status == 'absent':
+                absent_list_for_email.append({
                     'uid': uid,
                     'name': student['name'],
-                    'roll_no': student['roll_no'],
-                    'status': status
+                    'email': student.get('email', '')
                 })
-                if status == 'absent':
-                    absent_list_for_email.append({
-                        'name': student['name'],
-                        'email': student.get('email', '')
-                    })
 
-        # Send absence notification emails (non-blocking background thread)
-        class_name = os.getenv('EMAIL_CLASS_NAME', 'Lecture')
-        notify_absent_students_async(absent_list_for_email, date, subject=class_name)
+    # Send absence notification emails (queued; or collected for the daily digest)
+    class_name = subject or os.getenv('EMAIL_CLASS_NAME', 'Lecture')
+    notify_absent_students_async(absent_list_for_email, date, subject=class_name, log_id=log_id)
+
+    return {
+        'log_id': log_id,
+        'date': date,
+        'subject': subject,
+        'faces_detected': len(job['boxes']),
+        'total_students': len(student_uids),
+        'present_count': len(attendance_records),
+        'absent_count': len(student_uids) - len(attendance_records),
+        'present_students': present_students,
+        'all_students': all_students
+    }
+
+def _update_templates(enrolled, samples):
+    """
+    Fold new samples into students' templates: compute the new sets, save
+    them, and only then apply them to the gallery, so a failed save leaves
+    the gallery matching what storage holds. Updates run one at a time, so
+    concurrent requests never fold into the same stale set.
+
+    Returns:
+        dict: {uid: saved TemplateSet}; uids not enrolled are left out
+    """
+    with _template_update_lock:
+        folded = enrolled.fold_templates(samples)
+        if folded:
+            storage.save_templates_many(folded, if_newer=True)
+            enrolled.merge_templates(folded)
+    return folded
+
+MARK_STAGES = (('ingest', _mark_ingest), ('detect', _mark_detect), ('align', _mark_align),
+               ('embed', _mark_embed), ('match', _mark_match), ('persist', _mark_persist))
+
+def get_marking_pipeline():
+    """Return the attendance-marking pipeline, starting its stage workers once."""
+    global marking_pipeline
+    if marking_pipeline is None:
+        with _marking_pipeline_lock:
+            if marking_pipeline is None:
+                workers = dict(MARK_PIPELINE_WORKERS)
+                for item in os.getenv('MARK_PIPELINE_WORKERS', '').split(','):
+                    if '=' in item:
+                        name, count = item.split('=', 1)
+                        workers[name.strip()] = int(count)
+                marking_pipeline = StagedPipeline([
+                    Stage(name, fn, workers=workers.get(name, 1), queue_size=MARK_PIPELINE_QUEUE)
+                    for name, fn in MARK_STAGES
+                ]).start()
+    return marking_pipeline
 
-        return jsonify({
-            'log_id': log_id,
+@app.route('/api/attendance/mark', methods=['POST'])
+def mark_attendance():
+    """
+    Mark attendance from a group photo.
+    Expects multipart/form-data:
+      - photo (file)
+      - date (optional, defaults to today)
+    The same photo for the same session gets the first result back. An
+    optional Idempotency-Key header reused for a different request is
+    rejected with 422.
+    """
+    try:
+        admin_uid = require_admin(request)
+    except PermissionError as e:
+        return jsonify({'error': str(e)}), 403
+
+    try:
+        photo = request.files.get('photo')
+        date = request.form.get('date', datetime.now().strftime('%Y-%m-%d'))
+        branch_filter = request.form.get('branch', '').strip()
+        sem_filter = request.form.get('sem', '').strip()
+        subject = request.form.get('subject', '').strip()
+
+        if not subject:
+            return jsonify({'error': 'Subject is required to mark attendance'}), 400
+
+        if not photo:
+            return jsonify({'error': 'No photo provided'}), 400
+
+        job = {
+            'photo_bytes': photo.read(),
             'date': date,
             'subject': subject,
-            'faces_detected': len(boxes),
-            'total_students': len(student_uids),
-            'present_count': len(attendance_records),
-            'absent_count': len(student_uids) - len(attendance_records),
-            'present_students': present_students,
-            'all_students': all_students
-        })
-
+            'branch': branch_filter,
+            'sem': int(sem_filter) if sem_filter else None
+        }
+
+        # Same photo bytes for the same session -> same result, keyed or not;
+        # the Idempotency-Key only guards against reuse for another request
+        content_hash = hashlib.sha256(job['photo_bytes'])
+        content_hash.update(f"\0{date}\0{subject}\0{branch_filter}\0{job['sem']}".encode('utf-8'))
+        idempotency_key = request.headers.get('Idempotency-Key', '').strip()
+
+        result, replayed = mark_results.get_or_compute(
+            content_hash.hexdigest(), lambda: get_marking_pipeline().submit(job).result(),
+            idempotency_key=f'{admin_uid}:{idempotency_key}' if idempotency_key else None)
+        response = jsonify(result)
+        if replayed:
+            response.headers['Idempotent-Replayed'] = 'true'
+        return response
+
+    except MarkingRejected as e:
+        return jsonify({'error': str(e)}), 400
+    except IdempotencyConflict as e:
+        return jsonify({'error': str(e)}), 422
     except Exception as e:
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
@@ -512,24 +1231,51 @@ def mark_attendance():
 
 @app.route('/api/attendance/logs', methods=['GET'])
 def get_attendance_logs():
-    """Get all attendance logs. Admin only."""
+    """
+    Paginated attendance logs, newest first. Admin only.
+    Query params: date_from, date_to (YYYY-MM-DD), subject, branch, sem,
+                  limit (default 20, max 100), page_token.
+    """
     try:
         require_admin(request)
     except PermissionError as e:
         return jsonify({'error': str(e)}), 403
 
     try:
-        docs = db.collection('attendance_log').order_by('date', direction='DESCENDING').stream()
+        sem_filter = request.args.get('sem', '').strip()
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+        raw_logs, next_token = storage.list_attendance_logs_page(
+            date_from=request.args.get('date_from', '').strip(),
+            date_to=request.args.get('date_to', '').strip(),
+            subject=request.args.get('subject', '').strip(),
+            branch=request.args.get('branch', '').strip(),
+            sem=int(sem_filter) if sem_filter else None,
+            limit=limit,
+            page_token=request.args.get('page_token', '').strip() or None
+        )
+
+        # Bitmap-encoded sessions keep no per-entry list; rebuild it from the bitmap
+        for data in raw_logs:
+            if 'detected_students' not in data:
+                data['detected_students'] = (decode_entries(data) if is_encoded(data) else
+                                             [{'student_uid': uid, 'confidence': confidence}
+                                              for uid, confidence in presence_map(data).items()])
+            data.pop('present', None)
+            for field in SESSION_FIELDS:
+                data.pop(field, None)
+
+        # Logs without denormalized names fall back to the replica
+        legacy_uids = [record['student_uid'] for data in raw_logs
+                       for record in data.get('detected_students', []) if 'name' not in record]
+        profiles = get_student_store().get_many(legacy_uids) if legacy_uids else {}
+
         logs = []
-        for doc in docs:
-            data = doc.to_dict()
-            data['id'] = doc.id
+        for data in raw_logs:
             if 'timestamp' in data and data['timestamp']:
                 data['timestamp'] = str(data['timestamp'])
-            # Enrich with student names
             enriched = []
-            for record in data.get('detected_students', []):
-                student = get_student_by_uid(db, record['student_uid'])
+            for record in data.pop('detected_students', []):
+                student = record if 'name' in record else profiles.get(record['student_uid'])
                 if student:
                     enriched.append({
                         'uid': record['student_uid'],
@@ -540,32 +1286,107 @@ def get_attendance_logs():
             data['present_students'] = enriched
             data.setdefault('subject', '')
             logs.append(data)
-        return jsonify({'logs': logs})
+        return jsonify({'logs': logs, 'next_page_token': next_token})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/attendance/analytics', methods=['GET'])
+def get_attendance_analytics():
+    """
+    Class, subject and student attendance rates for one branch+sem. Admin only.
+    Query params: branch, sem (required), date_from, date_to (YYYY-MM-DD).
+    """
+    try:
+        require_admin(request)
+    except PermissionError as e:
+        return jsonify({'error': str(e)}), 403
+
+    try:
+        branch = request.args.get('branch', '').strip()
+        sem = request.args.get('sem', '').strip()
+        if not branch or not sem:
+            return jsonify({'error': 'branch and sem are required'}), 400
+        sem = int(sem)
+
+        store = get_student_store()
+        sessions = storage.get_class_sessions(branch, sem,
+                                              date_from=request.args.get('date_from', '').strip(),
+                                              date_to=request.args.get('date_to', '').strip())
+        # Sessions without a stored roster assume the current class roster
+        session_set = SessionSet(sessions, fallback_roster=[uid for uid, _ in store.list(branch, sem)])
+
+        profiles = store.get_many(session_set.uids)
+        students = [
+            {
+                'uid': uid,
+                'name': profiles.get(uid, {}).get('name', ''),
+                'roll_no': profiles.get(uid, {}).get('roll_no', ''),
+                'pct': pct
+            }
+            for uid, pct in session_set.student_rates().items()
+        ]
+        students.sort(key=lambda s: (s['pct'], s['roll_no'] or ''))
+
+        return jsonify({
+            'branch': branch,
+            'sem': sem,
+            'sessions': len(sessions),
+            'class_pct': session_set.class_rate(),
+            'subjects': session_set.subject_rates(),
+            'students': students
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/api/attendance/my', methods=['GET'])
 def get_my_attendance():
-    """Get attendance records for the logged-in student."""
+    """
+    Get attendance records for the logged-in student.
+    Query params: date_from, date_to (YYYY-MM-DD), limit (max 200), page_token.
+    Without limit every record in the range is returned.
+    """
     try:
         uid, role = verify_token(request)
     except Exception as e:
         return jsonify({'error': str(e)}), 401
 
     try:
-        records, subject_stats = get_student_attendance(db, uid)
+        limit = request.args.get('limit', '').strip()
+        date_from = request.args.get('date_from', '').strip()
+        date_to = request.args.get('date_to', '').strip()
+        student = get_student_store().get(uid) or {}
+        # All-time stats come from the materialized counters; a date range
+        # needs them computed from the logs in that range
+        use_counters = not date_from and not date_to
+        records, subject_stats, next_token = storage.get_student_attendance(
+            uid, student=student,
+            date_from=date_from,
+            date_to=date_to,
+            limit=min(max(int(limit), 1), 200) if limit else None,
+            page_token=request.args.get('page_token', '').strip() or None,
+            with_stats=not use_counters
+        )
+        if use_counters:
+            subject_stats = storage.get_attendance_stats(uid, student.get('branch', ''), student.get('sem'))
         # Convert timestamps
         for r in records:
             if 'timestamp' in r and r['timestamp']:
                 r['timestamp'] = str(r['timestamp'])
-        student = get_student_by_uid(db, uid)
         return jsonify({
             'student': student,
             'records': records,
-            'total_present': len(records),
+            'next_page_token': next_token,
+            'total_present': sum(stats['present'] for stats in subject_stats.values()),
             'subject_stats': subject_stats
         })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -573,7 +1394,13 @@ def get_my_attendance():
 # ─── Start ─────────────────────────────────────────────────────────────────────
 if __name__ == '__main__':
     print("[*] Initializing Firebase...")
-    db = initialize_firebase()
+    # Firebase Auth is always used; Firestore only when STORAGE_BACKEND=firestore
+    storage = create_storage(db=initialize_firebase())
+    print(f"[*] Storage backend: {storage.name}")
+    get_attendance_journal()
+    get_outbox()
+    get_student_store()
+    get_search_index()
     print("[*] Loading ML Models (this may take a minute)...")
     load_models()
     print("\n[OK] Backend ready! Running on http://localhost:5000\n")
@@ -240,40 +240,101 @@ function populateSubjectDropdown() {
   }
 }
 
+// ─── Student table pagination ─────────────────────────────────────────────────
+const STUDENT_PAGE_SIZE = 50;
+let studentsNextToken = null;
+let studentsLoading = false;
+let studentsQueryId = 0;   // bumped on every reload so late pages from an old filter are dropped
+
+function studentRow(s) {
+  return `
+      <tr>
+        <td>${esc(s.name)}</td>
+        <td><span class="badge badge-info">${esc(s.roll_no)}</span></td>
+        <td><span class="badge branch-badge" style="background:${branchColor(s.branch)};">${esc(s.branch || '—')}</span></td>
+        <td><span class="badge sem-badge">${s.sem ? 'Sem ' + esc(String(s.sem)) : '—'}</span></td>
+        <td style="color:var(--text-muted);">${esc(s.email)}</td>
+        <td><button class="btn btn-danger btn-sm" onclick="deleteStudent('${esc(s.uid)}', '${esc(s.name)}')">Delete</button></td>
+      </tr>`;
+}
+
+async function fetchStudentPage(pageToken, queryId) {
+  studentsLoading = true;
+  try {
+    const query = $('student-search').value.trim();
+    const params = new URLSearchParams({ limit: STUDENT_PAGE_SIZE });
+    if (query)                    params.set('q', query);
+    if ($('branch-filter').value) params.set('branch', $('branch-filter').value);
+    if ($('sem-filter').value)    params.set('sem', $('sem-filter').value);
+    if (pageToken)                params.set('page_token', pageToken);
+    const endpoint = query ? '/api/students/search?' : '/api/students?';
+    const data = await apiFetch(endpoint + params.toString());
+    if (queryId !== studentsQueryId) return null;
+    studentsNextToken = data.next_page_token || null;
+    $('students-more').style.display = studentsNextToken ? '' : 'none';
+    if (query && !pageToken) $('student-count').textContent = data.total ?? 0;
+    return data.students || [];
+  } finally {
+    studentsLoading = false;
+  }
+}
+
+async function loadStudentCount() {
+  const data = await apiFetch('/api/students/counts');
+  const filterBranch = $('branch-filter').value;
+  const filterSem = $('sem-filter').value;
+  let total = 0;
+  Object.entries(data.counts || {}).forEach(([branch, sems]) => {
+    if (filterBranch && branch !== filterBranch) return;
+    Object.entries(sems).forEach(([sem, n]) => {
+      if (!filterSem || sem === filterSem) total += n;
+    });
+  });
+  $('student-count').textContent = total;
+}
+
 async function loadStudents() {
   const tbody = $('students-tbody');
   tbody.innerHTML = '<tr><td colspan="6" style="color:var(--text-muted);text-align:center;padding:24px;">Loading…</td></tr>';
+  $('students-more').style.display = 'none';
+  studentsNextToken = null;
+  const queryId = ++studentsQueryId;
 
   try {
-    const data = await apiFetch('/api/students');
-    const filterBranch = $('branch-filter').value;
-    const filterSem = $('sem-filter').value;
-    let students = data.students || [];
-
-    if (filterBranch) students = students.filter(s => s.branch === filterBranch);
-    if (filterSem)   students = students.filter(s => String(s.sem) === filterSem);
-    $('student-count').textContent = students.length;
+    if (!$('student-search').value.trim()) {
+      loadStudentCount().catch(err => console.error('Count error:', err));
+    }
+    const students = await fetchStudentPage(null, queryId);
+    if (students === null) return;
 
     if (students.length === 0) {
       tbody.innerHTML = '<tr><td colspan="6" style="color:var(--text-muted);text-align:center;padding:24px;">No students found.</td></tr>';
       return;
     }
 
-    tbody.innerHTML = students.map(s => `
-      <tr>
-        <td>${esc(s.name)}</td>
-        <td><span class="badge badge-info">${esc(s.roll_no)}</span></td>
-        <td><span class="badge branch-badge" style="background:${branchColor(s.branch)};">${esc(s.branch || '—')}</span></td>
-        <td><span class="badge sem-badge">${s.sem ? 'Sem ' + esc(String(s.sem)) : '—'}</span></td>
-        <td style="color:var(--text-muted);">${esc(s.email)}</td>
-        <td><button class="btn btn-danger btn-sm" onclick="deleteStudent('${esc(s.uid)}', '${esc(s.name)}')">Delete</button></td>
-      </tr>
-    `).join('');
+    tbody.innerHTML = students.map(studentRow).join('');
   } catch (err) {
     tbody.innerHTML = `<tr><td colspan="6" class="error-msg">${esc(err.message)}</td></tr>`;
   }
 }
 
+async function loadMoreStudents() {
+  if (!studentsNextToken || studentsLoading) return;
+  const queryId = studentsQueryId;
+  try {
+    const students = await fetchStudentPage(studentsNextToken, queryId);
+    if (students === null) return;
+    $('students-tbody').insertAdjacentHTML('beforeend', students.map(studentRow).join(''));
+  } catch (err) {
+    $('students-more').textContent = err.message || 'Failed to load more students.';
+  }
+}
+
+// Fetch the next page when the sentinel below the table scrolls into view
+new IntersectionObserver(entries => {
+  if (entries.some(e => e.isIntersecting)) loadMoreStudents();
+}).observe($('students-more'));
+
 function branchColor(branch) {
   const map = {
     'CS':      'rgba(99,102,241,0.25)',
@@ -293,6 +354,13 @@ function branchColor(branch) {
 $('branch-filter').addEventListener('change', loadStudents);
 $('sem-filter').addEventListener('change', loadStudents);
 
+// Search box: query the server-side index, debounced so typing doesn't fire a request per key
+let studentSearchTimer = null;
+$('student-search').addEventListener('input', () => {
+  clearTimeout(studentSearchTimer);
+  studentSearchTimer = setTimeout(loadStudents, 250);
+});
+
 function esc(str) {
   if (!str) return '';
   const div = document.createElement('div');
@@ -319,20 +387,18 @@ async function loadBranches() {
   grid.innerHTML = '<p style="color:var(--text-muted);padding:24px;">Loading…</p>';
 
   try {
-    const data = await apiFetch('/api/students');
-    const students = data.students || [];
+    const data = await apiFetch('/api/students/counts');
+    const serverCounts = data.counts || {};
 
     // Count per branch × sem
     const counts = {};
     BRANCHES.forEach(b => {
       counts[b] = { total: 0 };
       SEMS.forEach(s => counts[b][s] = 0);
-    });
-    students.forEach(s => {
-      if (s.branch && counts[s.branch] !== undefined) {
-        counts[s.branch].total++;
-        if (s.sem) counts[s.branch][s.sem] = (counts[s.branch][s.sem] || 0) + 1;
-      }
+      Object.entries(serverCounts[b] || {}).forEach(([sem, n]) => {
+        counts[b].total += n;
+        if (counts[b][sem] !== undefined) counts[b][sem] = n;
+      });
     });
 
     grid.innerHTML = BRANCHES.map(b => {
@@ -405,7 +471,7 @@ $('enroll-form').addEventListener('submit', async (e) => {
     fd.append('sem', $('enroll-sem').value.trim());
     fd.append('email', $('enroll-email').value.trim());
     fd.append('password', $('enroll-password').value.trim());
-    fd.append('photo', $('enroll-photo').files[0]);
+    Array.from($('enroll-photo').files).forEach(f => fd.append('photo', f));
 
     if (!$('enroll-branch').value) {
       showError(errEl, 'Please select a branch.');
@@ -522,31 +588,76 @@ $('attendance-form').addEventListener('submit', async (e) => {
 //  ADMIN: Logs Tab
 // ═══════════════════════════════════════════════════════════════════════════════
 
+const LOG_PAGE_SIZE = 20;
+let logsNextToken = null;
+let logsQueryId = 0;   // bumped on every reload so late pages from an old filter are dropped
+const knownSubjects = new Set();
+
+async function fetchLogPage(pageToken, queryId) {
+  const params = new URLSearchParams({ limit: LOG_PAGE_SIZE });
+  if ($('log-filter-subject').value) params.set('subject', $('log-filter-subject').value);
+  if ($('log-filter-branch').value)  params.set('branch', $('log-filter-branch').value);
+  if ($('log-filter-sem').value)     params.set('sem', $('log-filter-sem').value);
+  if ($('log-filter-from').value)    params.set('date_from', $('log-filter-from').value);
+  if ($('log-filter-to').value)      params.set('date_to', $('log-filter-to').value);
+  if (pageToken)                     params.set('page_token', pageToken);
+  const data = await apiFetch('/api/attendance/logs?' + params.toString());
+  if (queryId !== logsQueryId) return null;
+  logsNextToken = data.next_page_token || null;
+  $('logs-more').style.display = logsNextToken ? '' : 'none';
+  return data.logs || [];
+}
+
+// Subjects seen so far populate the filter; the current selection is kept
+function updateSubjectOptions(logs) {
+  logs.forEach(l => { if (l.subject) knownSubjects.add(l.subject); });
+  const subjectSel = $('log-filter-subject');
+  const selected = subjectSel.value;
+  subjectSel.innerHTML = '<option value="">All Subjects</option>' +
+    [...knownSubjects].sort().map(s => `<option value="${esc(s)}">${esc(s)}</option>`).join('');
+  subjectSel.value = selected;
+}
+
 async function loadLogs() {
   const tbody = $('logs-tbody');
   tbody.innerHTML = '<tr><td colspan="5" style="color:var(--text-muted);text-align:center;padding:24px;">Loading…</td></tr>';
+  $('logs-more').style.display = 'none';
+  logsNextToken = null;
+  const queryId = ++logsQueryId;
 
   try {
-    const data = await apiFetch('/api/attendance/logs');
-    allLogs = data.logs || [];
-
-    // Populate subject filter
-    const subjectSel = $('log-filter-subject');
-    const uniqueSubjects = [...new Set(allLogs.map(l => l.subject).filter(Boolean))].sort();
-    subjectSel.innerHTML = '<option value="">All Subjects</option>' +
-      uniqueSubjects.map(s => `<option value="${esc(s)}">${esc(s)}</option>`).join('');
-
+    const logs = await fetchLogPage(null, queryId);
+    if (logs === null) return;
+    allLogs = logs;
+    updateSubjectOptions(logs);
     renderLogs();
   } catch (err) {
     tbody.innerHTML = `<tr><td colspan="5" class="error-msg">${esc(err.message)}</td></tr>`;
   }
 }
 
+async function loadMoreLogs() {
+  if (!logsNextToken) return;
+  const btn = $('logs-more');
+  btn.disabled = true;
+  try {
+    const logs = await fetchLogPage(logsNextToken, logsQueryId);
+    if (logs === null) return;
+    allLogs = allLogs.concat(logs);
+    updateSubjectOptions(logs);
+    renderLogs();
+  } catch (err) {
+    alert(err.message || 'Failed to load more logs.');
+  } finally {
+    btn.disabled = false;
+  }
+}
+
 function renderLogs() {
   const tbody = $('logs-tbody');
 
-  // Flatten logs into rows
-  let rows = [];
+  // Flatten logs into rows (filters are applied server-side)
+  const rows = [];
   allLogs.forEach(log => {
     (log.present_students || []).forEach(s => {
       rows.push({
@@ -559,12 +670,6 @@ function renderLogs() {
     });
   });
 
-  // Apply filters
-  const filterDate    = $('log-filter-date').value;
-  const filterSubject = $('log-filter-subject').value;
-  if (filterDate)    rows = rows.filter(r => r.date === filterDate);
-  if (filterSubject) rows = rows.filter(r => r.subject === filterSubject);
-
   if (rows.length === 0) {
     tbody.innerHTML = '<tr><td colspan="5" style="color:var(--text-muted);text-align:center;padding:24px;">No logs found.</td></tr>';
     return;
@@ -581,13 +686,52 @@ function renderLogs() {
   `).join('');
 }
 
-$('log-filter-date').addEventListener('change', renderLogs);
-$('log-filter-subject').addEventListener('change', renderLogs);
+['log-filter-subject', 'log-filter-branch', 'log-filter-sem', 'log-filter-from', 'log-filter-to']
+  .forEach(id => $(id).addEventListener('change', loadLogs));
+$('logs-more').addEventListener('click', loadMoreLogs);
 
 // ═══════════════════════════════════════════════════════════════════════════════
 //  STUDENT DASHBOARD
 // ═══════════════════════════════════════════════════════════════════════════════
 
+const RECORD_PAGE_SIZE = 50;
+let recordsNextToken = null;
+
+function recordRow(r) {
+  return `
+      <tr>
+        <td>${esc(r.date || '—')}</td>
+        <td><span class="badge subject-badge">${esc(r.subject || '—')}</span></td>
+        <td>${r.status === 'absent'
+          ? '<span class="badge badge-danger">Absent</span>'
+          : '<span class="badge badge-success">Present</span>'}</td>
+        <td style="color:var(--text-muted);font-size:0.8rem;">${r.status === 'absent' ? '—' : esc(r.timestamp || '—')}</td>
+      </tr>`;
+}
+
+function setRecordsNextToken(token) {
+  recordsNextToken = token || null;
+  $('student-records-more').style.display = recordsNextToken ? '' : 'none';
+}
+
+async function loadMoreRecords() {
+  if (!recordsNextToken) return;
+  const btn = $('student-records-more');
+  btn.disabled = true;
+  try {
+    const params = new URLSearchParams({ limit: RECORD_PAGE_SIZE, page_token: recordsNextToken });
+    const data = await apiFetch('/api/attendance/my?' + params.toString());
+    $('student-records-tbody').insertAdjacentHTML('beforeend', (data.records || []).map(recordRow).join(''));
+    setRecordsNextToken(data.next_page_token);
+  } catch (err) {
+    alert(err.message || 'Failed to load more records.');
+  } finally {
+    btn.disabled = false;
+  }
+}
+
+$('student-records-more').addEventListener('click', loadMoreRecords);
+
 async function loadStudentDashboard() {
   const statsGrid     = $('student-stats');
   const subjGrid      = $('subject-stats-grid');
@@ -597,9 +741,10 @@ async function loadStudentDashboard() {
   statsGrid.innerHTML = '';
   subjGrid.innerHTML  = '<p style="color:var(--text-muted);padding:12px 4px;">Loading…</p>';
   tbody.innerHTML     = '<tr><td colspan="4" style="color:var(--text-muted);text-align:center;padding:24px;">Loading…</td></tr>';
+  setRecordsNextToken(null);
 
   try {
-    const data = await apiFetch('/api/attendance/my');
+    const data = await apiFetch('/api/attendance/my?limit=' + RECORD_PAGE_SIZE);
 
     const student      = data.student      || {};
     const records      = data.records      || [];
@@ -657,18 +802,9 @@ async function loadStudentDashboard() {
       tbody.innerHTML = '<tr><td colspan="4" style="color:var(--text-muted);text-align:center;padding:24px;">No attendance records yet.</td></tr>';
       return;
     }
-    // Sort by date descending
-    records.sort((a, b) => (b.date || '').localeCompare(a.date || ''));
-    tbody.innerHTML = records.map(r => `
-      <tr>
-        <td>${esc(r.date || '—')}</td>
-        <td><span class="badge subject-badge">${esc(r.subject || '—')}</span></td>
-        <td>${r.status === 'absent'
-          ? '<span class="badge badge-danger">Absent</span>'
-          : '<span class="badge badge-success">Present</span>'}</td>
-        <td style="color:var(--text-muted);font-size:0.8rem;">${r.status === 'absent' ? '—' : esc(r.timestamp || '—')}</td>
-      </tr>
-    `).join('');
+    // Records arrive newest first, one page at a time
+    tbody.innerHTML = records.map(recordRow).join('');
+    setRecordsNextToken(data.next_page_token);
 
   } catch (err) {
     statsGrid.innerHTML = `<div class="result-banner error">${esc(err.message)}</div>`;